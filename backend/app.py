@@ -1,37 +1,51 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+import time
+
+# Inizio dell'avvio del worker: gli import seguenti fanno parte del tempo misurato
+_startup_began = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, status, Request, Query, UploadFile, File, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from datetime import datetime
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from datetime import datetime, timedelta
 import logging
+import os
+import shutil
+import uuid
 
 # Import delle configurazioni e utilities
-from config import CORS_ORIGINS
-from database import get_db, engine, Base
-from auth import get_current_user, hash_password, verify_password, create_access_token, check_refresh_token
-from models import User, Transaction, Card
+from config import CORS_ORIGINS, IMPORT_UPLOAD_DIR, SQL_PROFILING, DB_AUTO_MIGRATE, STARTUP_TARGET_MS, SCHEDULER_START_TOLERANCE_SECONDS
+from database import get_db, all_engines, begin_write, is_sharded, shard_for_user, use_shard
+from auth import get_current_user, get_current_admin, hash_password, verify_password, create_access_token, check_refresh_token, decode_token, verify_token, security
+from models import User, Transaction, Card, ImportJob, ImportJobError, ScheduledTransfer, ReportJob
 from schemas import (
-    UserCreate, UserLogin, UserResponse, UserUpdate,
+    UserCreate, UserLogin, UserResponse, UserUpdate, RecipientResponse,
     TransferRequest, RechargeRequest, TransactionResponse, CardData,
-    CardCreate, CardResponse, CardUpdate, CardListResponse
+    CardCreate, CardResponse, CardUpdate, CardListResponse,
+    ImportJobResponse, ImportJobErrorResponse, BootstrapResponse,
+    ScheduledTransferCreate, ScheduledTransferUpdate, ScheduledTransferResponse,
+    ReportJobCreate, ReportJobResponse,
+    TRANSACTION_LIST_ADAPTER, SCHEDULED_TRANSFER_LIST_ADAPTER
 )
 from payment_handler import payment_handler
+from logging_setup import setup_logging, install_request_id_middleware, dropped_log_records
+from migrations import check_schema, upgrade
 
-app = FastAPI(title="CreditoDomestico API", version="1.0.0")
-
-# Configurazione logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# Tempo di avvio del worker (import + inizializzazione), misurato nel lifespan
+startup_ms = None
 
 # Exception handler per errori di validazione (422)
-@app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """
     Handler personalizzato per errori di validazione 422
     """
-    logger.error(f"Errore di validazione su {request.url}: {exc.errors()}")
-    
     # Formatta gli errori in modo più leggibile
     formatted_errors = []
     for error in exc.errors():
@@ -43,6 +57,13 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
             "type": error["type"]
         })
     
+    # Categoria campionata: un'ondata di richieste non valide non satura i log
+    logger.warning(
+        "Errore di validazione su %s %s",
+        request.method, request.url.path,
+        extra={"log_category": "validation", "errors": formatted_errors}
+    )
+    
     return JSONResponse(
         status_code=422,
         content={
@@ -52,17 +73,16 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         }
     )
 
-# Configurazione CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
-)
+def _json_response(content: bytes) -> Response:
+    """
+    Risposta già serializzata da un TypeAdapter o da model_dump_json
+
+    Restituendo una Response FastAPI non rivalida né riserializza il
+    contenuto: response_model resta solo per la documentazione OpenAPI.
+    """
+    return Response(content=content, media_type="application/json")
 
 # Middleware per sliding session
-@app.middleware("http")
 async def sliding_session_middleware(request, call_next):
     """Middleware per gestire il refresh automatico del token"""
     response = await call_next(request)
@@ -74,35 +94,82 @@ async def sliding_session_middleware(request, call_next):
         
         if check_refresh_token(token):
             try:
-                from auth import verify_token
                 email = verify_token(token)
                 new_token = create_access_token(data={"sub": email})
                 response.headers["X-New-Token"] = new_token
+                logger.info("Token rinnovato per %s", email, extra={"log_category": "token_refresh"})
             except:
                 pass
     
     return response
 
-# Crea le tabelle
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Inizializzazione del worker all'avvio del server (non all'import del modulo)
 
-@app.post("/register", response_model=dict)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+    Nessun DDL: si verifica solo che le migrazioni siano state applicate
+    (python migrate.py), così più worker possono partire in parallelo.
+    """
+    global startup_ms
+    
+    # Configurazione logging (coda asincrona, righe JSON con request id)
+    setup_logging()
+    
+    # Database principale e shard (con un solo database coincidono)
+    for database_engine in all_engines():
+        if DB_AUTO_MIGRATE:
+            upgrade(database_engine)
+        check_schema(database_engine)
+    
+    # Saga tra shard interrotte da un riavvio
+    if is_sharded():
+        from sharding import recover_in_background
+        recover_in_background()
+    
+    # Revoche scadute eliminate periodicamente, fuori dalle richieste
+    from revocation import prune_in_background
+    prune_in_background()
+    
+    startup_ms = (time.perf_counter() - _startup_began) * 1000
+    if startup_ms > STARTUP_TARGET_MS:
+        logger.warning("Avvio del worker in %.0f ms (obiettivo %s ms)", startup_ms, STARTUP_TARGET_MS)
+    else:
+        logger.info("Avvio del worker in %.0f ms", startup_ms)
+    yield
+
+@router.post("/register", response_model=dict)
+def register(
+    user_data: UserCreate,
+    bootstrap: bool = Query(False, description="Includi il payload di /bootstrap nella risposta"),
+    fields: str = Query(None, description="Sezioni del bootstrap: profile,transactions,cards"),
+    db: Session = Depends(get_db)
+):
     """Registrazione di un nuovo utente con informazioni complete"""
-    logger.info(f"Tentativo di registrazione per email: {user_data.email}")
+    from bootstrap import parse_fields, build_bootstrap
+    from recipients import recipient_index
+    from sharding import shard_directory
+    
+    logger.info("Tentativo di registrazione per email: %s", user_data.email)
     
     # Verifica se l'utente esiste già
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
-        logger.warning(f"Tentativo di registrazione con email già esistente: {user_data.email}")
+    existing_user = db.query(User).filter(User.email == user_data.email).first() if not is_sharded() else None
+    user_id = shard_directory.register(user_data.email) if is_sharded() else None
+    if existing_user or (is_sharded() and user_id is None):
+        logger.warning("Tentativo di registrazione con email già esistente: %s", user_data.email)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email già registrata"
         )
     
+    # Con più shard l'id viene dalla directory e decide lo shard dell'utente
+    if user_id is not None:
+        use_shard(db, shard_for_user(user_id))
+    
     # Crea il nuovo utente con tutte le informazioni
     hashed_password = hash_password(user_data.password)
     new_user = User(
+        id=user_id,
         email=user_data.email,
         password_hash=hashed_password,
         first_name=user_data.first_name,
@@ -115,14 +182,31 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         country=user_data.country
     )
     
-    db.add(new_user)
-    db.commit()
+    try:
+        begin_write(db)
+        db.add(new_user)
+        db.commit()
+    except IntegrityError:
+        # Stessa email registrata da una richiesta concorrente: la voce della directory è sua
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email già registrata"
+        )
+    except Exception:
+        db.rollback()
+        if user_id is not None:
+            shard_directory.remove(user_data.email)
+        raise
     db.refresh(new_user)
     
+    # Rendi subito il nuovo utente ricercabile come destinatario
+    recipient_index.add_user(new_user)
+    
     # Crea il token di accesso
     access_token = create_access_token(data={"sub": new_user.email})
     
-    return {
+    response = {
         "access_token": access_token,
         "token_type": "bearer",
         "user": {
@@ -136,12 +220,25 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
             "is_verified": new_user.is_verified
         }
     }
+    if bootstrap:
+        response["bootstrap"] = BootstrapResponse.model_validate(
+            build_bootstrap(db, new_user, parse_fields(fields)), from_attributes=True
+        )
+    return response
 
-@app.post("/login", response_model=dict)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
+@router.post("/login", response_model=dict)
+def login(
+    user_data: UserLogin,
+    bootstrap: bool = Query(False, description="Includi il payload di /bootstrap nella risposta"),
+    fields: str = Query(None, description="Sezioni del bootstrap: profile,transactions,cards"),
+    db: Session = Depends(get_db)
+):
     """Login dell'utente"""
-    # Trova l'utente
-    user = db.query(User).filter(User.email == user_data.email).first()
+    from bootstrap import parse_fields, build_bootstrap
+    from sharding import route_by_email
+    
+    # Trova l'utente (con più shard, su quello indicato dalla directory)
+    user = db.query(User).filter(User.email == user_data.email).first() if route_by_email(db, user_data.email) else None
     if not user or not verify_password(user_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -151,7 +248,7 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
     # Crea il token di accesso
     access_token = create_access_token(data={"sub": user.email})
     
-    return {
+    response = {
         "access_token": access_token,
         "token_type": "bearer",
         "user": {
@@ -161,22 +258,44 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
             "created_at": user.created_at
         }
     }
+    if bootstrap:
+        response["bootstrap"] = BootstrapResponse.model_validate(
+            build_bootstrap(db, user, parse_fields(fields)), from_attributes=True
+        )
+    return response
 
-@app.get("/me", response_model=UserResponse)
+@router.get("/me", response_model=UserResponse)
 def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Ottiene le informazioni dell'utente corrente"""
     return current_user
 
-@app.put("/me", response_model=UserResponse)
+@router.get("/bootstrap", response_model=BootstrapResponse)
+async def get_bootstrap(
+    fields: str = Query(None, description="Sezioni da includere: profile,transactions,cards"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Profilo, saldo, prima pagina di transazioni e carte in un'unica risposta"""
+    from bootstrap import parse_fields, build_bootstrap_concurrent
+    
+    # Autenticazione una sola volta, poi le query indipendenti in parallelo
+    return await build_bootstrap_concurrent(db, current_user, parse_fields(fields))
+
+@router.put("/me", response_model=UserResponse)
 def update_user_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Aggiorna il profilo dell'utente corrente"""
+    from counterparties import counterparty_cache
+    from recipients import recipient_index
+    
     # Aggiorna solo i campi forniti
-    update_data = user_update.dict(exclude_unset=True)
+    update_data = user_update.model_dump(exclude_unset=True)
     
+    # Su SQLite serializza le scritture (BEGIN IMMEDIATE): current_user viene riletto nella transazione
+    begin_write(db)
     for field, value in update_data.items():
         setattr(current_user, field, value)
     
@@ -186,9 +305,13 @@ def update_user_profile(
     db.commit()
     db.refresh(current_user)
     
+    # Aggiorna nome e cognome nell'indice dei destinatari e nello storico degli altri utenti
+    recipient_index.add_user(current_user)
+    counterparty_cache.invalidate(current_user.id)
+    
     return current_user
 
-@app.post("/refresh-token")
+@router.post("/refresh-token")
 def refresh_token(current_user: User = Depends(get_current_user)):
     """Rinnova il token JWT (sliding session)"""
     new_token = create_access_token(data={"sub": current_user.email})
@@ -198,15 +321,57 @@ def refresh_token(current_user: User = Depends(get_current_user)):
         "message": "Token rinnovato con successo"
     }
 
-@app.post("/transfer", response_model=TransactionResponse)
+@router.get("/recipients/search", response_model=list[RecipientResponse])
+def search_recipients(
+    q: str = Query("", max_length=255, description="Prefisso; sotto i 3 caratteri solo tra i contatti frequenti"),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Suggerisce i destinatari per prefisso di email, nome o cognome"""
+    from recipients import suggest_recipients
+    
+    return suggest_recipients(db, current_user.id, q, limit)
+
+@router.post("/logout")
+def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Revoca il token corrente prima della sua scadenza"""
+    from revocation import token_revocations
+    
+    token_revocations.revoke_token(db, decode_token(credentials.credentials))
+    return {"message": "Logout effettuato con successo"}
+
+@router.post("/transfer", response_model=TransactionResponse)
 def transfer_money(
     transfer_data: TransferRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Trasferimento di denaro tra utenti"""
-    # Inizia una transazione atomica
+    from outbox import add_event
+    from recipients import frequent_contacts
+    from sharding import shard_directory, cross_shard_transfer
+    
+    # Destinatario su un altro shard: saga (addebito, accredito, conferma o compensazione)
+    if is_sharded():
+        recipient_id = shard_directory.locate(db, transfer_data.to_email)
+        if recipient_id is not None and shard_for_user(recipient_id) != shard_for_user(current_user.id):
+            transaction = cross_shard_transfer(
+                db, current_user, recipient_id, transfer_data.amount,
+                transfer_data.description or f"Trasferimento a {transfer_data.to_email}"
+            )
+            frequent_contacts.record_transfer(current_user.id, recipient_id)
+            return transaction
+    
+    # Stesso shard: una sola transazione atomica
     try:
+        # Su SQLite serializza le scritture (BEGIN IMMEDIATE), altrove non fa nulla
+        begin_write(db)
+        
         # Verifica saldo sufficiente
         if current_user.balance < transfer_data.amount:
             raise HTTPException(
@@ -252,11 +417,23 @@ def transfer_money(
         )
         
         db.add(transaction)
+        db.flush()
+        
+        # Effetti collaterali (notifiche, webhook...) consegnati dopo il commit dal dispatcher
+        add_event(db, "transfer.completed", {
+            "transaction_id": transaction.id,
+            "from_user_id": current_user.id,
+            "to_user_id": recipient.id,
+            "amount": transfer_data.amount
+        })
         
         # Commit atomico - tutto o niente
         db.commit()
         db.refresh(transaction)
         
+        # Aggiorna i contatti frequenti senza rileggerli dal database
+        frequent_contacts.record_transfer(current_user.id, recipient.id)
+        
         return transaction
         
     except HTTPException:
@@ -271,13 +448,15 @@ def transfer_money(
             detail="Errore durante il trasferimento"
         )
 
-@app.post("/recharge", response_model=TransactionResponse)
+@router.post("/recharge", response_model=TransactionResponse)
 def recharge_balance(
     recharge_data: RechargeRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Ricarica del saldo tramite carta (simulato)"""
+    from outbox import add_event
+    
     # Usa il gestore fake per processare il pagamento
     payment_result = payment_handler.process_payment(
         amount=recharge_data.amount,
@@ -292,6 +471,9 @@ def recharge_balance(
     
     # Inizia una transazione atomica per il database
     try:
+        # Su SQLite serializza le scritture (BEGIN IMMEDIATE), altrove non fa nulla
+        begin_write(db)
+        
         # Ricarica l'utente con lock per prevenire race conditions
         current_user_locked = db.query(User).filter(User.id == current_user.id).with_for_update().first()
         
@@ -335,6 +517,15 @@ def recharge_balance(
         )
         
         db.add(transaction)
+        db.flush()
+        
+        # Effetti collaterali (notifiche, webhook...) consegnati dopo il commit dal dispatcher
+        add_event(db, "recharge.completed", {
+            "transaction_id": transaction.id,
+            "to_user_id": current_user.id,
+            "amount": recharge_data.amount,
+            "payment_id": payment_result["id"]
+        })
         
         # Commit atomico - tutto o niente
         db.commit()
@@ -350,39 +541,48 @@ def recharge_balance(
             detail="Errore durante la ricarica"
         )
 
-@app.get("/transactions", response_model=list[TransactionResponse])
+@router.get("/transactions", response_model=list[TransactionResponse])
 def get_transactions(
+    limit: int = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Ottiene la cronologia delle transazioni dell'utente"""
-    transactions = db.query(Transaction).filter(
-        (Transaction.from_user_id == current_user.id) |
-        (Transaction.to_user_id == current_user.id)
-    ).order_by(Transaction.created_at.desc()).all()
+    """Ottiene la cronologia delle transazioni dell'utente (paginata se indicato limit)"""
+    from bootstrap import load_transaction_page
     
-    return transactions
+    return _json_response(TRANSACTION_LIST_ADAPTER.dump_json(load_transaction_page(db, current_user.id, limit, offset)))
 
-@app.get("/cards", response_model=CardListResponse)
+@router.get("/transactions/export")
+def export_transactions(current_user: User = Depends(get_current_user)):
+    """Esporta la cronologia delle transazioni in CSV"""
+    from transaction_export import export_transactions_csv
+    
+    return StreamingResponse(
+        export_transactions_csv(current_user.id),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=transazioni.csv"}
+    )
+
+@router.get("/cards", response_model=CardListResponse)
 def get_user_cards(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Ottiene le carte salvate dell'utente"""
-    cards = db.query(Card).filter(Card.user_id == current_user.id).order_by(Card.is_default.desc(), Card.created_at.desc()).all()
+    from bootstrap import load_cards
     
-    return {
-        "cards": cards,
-        "total": len(cards)
-    }
+    return _json_response(load_cards(db, current_user.id).model_dump_json())
 
-@app.put("/cards/{card_id}/default")
+@router.put("/cards/{card_id}/default")
 def set_default_card(
     card_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Imposta una carta come predefinita"""
+    begin_write(db)
+    
     # Trova la carta
     card = db.query(Card).filter(
         Card.id == card_id,
@@ -406,13 +606,15 @@ def set_default_card(
     
     return {"message": "Carta impostata come predefinita", "card": card}
 
-@app.delete("/cards/{card_id}")
+@router.delete("/cards/{card_id}")
 def delete_card(
     card_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Elimina una carta salvata"""
+    begin_write(db)
+    
     # Trova la carta
     card = db.query(Card).filter(
         Card.id == card_id,
@@ -441,12 +643,435 @@ def delete_card(
     
     return {"message": "Carta eliminata con successo"}
 
-@app.get("/health")
+def _with_remote_recipients(db: Session, schedules: list) -> list:
+    """Completa l'email dei destinatari che stanno su un altro shard"""
+    from sharding import directory_emails
+    
+    remote = [scheduled for scheduled in schedules if scheduled.recipient is None]
+    emails = directory_emails(db, [scheduled.to_user_id for scheduled in remote])
+    for scheduled in remote:
+        scheduled.remote_to_email = emails.get(scheduled.to_user_id)
+    return schedules
+
+def _get_scheduled_transfer(db: Session, transfer_id: int, user_id: int) -> ScheduledTransfer:
+    scheduled = db.query(ScheduledTransfer).options(joinedload(ScheduledTransfer.recipient)).filter(
+        ScheduledTransfer.id == transfer_id,
+        ScheduledTransfer.user_id == user_id
+    ).first()
+    if not scheduled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bonifico programmato non trovato"
+        )
+    return _with_remote_recipients(db, [scheduled])[0]
+
+@router.post("/scheduled-transfers", response_model=ScheduledTransferResponse, status_code=status.HTTP_201_CREATED)
+def create_scheduled_transfer(
+    transfer_data: ScheduledTransferCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Crea un bonifico programmato (singolo o ricorrente), eseguito dallo scheduler"""
+    # Il destinatario può stare su un altro shard: basta il suo id, dalla directory
+    if is_sharded():
+        from sharding import shard_directory
+        recipient_id = shard_directory.locate(db, transfer_data.to_email)
+    else:
+        recipient_id = db.query(User.id).filter(User.email == transfer_data.to_email).scalar()
+    if recipient_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Utente destinatario non trovato"
+        )
+    
+    if recipient_id == current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Non puoi trasferire denaro a te stesso"
+        )
+    
+    if transfer_data.start_at < datetime.utcnow() - timedelta(seconds=SCHEDULER_START_TOLERANCE_SECONDS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La prima esecuzione non può essere nel passato"
+        )
+    
+    if transfer_data.end_at is not None and transfer_data.end_at < transfer_data.start_at:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La data di fine precede la prima esecuzione"
+        )
+    
+    begin_write(db)
+    scheduled = ScheduledTransfer(
+        user_id=current_user.id,
+        to_user_id=recipient_id,
+        amount=transfer_data.amount,
+        description=transfer_data.description,
+        frequency=transfer_data.frequency,
+        anchor_day=transfer_data.start_at.day,
+        next_run_at=transfer_data.start_at,
+        scheduled_for=transfer_data.start_at,
+        end_at=transfer_data.end_at,
+        status="active",
+        attempts=0
+    )
+    db.add(scheduled)
+    db.commit()
+    db.refresh(scheduled)
+    
+    return _with_remote_recipients(db, [scheduled])[0]
+
+@router.get("/scheduled-transfers", response_model=list[ScheduledTransferResponse])
+def get_scheduled_transfers(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Bonifici programmati dell'utente, per prossima esecuzione"""
+    schedules = _with_remote_recipients(db, db.query(ScheduledTransfer).options(joinedload(ScheduledTransfer.recipient)).filter(
+        ScheduledTransfer.user_id == current_user.id
+    ).order_by(ScheduledTransfer.next_run_at).all())
+    return _json_response(SCHEDULED_TRANSFER_LIST_ADAPTER.dump_json(
+        SCHEDULED_TRANSFER_LIST_ADAPTER.validate_python(schedules, from_attributes=True)
+    ))
+
+@router.get("/scheduled-transfers/{transfer_id}", response_model=ScheduledTransferResponse)
+def get_scheduled_transfer(
+    transfer_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Dettaglio di un bonifico programmato"""
+    return _get_scheduled_transfer(db, transfer_id, current_user.id)
+
+@router.put("/scheduled-transfers/{transfer_id}", response_model=ScheduledTransferResponse)
+def update_scheduled_transfer(
+    transfer_id: int,
+    update_data: ScheduledTransferUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Modifica, sospende o riattiva un bonifico programmato"""
+    begin_write(db)
+    scheduled = _get_scheduled_transfer(db, transfer_id, current_user.id)
+    if scheduled.status not in ("active", "paused"):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Bonifico programmato già concluso"
+        )
+    
+    changes = update_data.model_dump(exclude_unset=True)
+    if changes.get("next_run_at") is not None and changes["next_run_at"] < datetime.utcnow() - timedelta(seconds=SCHEDULER_START_TOLERANCE_SECONDS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La prossima esecuzione non può essere nel passato"
+        )
+    
+    for field in ("amount", "description", "end_at", "status"):
+        if field in changes:
+            setattr(scheduled, field, changes[field])
+    
+    if changes.get("next_run_at") is not None:
+        scheduled.next_run_at = changes["next_run_at"]
+        scheduled.scheduled_for = changes["next_run_at"]
+        scheduled.anchor_day = changes["next_run_at"].day
+        scheduled.attempts = 0
+    elif changes.get("status") == "active" and scheduled.attempts:
+        # Riattivato dopo errori: si riprova subito
+        scheduled.next_run_at = datetime.utcnow()
+    
+    db.commit()
+    db.refresh(scheduled)
+    
+    return scheduled
+
+@router.delete("/scheduled-transfers/{transfer_id}")
+def delete_scheduled_transfer(
+    transfer_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Elimina un bonifico programmato"""
+    begin_write(db)
+    scheduled = _get_scheduled_transfer(db, transfer_id, current_user.id)
+    db.delete(scheduled)
+    db.commit()
+    
+    return {"message": "Bonifico programmato eliminato con successo"}
+
+@router.post("/reports", response_model=ReportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def request_report(
+    report_data: ReportJobCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Richiede un estratto conto mensile o un riepilogo annuale, generato dai worker dei report"""
+    from reports import enqueue_report
+    
+    # Una richiesta identica a un report ancora in coda restituisce quello
+    job, created = enqueue_report(db, current_user.id, report_data.report_type, report_data.period)
+    if created:
+        logger.info("Report %s richiesto: %s %s", job.id, job.report_type, report_data.period)
+    return job
+
+@router.get("/reports", response_model=list[ReportJobResponse])
+def get_reports(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Report richiesti dall'utente, dal più recente"""
+    return db.query(ReportJob).filter(
+        ReportJob.user_id == current_user.id
+    ).order_by(ReportJob.created_at.desc(), ReportJob.id.desc()).limit(limit).all()
+
+def _get_report_job(db: Session, job_id: int, user_id: int) -> ReportJob:
+    job = db.query(ReportJob).filter(ReportJob.id == job_id, ReportJob.user_id == user_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Report non trovato"
+        )
+    return job
+
+@router.get("/reports/{job_id}", response_model=ReportJobResponse)
+def get_report(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stato di un report"""
+    return _get_report_job(db, job_id, current_user.id)
+
+@router.get("/reports/{job_id}/download")
+def download_report(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Scarica un report completato"""
+    job = _get_report_job(db, job_id, current_user.id)
+    if job.status != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Report non ancora disponibile"
+        )
+    if not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="File del report non più disponibile, richiedilo di nuovo"
+        )
+    
+    return FileResponse(
+        job.file_path,
+        media_type="application/json",
+        filename=f"{job.report_type}-{job.period_start:%Y-%m}.json"
+    )
+
+@router.post("/admin/users/import", response_model=ImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def import_users(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    source_format: str = Query(None, alias="format"),
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Import massivo di utenti da CSV o NDJSON (eseguito in background)"""
+    if is_sharded():
+        # L'import scrive direttamente nella tabella users, senza passare dalla directory
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Import massivo non disponibile con più shard"
+        )
+    from bulk_import import SUPPORTED_FORMATS, detect_format, create_import_job, run_import_job_in_background
+    
+    source_format = source_format or detect_format(file.filename or "")
+    if source_format not in SUPPORTED_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato non supportato (usare csv o ndjson)"
+        )
+    
+    # Il file resta su disco: serve per riprendere l'import dopo un'interruzione
+    os.makedirs(IMPORT_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_UPLOAD_DIR, f"{uuid.uuid4().hex}.{source_format}")
+    with open(path, "wb") as destination:
+        shutil.copyfileobj(file.file, destination)
+    
+    job = create_import_job(db, path, source_format)
+    logger.info("Import %s avviato da %s", job.id, admin.email)
+    background_tasks.add_task(run_import_job_in_background, job.id)
+    
+    return job
+
+@router.get("/admin/users/import/{job_id}", response_model=ImportJobResponse)
+def get_import_job(
+    job_id: int,
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Stato di avanzamento di un import"""
+    job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import non trovato"
+        )
+    return job
+
+@router.get("/admin/users/import/{job_id}/errors", response_model=list[ImportJobErrorResponse])
+def get_import_job_errors(
+    job_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Errori per riga di un import"""
+    return db.query(ImportJobError).filter(
+        ImportJobError.job_id == job_id
+    ).order_by(ImportJobError.row_number).offset(offset).limit(limit).all()
+
+@router.post("/admin/users/import/{job_id}/resume", response_model=ImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def resume_import_job(
+    job_id: int,
+    background_tasks: BackgroundTasks,
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Riprende un import interrotto dall'ultimo blocco confermato"""
+    from bulk_import import RESUMABLE_STATES, claim_import_job, new_runner_id, run_import_job_in_background
+    
+    # Claim atomico: un import ancora in esecuzione non riceve un secondo runner,
+    # uno con il lease scaduto (runner terminato) viene ripreso
+    runner_id = new_runner_id()
+    if not claim_import_job(db, job_id, runner_id, RESUMABLE_STATES):
+        job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+        if not job:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Import non trovato"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Import già completato" if job.status == "completed" else "Import già in esecuzione"
+        )
+    
+    background_tasks.add_task(run_import_job_in_background, job_id, runner_id)
+    return db.query(ImportJob).filter(ImportJob.id == job_id).first()
+
+@router.post("/admin/users/{user_id}/revoke-sessions")
+def revoke_user_sessions(
+    user_id: int,
+    admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Revoca tutti i token già emessi per un utente"""
+    from revocation import token_revocations
+    
+    # L'utente sta sul proprio shard, non necessariamente su quello dell'amministratore
+    # (letto prima del cambio: dopo il commit admin verrebbe ricaricato dallo shard sbagliato)
+    admin_email = admin.email
+    use_shard(db, shard_for_user(user_id))
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Utente non trovato"
+        )
+    
+    token_revocations.revoke_subject(db, user.email)
+    logger.info("Sessioni dell'utente %s revocate da %s", user_id, admin_email)
+    return {"message": "Sessioni revocate con successo"}
+
+@router.get("/admin/outbox")
+def get_outbox_stats(admin: User = Depends(get_current_admin)):
+    """Arretrato e ritardo degli eventi post-commit"""
+    from outbox import outbox_stats
+    
+    return outbox_stats()
+
+@router.get("/admin/scheduler")
+def get_scheduler_stats(admin: User = Depends(get_current_admin)):
+    """Arretrato e ritardo dei bonifici programmati"""
+    from scheduler import scheduler_stats
+    
+    return scheduler_stats()
+
+@router.post("/admin/transactions/archive", status_code=status.HTTP_202_ACCEPTED)
+def start_transaction_archive(
+    background_tasks: BackgroundTasks,
+    admin: User = Depends(get_current_admin)
+):
+    """Avvia in background l'archiviazione delle transazioni oltre l'orizzonte"""
+    from archive import transaction_archiver
+    
+    if transaction_archiver.running:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Archiviazione già in corso"
+        )
+    logger.info("Archiviazione delle transazioni avviata da %s", admin.email)
+    background_tasks.add_task(transaction_archiver.run)
+    return {"message": "Archiviazione avviata"}
+
+@router.get("/admin/transactions/archive")
+def get_transaction_archive_stats(admin: User = Depends(get_current_admin)):
+    """Dimensione della tabella calda e dell'archivio"""
+    from archive import archive_stats
+    
+    return archive_stats()
+
+@router.get("/health")
 def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.utcnow()}
+    from ratelimit import rate_limiter
+    
+    return {
+        "status": "healthy",
+        "timestamp": datetime.utcnow(),
+        "dropped_log_records": dropped_log_records(),
+        "rate_limited_requests": rate_limiter.rejected if rate_limiter is not None else 0,
+        "startup_ms": startup_ms
+    }
+
+def create_app() -> FastAPI:
+    """Crea l'applicazione: nessuna connessione al database finché il server non parte"""
+    app = FastAPI(title="CreditoDomestico API", version="1.0.0", lifespan=lifespan)
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    
+    # Rate limiting: le richieste oltre i limiti ricevono 429 prima di aprire sessioni o calcolare hash
+    from ratelimit import rate_limiter, install_rate_limiting
+    if rate_limiter is not None:
+        install_rate_limiting(app, rate_limiter)
+    
+    # Configurazione CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(sliding_session_middleware)
+    
+    # Profilazione SQL per richiesta (header X-DB-Queries / X-DB-Time)
+    if SQL_PROFILING:
+        from profiling import install_sql_profiling
+        install_sql_profiling(app, all_engines())
+    
+    # Correlation id per richiesta (middleware più esterno, registrato per ultimo)
+    install_request_id_middleware(app)
+    
+    app.include_router(router)
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
     from config import HOST, PORT
+    # Avvio in un solo processo (sviluppo): le migrazioni possono girare qui
+    for database_engine in all_engines():
+        upgrade(database_engine)
     uvicorn.run(app, host=HOST, port=PORT)
\ No newline at end of file
@@ -0,0 +1,206 @@
+import argparse
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from sqlalchemy import DateTime, and_, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from config import ARCHIVE_HORIZON_DAYS, ARCHIVE_CHUNK_SIZE, ARCHIVE_PAUSE_SECONDS
+from database import begin_write, shard_engines, session_for_shard
+from models import Transaction, ArchivedTransaction
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_COLUMNS = ("id", "from_user_id", "to_user_id", "amount", "transaction_type", "created_at", "description")
+
+
+def _history_key(transaction):
+    return (transaction.created_at, transaction.id)
+
+
+def _user_history(db: Session, model, user_id: int):
+    return db.query(model).filter(
+        (model.from_user_id == user_id) | (model.to_user_id == user_id)
+    ).order_by(model.created_at.desc(), model.id.desc())
+
+
+def load_history(db: Session, user_id: int, limit: Optional[int] = None, offset: int = 0) -> List:
+    """
+    Transazioni dell'utente dalla più recente, da tabella calda e archivio
+
+    Ogni tabella restituisce al massimo offset + limit righe (sfruttando gli
+    indici per utente e data); le due liste già ordinate vengono unite qui.
+    Le due query girano nella stessa transazione, quindi una riga spostata
+    dall'archiviazione nel frattempo non compare due volte né sparisce.
+    """
+    window = offset + limit if limit is not None else None
+    sources = []
+    for model in (Transaction, ArchivedTransaction):
+        query = _user_history(db, model, user_id)
+        if window is not None:
+            query = query.limit(window)
+        sources.append(query.all())
+
+    merged = list(heapq.merge(*sources, key=_history_key, reverse=True))
+    return merged[offset:offset + limit] if limit is not None else merged[offset:]
+
+
+def _iter_rows(db: Session, model, user_id: int, page_size: int):
+    # Paginazione a chiave (created_at, id) su una sola tabella
+    last = None
+    while True:
+        query = _user_history(db, model, user_id)
+        if last is not None:
+            query = query.filter(or_(
+                model.created_at < last.created_at,
+                and_(model.created_at == last.created_at, model.id < last.id)
+            ))
+        page = query.limit(page_size).all()
+        yield from page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+
+def iter_history_pages(db: Session, user_id: int, page_size: int) -> Iterator[List]:
+    """Pagine di transazioni dalla più recente, unendo tabella calda e archivio"""
+    rows = heapq.merge(
+        _iter_rows(db, Transaction, user_id, page_size),
+        _iter_rows(db, ArchivedTransaction, user_id, page_size),
+        key=_history_key,
+        reverse=True
+    )
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+class TransactionArchiver:
+    """
+    Sposta nell'archivio le transazioni più vecchie dell'orizzonte
+
+    Lavora a blocchi in ordine di (created_at, id): ogni blocco copia e cancella
+    le righe nella stessa transazione, quindi un'interruzione perde al massimo il
+    blocco in corso e una nuova esecuzione riprende da dove si era fermata. La
+    transazione con l'id più alto resta sempre nella tabella calda, così il
+    contatore degli id non può ripartire da un valore già usato nell'archivio.
+    """
+
+    def __init__(self, horizon_days: int = ARCHIVE_HORIZON_DAYS, chunk_size: int = ARCHIVE_CHUNK_SIZE):
+        self.horizon_days = horizon_days
+        self.chunk_size = chunk_size
+        self._running = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._running.locked()
+
+    def archive_chunk(self, db: Session, cutoff: datetime) -> int:
+        """Archivia un blocco di transazioni anteriori a cutoff; restituisce quante"""
+        begin_write(db)
+        max_id = db.query(func.max(Transaction.id)).scalar()
+        query = db.query(Transaction.id).filter(
+            Transaction.created_at < cutoff,
+            Transaction.id < max_id
+        ).order_by(Transaction.created_at, Transaction.id).limit(self.chunk_size)
+        # Più archiviatori in parallelo non si contendono le stesse righe
+        if db.get_bind().dialect.name in ("postgresql", "mysql", "mariadb"):
+            query = query.with_for_update(skip_locked=True)
+
+        ids = [row.id for row in query.all()] if max_id is not None else []
+        if not ids:
+            db.commit()
+            return 0
+
+        columns = [getattr(Transaction, name) for name in ARCHIVED_COLUMNS]
+        db.execute(insert(ArchivedTransaction).from_select(
+            list(ARCHIVED_COLUMNS) + ["archived_at"],
+            select(*columns, literal(datetime.utcnow(), DateTime)).where(Transaction.id.in_(ids))
+        ))
+        db.query(Transaction).filter(Transaction.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        return len(ids)
+
+    def run(self, max_chunks: Optional[int] = None) -> int:
+        """Archivia fino a esaurire le transazioni oltre l'orizzonte (o max_chunks blocchi)"""
+        if not self._running.acquire(blocking=False):
+            logger.info("Archiviazione già in corso in questo processo")
+            return 0
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=self.horizon_days)
+            total = 0
+            chunks = 0
+            # Ogni shard archivia le proprie transazioni
+            for shard_id in range(len(shard_engines)):
+                db = session_for_shard(shard_id)
+                try:
+                    while max_chunks is None or chunks < max_chunks:
+                        moved = self.archive_chunk(db, cutoff)
+                        if not moved:
+                            break
+                        total += moved
+                        chunks += 1
+                        logger.info("Archiviate %s transazioni (totale %s)", moved, total)
+                        # Breve pausa: l'archiviazione non deve monopolizzare il lock di scrittura
+                        time.sleep(ARCHIVE_PAUSE_SECONDS)
+                finally:
+                    db.close()
+            return total
+        finally:
+            self._running.release()
+
+
+def archive_stats() -> dict:
+    """Dimensione di tabella calda e archivio su tutti gli shard (per monitoraggio)"""
+    hot, cold, oldest_hot, newest_cold = 0, 0, None, None
+    for shard_id in range(len(shard_engines)):
+        db = session_for_shard(shard_id)
+        try:
+            shard_hot, shard_oldest = db.query(func.count(Transaction.id), func.min(Transaction.created_at)).one()
+            shard_cold, shard_newest = db.query(func.count(ArchivedTransaction.id), func.max(ArchivedTransaction.created_at)).one()
+        finally:
+            db.close()
+        hot += shard_hot
+        cold += shard_cold
+        if shard_oldest is not None and (oldest_hot is None or shard_oldest < oldest_hot):
+            oldest_hot = shard_oldest
+        if shard_newest is not None and (newest_cold is None or shard_newest > newest_cold):
+            newest_cold = shard_newest
+    return {
+        "hot_transactions": hot,
+        "archived_transactions": cold,
+        "oldest_hot": oldest_hot,
+        "newest_archived": newest_cold,
+        "horizon_days": ARCHIVE_HORIZON_DAYS,
+        "running": transaction_archiver.running
+    }
+
+
+# Istanza globale per il processo corrente
+transaction_archiver = TransactionArchiver()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archiviazione delle transazioni più vecchie")
+    parser.add_argument("--horizon-days", type=int, default=ARCHIVE_HORIZON_DAYS)
+    parser.add_argument("--chunk-size", type=int, default=ARCHIVE_CHUNK_SIZE)
+    parser.add_argument("--max-chunks", type=int, default=None, help="Ferma dopo N blocchi (riprendibile)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    archiver = TransactionArchiver(horizon_days=args.horizon_days, chunk_size=args.chunk_size)
+    print(f"{archiver.run(args.max_chunks)} transazioni archiviate")
+
+
+if __name__ == "__main__":
+    main()
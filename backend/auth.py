@@ -2,6 +2,8 @@ import bcrypt
 
 import jwt
 
+import uuid
+
 from datetime import datetime, timedelta
 
 from fastapi import HTTPException, Depends, status
@@ -14,7 +16,7 @@ from database import get_db
 
 from models.user import User
 
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, ADMIN_EMAILS
 
 
 security = HTTPBearer()
@@ -40,9 +42,20 @@ def create_access_token(data: dict):
 
     to_encode = data.copy()
 
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    now = datetime.utcnow()
+
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    # jti identifica il singolo token per poterlo revocare (logout); iat_ms, al millisecondo,
 
-    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
+    # lo confronta con la revoca di tutti i token dell'utente (iat è al secondo)
+
+    to_encode.update({
+        "exp": expire,
+        "iat": now,
+        "iat_ms": (now - datetime(1970, 1, 1)) // timedelta(milliseconds=1),
+        "jti": uuid.uuid4().hex
+    })
 
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
@@ -77,9 +90,33 @@ def check_refresh_token(token: str) -> bool:
         return False
 
 
-def verify_token(token: str):
+def decode_token(token: str) -> dict:
 
-    """Verifica un JWT token"""
+    """Decodifica un JWT token (firma e scadenza) e ne restituisce i claims"""
+
+    try:
+
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+    except jwt.PyJWTError:
+
+        raise HTTPException(
+
+            status_code=status.HTTP_401_UNAUTHORIZED,
+
+            detail="Token non valido",
+
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def verify_token(token: str, db: Session = None):
+
+    """Verifica un JWT token, inclusa la lista dei token revocati"""
+
+    # Importati alla prima verifica, non all'avvio del worker
+
+    from revocation import token_revocations
 
     try:
 
@@ -95,6 +132,19 @@ def verify_token(token: str):
 
                 detail="Token non valido",
 
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        # Filtro di Bloom in memoria: il database viene interrogato solo per i possibili revocati
+
+        if token_revocations.is_revoked(payload, db):
+
+            raise HTTPException(
+
+                status_code=status.HTTP_401_UNAUTHORIZED,
+
+                detail="Token revocato",
+
                 headers={"WWW-Authenticate": "Bearer"},
             )
         return email
@@ -115,9 +165,12 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
 
     """Dependency per ottenere l'utente corrente dal token"""
 
-    email = verify_token(credentials.credentials)
+    from sharding import route_by_email
 
-    user = db.query(User).filter(User.email == email).first()
+    email = verify_token(credentials.credentials, db)
+
+    # Con più shard la sessione della richiesta va sullo shard dell'utente
+    user = db.query(User).filter(User.email == email).first() if route_by_email(db, email) else None
 
     if user is None:
 
@@ -129,4 +182,19 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
 
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user 
\ No newline at end of file
+    return user
+
+
+def get_current_admin(current_user: User = Depends(get_current_user)):
+
+    """Dependency per le operazioni riservate agli amministratori"""
+
+    if current_user.email.lower() not in ADMIN_EMAILS:
+
+        raise HTTPException(
+
+            status_code=status.HTTP_403_FORBIDDEN,
+
+            detail="Operazione riservata agli amministratori"
+        )
+    return current_user
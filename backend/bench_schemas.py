@@ -0,0 +1,182 @@
+import argparse
+import json
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple
+
+from models import User, Transaction, Card, ScheduledTransfer
+from schemas import (
+    UserCreate, UserResponse, TransactionResponse, CardListResponse, BootstrapResponse,
+    TRANSACTION_LIST_ADAPTER, CARD_LIST_ADAPTER, SCHEDULED_TRANSFER_LIST_ADAPTER
+)
+
+# Dimensione delle liste: come una pagina di /transactions o /bootstrap
+PAGE_SIZE = 100
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[], object]
+    items: int  # Elementi elaborati per chiamata (il risultato è per elemento)
+
+
+def _user() -> User:
+    return User(
+        id=1,
+        email="mario.rossi@example.com",
+        password_hash="x",
+        first_name="Mario",
+        last_name="Rossi",
+        phone_number="+39 333 1234567",
+        date_of_birth=date(1990, 1, 1),
+        address="Via Roma 1",
+        city="Roma",
+        postal_code="00100",
+        country="Italia",
+        balance=1000.0,
+        created_at=datetime(2026, 1, 1),
+        is_verified=True
+    )
+
+
+def _transactions() -> List[Transaction]:
+    start = datetime(2026, 1, 1)
+    return [
+        Transaction(
+            id=i,
+            from_user_id=1 if i % 2 else 2,
+            to_user_id=2 if i % 2 else 1,
+            amount=10.0 + i,
+            transaction_type="transfer",
+            description=f"Trasferimento {i}",
+            created_at=start + timedelta(minutes=i)
+        )
+        for i in range(PAGE_SIZE)
+    ]
+
+
+def _cards() -> List[Card]:
+    return [
+        Card(
+            id=i,
+            user_id=1,
+            card_token=f"tok_{i}",
+            card_last4=f"{i:04d}",
+            card_brand="Visa",
+            is_default=i == 0,
+            created_at=datetime(2026, 1, 1)
+        )
+        for i in range(5)
+    ]
+
+
+def _scheduled_transfers() -> List[ScheduledTransfer]:
+    return [
+        ScheduledTransfer(
+            id=i,
+            user_id=1,
+            to_user_id=2,
+            amount=25.0,
+            frequency="monthly",
+            anchor_day=1,
+            next_run_at=datetime(2026, 2, 1),
+            scheduled_for=datetime(2026, 2, 1),
+            status="active",
+            attempts=0,
+            created_at=datetime(2026, 1, 1)
+        )
+        for i in range(20)
+    ]
+
+
+def build_cases() -> List[Case]:
+    """Modelli dei percorsi caldi: registrazione, /me, /transactions, /cards, /bootstrap"""
+    user = _user()
+    transactions = _transactions()
+    cards = _cards()
+    schedules = _scheduled_transfers()
+    registration = {
+        "email": "mario.rossi@example.com",
+        "password": "secret1",
+        "first_name": " mario ",
+        "last_name": "rossi",
+        "phone_number": "+39 333 1234567",
+        "date_of_birth": "1990-01-01",
+        "address": "Via Roma 1",
+        "city": "roma",
+        "postal_code": "00100"
+    }
+
+    user_response = UserResponse.model_validate(user)
+    transaction_page = TRANSACTION_LIST_ADAPTER.validate_python(transactions, from_attributes=True)
+    card_list = CardListResponse(cards=CARD_LIST_ADAPTER.validate_python(cards, from_attributes=True), total=len(cards))
+    bootstrap = BootstrapResponse(balance=user.balance, user=user_response, transactions=transaction_page, cards=card_list)
+
+    return [
+        Case("UserCreate.validate", lambda: UserCreate.model_validate(registration), 1),
+        Case("UserResponse.validate_orm", lambda: UserResponse.model_validate(user), 1),
+        Case("UserResponse.dump_json", user_response.model_dump_json, 1),
+        Case("TransactionResponse.validate_orm", lambda: TransactionResponse.model_validate(transactions[0]), 1),
+        Case("transactions.validate_per_item", lambda: [TransactionResponse.model_validate(t) for t in transactions], PAGE_SIZE),
+        Case("transactions.validate_adapter", lambda: TRANSACTION_LIST_ADAPTER.validate_python(transactions, from_attributes=True), PAGE_SIZE),
+        Case("transactions.dump_json_adapter", lambda: TRANSACTION_LIST_ADAPTER.dump_json(transaction_page), PAGE_SIZE),
+        Case("cards.validate_adapter", lambda: CARD_LIST_ADAPTER.validate_python(cards, from_attributes=True), len(cards)),
+        Case("CardListResponse.dump_json", card_list.model_dump_json, len(cards)),
+        Case("scheduled_transfers.validate_adapter", lambda: SCHEDULED_TRANSFER_LIST_ADAPTER.validate_python(schedules, from_attributes=True), len(schedules)),
+        Case("BootstrapResponse.dump_json", bootstrap.model_dump_json, 1),
+    ]
+
+
+def measure(case: Case, repeat: int, min_time: float) -> float:
+    """Microsecondi per elemento (migliore di repeat misure, ciascuna lunga almeno min_time)"""
+    timer = timeit.Timer(case.run)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number / case.items * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark di validazione e serializzazione degli schemi")
+    parser.add_argument("--filter", default="", help="Solo i casi il cui nome contiene questo testo")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Durata minima di ogni misura (secondi)")
+    parser.add_argument("--save", help="Salva i risultati come riferimento (JSON)")
+    parser.add_argument("--compare", help="Confronta con un riferimento salvato sulla stessa macchina")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Peggioramento tollerato (0.25 = +25%%)")
+    args = parser.parse_args()
+
+    baseline: Dict[str, float] = {}
+    if args.compare:
+        with open(args.compare) as source:
+            baseline = json.load(source)
+
+    results = {}
+    regressions = []
+    print(f"{'caso':<38}{'µs/elem':>10}{'riferimento':>13}{'delta':>9}")
+    for case in build_cases():
+        if args.filter not in case.name:
+            continue
+        results[case.name] = measure(case, args.repeat, args.min_time)
+
+        line = f"{case.name:<38}{results[case.name]:>10.2f}"
+        if case.name in baseline:
+            delta = results[case.name] / baseline[case.name] - 1
+            line += f"{baseline[case.name]:>13.2f}{delta:>+9.0%}"
+            if delta > args.max_regression:
+                regressions.append(case.name)
+                line += "  REGRESSIONE"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as destination:
+            json.dump(results, destination, indent=2)
+
+    if regressions:
+        print(f"{len(regressions)} casi oltre la soglia di +{args.max_regression:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
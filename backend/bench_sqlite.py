@@ -0,0 +1,147 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import begin_write, create_sqlite_engine
+from migrations import upgrade
+from models import User, Transaction
+
+INITIAL_BALANCE = 1000.0
+
+
+def _prepare(engine, users: int):
+    upgrade(engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add_all(
+        User(
+            email=f"bench{i}@example.com",
+            password_hash="x",
+            first_name="Bench",
+            last_name=str(i),
+            phone_number="3330000000",
+            date_of_birth=date(1990, 1, 1),
+            address="Via Roma 1",
+            city="Roma",
+            postal_code="00100",
+            balance=INITIAL_BALANCE
+        )
+        for i in range(users)
+    )
+    db.commit()
+    ids = [row.id for row in db.query(User.id).all()]
+    db.close()
+    return Session, ids
+
+
+def _transfer(db, from_id: int, to_id: int, amount: float):
+    """Stesso schema di /transfer: lettura del saldo, controllo, aggiornamento in Python"""
+    begin_write(db)
+    sender = db.query(User).filter(User.id == from_id).with_for_update().first()
+    recipient = db.query(User).filter(User.id == to_id).with_for_update().first()
+    if sender.balance < amount:
+        db.rollback()
+        return False
+    sender.balance -= amount
+    recipient.balance += amount
+    db.add(Transaction(
+        from_user_id=from_id,
+        to_user_id=to_id,
+        amount=amount,
+        transaction_type="transfer",
+        description="bench"
+    ))
+    db.commit()
+    return True
+
+
+def run(label: str, engine, threads: int, operations: int, users: int, read_ratio: float) -> dict:
+    Session, ids = _prepare(engine, users)
+    stats = {"writes": 0, "reads": 0, "locked": 0}
+    stats_lock = threading.Lock()
+
+    def worker(seed: int):
+        rnd = random.Random(seed)
+        local = {"writes": 0, "reads": 0, "locked": 0}
+        for _ in range(operations):
+            db = Session()
+            try:
+                if rnd.random() < read_ratio:
+                    user_id = rnd.choice(ids)
+                    db.query(Transaction).filter(
+                        (Transaction.from_user_id == user_id) | (Transaction.to_user_id == user_id)
+                    ).order_by(Transaction.created_at.desc()).limit(20).all()
+                    local["reads"] += 1
+                else:
+                    from_id, to_id = rnd.sample(ids, 2)
+                    _transfer(db, from_id, to_id, round(rnd.uniform(1, 20), 2))
+                    local["writes"] += 1
+            except OperationalError as e:
+                db.rollback()
+                if "locked" not in str(e):
+                    raise
+                local["locked"] += 1
+            finally:
+                db.close()
+        with stats_lock:
+            for key, value in local.items():
+                stats[key] += value
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # Con trasferimenti serializzati la somma dei saldi non cambia
+    db = Session()
+    total = db.query(func.sum(User.balance)).scalar()
+    db.close()
+    engine.dispose()
+
+    return {
+        "label": label,
+        "elapsed": elapsed,
+        "ops_per_second": (stats["writes"] + stats["reads"]) / elapsed,
+        "drift": round(total - INITIAL_BALANCE * users, 2),
+        **stats
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronto di concorrenza: SQLite predefinito vs profilo a nodo singolo")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--operations", type=int, default=200, help="Operazioni per thread")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--read-ratio", type=float, default=0.8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = []
+        for label, factory in (
+            ("predefinito", lambda url: create_engine(url, connect_args={"check_same_thread": False})),
+            ("profilo nodo singolo", create_sqlite_engine)
+        ):
+            url = f"sqlite:///{os.path.join(directory, label.replace(' ', '_'))}.db"
+            results.append(run(label, factory(url), args.threads, args.operations, args.users, args.read_ratio))
+
+    print(f"{'configurazione':<22}{'op/s':>10}{'scritture':>11}{'letture':>9}{'locked':>8}{'deriva saldi':>14}")
+    for result in results:
+        print(
+            f"{result['label']:<22}{result['ops_per_second']:>10.0f}{result['writes']:>11}"
+            f"{result['reads']:>9}{result['locked']:>8}{result['drift']:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
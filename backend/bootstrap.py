@@ -0,0 +1,95 @@
+import asyncio
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from config import BOOTSTRAP_TRANSACTIONS_PAGE_SIZE
+from database import session_for_user
+from models import User, Card
+from counterparties import enrich_transactions
+from schemas import CardListResponse, CARD_LIST_ADAPTER
+
+BOOTSTRAP_FIELDS = ("profile", "transactions", "cards")
+
+
+def parse_fields(fields: Optional[str]) -> set:
+    """Sezioni richieste (separate da virgola); tutte se non specificato"""
+    if not fields:
+        return set(BOOTSTRAP_FIELDS)
+    selected = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = selected - set(BOOTSTRAP_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Sezioni non valide: {', '.join(sorted(unknown))}"
+        )
+    return selected
+
+
+def load_transactions(db: Session, user_id: int, limit: Optional[int] = None, offset: int = 0):
+    """Transazioni dell'utente dalla più recente (anche archiviate), eventualmente paginate"""
+    # Import differito come nelle rotte: archive (e l'archiviatore) si carica alla prima richiesta
+    from archive import load_history
+
+    return load_history(db, user_id, limit, offset)
+
+
+def load_transaction_page(db: Session, user_id: int, limit: Optional[int] = None, offset: int = 0):
+    """Pagina di transazioni con i dati della controparte (query costanti per pagina)"""
+    return enrich_transactions(db, load_transactions(db, user_id, limit, offset), user_id)
+
+
+def load_cards(db: Session, user_id: int) -> CardListResponse:
+    """Carte salvate dell'utente, la predefinita per prima"""
+    cards = db.query(Card).filter(Card.user_id == user_id).order_by(Card.is_default.desc(), Card.created_at.desc()).all()
+    return CardListResponse(cards=CARD_LIST_ADAPTER.validate_python(cards, from_attributes=True), total=len(cards))
+
+
+def build_bootstrap(db: Session, user: User, fields: set) -> dict:
+    """Payload di bootstrap costruito in sequenza sulla sessione data (login/registrazione)"""
+    payload = {"balance": user.balance}
+    if "profile" in fields:
+        payload["user"] = user
+    if "transactions" in fields:
+        payload["transactions"] = load_transaction_page(db, user.id, BOOTSTRAP_TRANSACTIONS_PAGE_SIZE)
+    if "cards" in fields:
+        payload["cards"] = load_cards(db, user.id)
+    return payload
+
+
+def _with_session(loader, user_id: int, *args):
+    # Una sessione per query: le sessioni SQLAlchemy non si condividono tra thread
+    db = session_for_user(user_id)
+    try:
+        return loader(db, user_id, *args)
+    finally:
+        db.close()
+
+
+async def build_bootstrap_concurrent(db: Session, user: User, fields: set) -> dict:
+    """
+    Payload di bootstrap con le query indipendenti eseguite in parallelo
+
+    db è la sessione della richiesta, usata solo per l'autenticazione: va
+    chiusa prima di aprire quelle dei loader, altrimenti ogni richiesta
+    terrebbe tre connessioni del pool e, con il pool pieno di richieste in
+    attesa della seconda e della terza, nessuna potrebbe proseguire. L'utente
+    è già caricato e resta leggibile anche fuori dalla sessione.
+    """
+    db.close()
+
+    payload = {"balance": user.balance}
+    if "profile" in fields:
+        payload["user"] = user
+
+    loaders = {}
+    if "transactions" in fields:
+        loaders["transactions"] = run_in_threadpool(_with_session, load_transaction_page, user.id, BOOTSTRAP_TRANSACTIONS_PAGE_SIZE)
+    if "cards" in fields:
+        loaders["cards"] = run_in_threadpool(_with_session, load_cards, user.id)
+
+    results = await asyncio.gather(*loaders.values())
+    payload.update(zip(loaders.keys(), results))
+    return payload
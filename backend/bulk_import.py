@@ -0,0 +1,331 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import socket
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import IMPORT_CHUNK_SIZE, IMPORT_HASH_WORKERS, IMPORT_LEASE_SECONDS
+from database import SessionLocal, begin_write
+from auth import hash_password
+from models import User, ImportJob, ImportJobError
+from schemas import UserCreate
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("csv", "ndjson")
+
+# Stati da cui un import può (ri)partire; 'running' ha già un runner, finché il suo lease non scade
+STARTABLE_STATES = ("pending", "failed")
+RESUMABLE_STATES = ("failed",)
+
+
+class ImportLeaseLost(Exception):
+    """Il lease dell'import è scaduto ed è passato a un altro runner"""
+
+
+def detect_format(path: str) -> str:
+    """Ricava il formato del file dall'estensione (default: csv)"""
+    extension = os.path.splitext(path)[1].lower()
+    return "ndjson" if extension in (".ndjson", ".jsonl") else "csv"
+
+
+def read_records(path: str, source_format: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Legge il file riga per riga senza caricarlo in memoria
+
+    Args:
+        path: Percorso del file
+        source_format: 'csv' oppure 'ndjson'
+
+    Returns:
+        Iteratore di tuple (numero riga, record, errore di parsing)
+    """
+    with open(path, newline="", encoding="utf-8") as source:
+        if source_format == "csv":
+            for row_number, row in enumerate(csv.DictReader(source), start=1):
+                # I campi vuoti usano i default dello schema (es. country)
+                yield row_number, {key: value for key, value in row.items() if key and value != ""}, None
+        else:
+            row_number = 0
+            for line in source:
+                if not line.strip():
+                    continue
+                row_number += 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield row_number, None, f"JSON non valido: {e.msg}"
+                    continue
+                if not isinstance(record, dict):
+                    yield row_number, None, "Ogni riga deve contenere un oggetto JSON"
+                    continue
+                yield row_number, record, None
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{' -> '.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+def _existing_emails(db: Session, emails: List[str]) -> set:
+    """Una sola query IN per blocco per trovare le email già registrate"""
+    if not emails:
+        return set()
+    return {row.email for row in db.query(User.email).filter(User.email.in_(emails))}
+
+
+def _process_chunk(db: Session, job: ImportJob, runner_id: str, chunk: List, pool: ProcessPoolExecutor):
+    """Valida, deduplica, calcola gli hash e inserisce un blocco in un'unica transazione"""
+    begin_write(db)
+    _renew_lease(db, job, runner_id)
+    errors = []
+    candidates = []
+    seen_emails = set()
+
+    for row_number, record, parse_error in chunk:
+        if parse_error:
+            errors.append((row_number, None, parse_error))
+            continue
+        try:
+            user_data = UserCreate(**record)
+        except ValidationError as e:
+            errors.append((row_number, record.get("email"), _format_validation_error(e)))
+            continue
+        if user_data.email in seen_emails:
+            errors.append((row_number, user_data.email, "Email duplicata nel file"))
+            continue
+        seen_emails.add(user_data.email)
+        candidates.append((row_number, user_data))
+
+    existing = _existing_emails(db, [user_data.email for _, user_data in candidates])
+    new_users = []
+    for row_number, user_data in candidates:
+        if user_data.email in existing:
+            errors.append((row_number, user_data.email, "Email già registrata"))
+        else:
+            new_users.append(user_data)
+
+    # bcrypt è il costo dominante: gli hash vengono calcolati in parallelo sui processi
+    chunksize = max(1, len(new_users) // (IMPORT_HASH_WORKERS * 4))
+    hashes = list(pool.map(hash_password, [user_data.password for user_data in new_users], chunksize=chunksize))
+
+    rows = [
+        {
+            **user_data.model_dump(exclude={"password"}),
+            "password_hash": password_hash
+        }
+        for user_data, password_hash in zip(new_users, hashes)
+    ]
+
+    if rows:
+        # executemany: un solo statement INSERT per l'intero blocco
+        db.execute(insert(User), rows)
+
+    if errors:
+        db.execute(insert(ImportJobError), [
+            {"job_id": job.id, "row_number": row_number, "email": email, "message": message}
+            for row_number, email, message in errors
+        ])
+
+    # L'avanzamento viene salvato nello stesso commit: una ripresa non duplica nulla
+    job.processed_rows += len(chunk)
+    job.inserted_rows += len(rows)
+    job.failed_rows += len(errors)
+    db.commit()
+
+
+def create_import_job(db: Session, path: str, source_format: Optional[str] = None) -> ImportJob:
+    """Registra un nuovo import da eseguire"""
+    source_format = source_format or detect_format(path)
+    if source_format not in SUPPORTED_FORMATS:
+        raise ValueError(f"Formato non supportato: {source_format}")
+
+    begin_write(db, ImportJob)
+    job = ImportJob(source_path=os.path.abspath(path), source_format=source_format)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def new_runner_id() -> str:
+    """Identificativo del runner di un import (più import possono girare nello stesso processo)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_import_job(db: Session, job_id: int, runner_id: str, states: Tuple[str, ...] = STARTABLE_STATES,
+                     force: bool = False) -> bool:
+    """
+    Porta il job in 'running' per runner_id se si trova in uno degli stati indicati
+
+    Un job 'running' il cui lease è scaduto (runner terminato senza
+    aggiornarlo) viene ripreso come uno in 'failed'; con force anche se il
+    lease è ancora valido. L'UPDATE condizionato è atomico: tra due richieste
+    (o un avvio e una ripresa) concorrenti una sola lo trova nello stato
+    atteso, quindi un job non ha mai due runner.
+    """
+    now = datetime.utcnow()
+    lease_free = (ImportJob.claimed_until == None) | (ImportJob.claimed_until < now)
+    running = (ImportJob.status == "running") if force else (ImportJob.status == "running") & lease_free
+
+    begin_write(db, ImportJob)
+    claimed = db.query(ImportJob).filter(
+        ImportJob.id == job_id,
+        ImportJob.status.in_(states) | running
+    ).update({
+        "status": "running",
+        "last_error": None,
+        "claimed_by": runner_id,
+        "claimed_until": now + timedelta(seconds=IMPORT_LEASE_SECONDS)
+    }, synchronize_session=False)
+    db.commit()
+    return bool(claimed)
+
+
+def _renew_lease(db: Session, job: ImportJob, runner_id: str):
+    """Rinnova il lease nella transazione di scrittura del blocco, se è ancora di questo runner"""
+    owner = db.query(ImportJob.claimed_by).filter(ImportJob.id == job.id).with_for_update().scalar()
+    if owner != runner_id:
+        raise ImportLeaseLost(f"Import {job.id} ripreso da {owner}")
+    job.claimed_until = datetime.utcnow() + timedelta(seconds=IMPORT_LEASE_SECONDS)
+
+
+def _fail_job(db: Session, job_id: int, runner_id: str, error: str):
+    begin_write(db, ImportJob)
+    db.query(ImportJob).filter(
+        ImportJob.id == job_id,
+        ImportJob.claimed_by == runner_id
+    ).update({
+        "status": "failed",
+        "last_error": error,
+        "claimed_by": None,
+        "claimed_until": None
+    }, synchronize_session=False)
+    db.commit()
+
+
+def run_import_job(job_id: int, chunk_size: int = IMPORT_CHUNK_SIZE, runner_id: Optional[str] = None,
+                   force: bool = False) -> ImportJob:
+    """
+    Esegue (o riprende) un import a partire dall'ultimo blocco confermato
+
+    Args:
+        job_id: ID del job di import
+        chunk_size: Numero di righe per blocco
+        runner_id: Runner per cui il chiamante ha già preso il job (claim_import_job)
+        force: Riprende anche un job in 'running' con il lease ancora valido (il suo processo deve essere terminato)
+
+    Returns:
+        Il job aggiornato
+    """
+    db = SessionLocal()
+    try:
+        if runner_id is None:
+            runner_id = new_runner_id()
+            if not claim_import_job(db, job_id, runner_id, force=force):
+                job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+                if job is None:
+                    raise ValueError("Import non trovato")
+                # Già completato, oppure in esecuzione in un altro runner
+                logger.info("Import %s non avviato: stato %s", job_id, job.status)
+                return job
+        job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+
+        # Le righe già confermate vengono saltate
+        skip = job.processed_rows
+        logger.info("Import %s: avvio da riga %s di %s", job.id, skip + 1, job.source_path)
+
+        with ProcessPoolExecutor(max_workers=IMPORT_HASH_WORKERS) as pool:
+            chunk = []
+            for record in read_records(job.source_path, job.source_format):
+                if record[0] <= skip:
+                    continue
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    _process_chunk_with_retry(db, job, runner_id, chunk, pool)
+                    chunk = []
+            if chunk:
+                _process_chunk_with_retry(db, job, runner_id, chunk, pool)
+
+        begin_write(db, ImportJob)
+        _renew_lease(db, job, runner_id)
+        job.status = "completed"
+        job.claimed_by = None
+        job.claimed_until = None
+        db.commit()
+        db.refresh(job)
+        logger.info("Import %s completato: %s inseriti, %s errori", job.id, job.inserted_rows, job.failed_rows)
+        return job
+
+    except Exception as e:
+        db.rollback()
+        try:
+            # Solo se il job è ancora di questo runner (non dopo ImportLeaseLost)
+            _fail_job(db, job_id, runner_id, str(e))
+        except Exception:
+            db.rollback()
+            logger.exception("Import %s: stato 'failed' non salvato, ripresa possibile alla scadenza del lease", job_id)
+        raise
+    finally:
+        db.close()
+
+
+def _process_chunk_with_retry(db: Session, job: ImportJob, runner_id: str, chunk: List, pool: ProcessPoolExecutor):
+    try:
+        _process_chunk(db, job, runner_id, chunk, pool)
+    except IntegrityError:
+        # Un utente del blocco si è registrato nel frattempo: il nuovo controllo IN lo esclude
+        db.rollback()
+        _process_chunk(db, job, runner_id, chunk, pool)
+
+
+def run_import_job_in_background(job_id: int, runner_id: Optional[str] = None):
+    """Variante per BackgroundTasks: l'errore va nel log e nel job (in 'failed'), non al server"""
+    try:
+        run_import_job(job_id, runner_id=runner_id)
+    except Exception:
+        logger.exception("Import %s interrotto", job_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import massivo di utenti da CSV o NDJSON")
+    parser.add_argument("path", nargs="?", help="File da importare")
+    parser.add_argument("--format", choices=SUPPORTED_FORMATS, help="Formato del file (default: dall'estensione)")
+    parser.add_argument("--resume", type=int, metavar="JOB_ID", help="Riprende un import interrotto")
+    parser.add_argument("--force", action="store_true",
+                        help="Con --resume, riprende anche un import 'running' con il lease ancora valido (il suo processo deve essere terminato)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.resume:
+        job_id = args.resume
+    elif args.path:
+        db = SessionLocal()
+        try:
+            job_id = create_import_job(db, args.path, args.format).id
+        finally:
+            db.close()
+    else:
+        parser.error("specificare un file oppure --resume JOB_ID")
+
+    job = run_import_job(job_id, chunk_size=args.chunk_size, force=args.force)
+    print(f"Import {job.id}: {job.status}, {job.processed_rows} righe, "
+          f"{job.inserted_rows} inseriti, {job.failed_rows} errori")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,4 +17,126 @@ HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
 
 # Configurazione CORS
-CORS_ORIGINS = ["*"]
\ No newline at end of file
+CORS_ORIGINS = ["*"]
+
+# Amministratori (email separate da virgola)
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+# Configurazione ricerca destinatari
+RECIPIENT_INDEX_SYNC_SECONDS = float(os.getenv("RECIPIENT_INDEX_SYNC_SECONDS", "30"))
+# Prefisso minimo per la ricerca nell'indice (più corto: solo tra i contatti frequenti)
+RECIPIENT_SEARCH_MIN_PREFIX = int(os.getenv("RECIPIENT_SEARCH_MIN_PREFIX", "3"))
+FREQUENT_CONTACTS_HISTORY = int(os.getenv("FREQUENT_CONTACTS_HISTORY", "200"))
+FREQUENT_CONTACTS_SIZE = int(os.getenv("FREQUENT_CONTACTS_SIZE", "10"))
+FREQUENT_CONTACTS_MAX_USERS = int(os.getenv("FREQUENT_CONTACTS_MAX_USERS", "10000"))
+FREQUENT_CONTACTS_TTL_SECONDS = float(os.getenv("FREQUENT_CONTACTS_TTL_SECONDS", "600"))
+
+# Configurazione import massivo utenti
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", str(os.cpu_count() or 1)))
+IMPORT_UPLOAD_DIR = os.getenv("IMPORT_UPLOAD_DIR", "imports")
+# Lease rinnovato a ogni blocco: un import fermo da più tempo può essere ripreso
+IMPORT_LEASE_SECONDS = int(os.getenv("IMPORT_LEASE_SECONDS", "600"))
+
+# Profilazione SQL per richiesta (solo sviluppo/staging)
+SQL_PROFILING = os.getenv("SQL_PROFILING", "false").lower() in ("1", "true", "yes")
+SQL_PROFILING_SLOW_MS = float(os.getenv("SQL_PROFILING_SLOW_MS", "500"))
+SQL_PROFILING_REPEAT_THRESHOLD = int(os.getenv("SQL_PROFILING_REPEAT_THRESHOLD", "5"))
+
+# Configurazione logging (coda limitata, campionamento per categoria "nome=frazione")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = {
+    category.strip(): float(rate)
+    for category, rate in (
+        item.split("=", 1) for item in os.getenv("LOG_SAMPLE_RATES", "validation=0.1,token_refresh=0.01").split(",") if "=" in item
+    )
+}
+
+# Configurazione outbox e dispatcher degli eventi post-commit
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "2"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+OUTBOX_RETENTION_HOURS = int(os.getenv("OUTBOX_RETENTION_HOURS", "72"))
+
+# Configurazione revoca dei token (filtro di Bloom in memoria + tabella revoked_tokens)
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "2"))
+REVOCATION_REBUILD_SECONDS = float(os.getenv("REVOCATION_REBUILD_SECONDS", "3600"))
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+
+# Configurazione /bootstrap
+BOOTSTRAP_TRANSACTIONS_PAGE_SIZE = int(os.getenv("BOOTSTRAP_TRANSACTIONS_PAGE_SIZE", "20"))
+
+# Cache delle controparti nello storico transazioni
+COUNTERPARTY_CACHE_SIZE = int(os.getenv("COUNTERPARTY_CACHE_SIZE", "50000"))
+COUNTERPARTY_CACHE_TTL_SECONDS = float(os.getenv("COUNTERPARTY_CACHE_TTL_SECONDS", "300"))
+
+# Profilo SQLite per installazioni a nodo singolo (DATABASE_URL=sqlite:///...)
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", "30"))
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+
+# Avvio dell'applicazione
+# Con DB_AUTO_MIGRATE ogni worker applica le migrazioni all'avvio: solo per installazioni a processo singolo
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "false").lower() in ("1", "true", "yes")
+STARTUP_TARGET_MS = float(os.getenv("STARTUP_TARGET_MS", "1500"))
+
+# Archiviazione delle transazioni (tabella calda / archivio freddo)
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "365"))
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", "1000"))
+ARCHIVE_PAUSE_SECONDS = float(os.getenv("ARCHIVE_PAUSE_SECONDS", "0.05"))  # Tra un blocco e l'altro
+
+# Scheduler dei bonifici programmati
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "200"))
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "5"))
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "120"))
+SCHEDULER_MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", "4"))  # Poi l'esecuzione viene saltata
+SCHEDULER_RETRY_BASE_SECONDS = float(os.getenv("SCHEDULER_RETRY_BASE_SECONDS", "300"))
+SCHEDULER_RETRY_MAX_SECONDS = float(os.getenv("SCHEDULER_RETRY_MAX_SECONDS", "14400"))
+# Prima esecuzione accettata fino a questi secondi nel passato (orologi e latenza dei client)
+SCHEDULER_START_TOLERANCE_SECONDS = float(os.getenv("SCHEDULER_START_TOLERANCE_SECONDS", "60"))
+
+# Sharding di utenti e saldi (URL separati da virgola; vuoto = un solo database)
+# DATABASE_URL resta il database principale: directory degli utenti, saga e tabelle globali
+SHARD_DATABASE_URLS = [url.strip() for url in os.getenv("SHARD_DATABASE_URLS", "").split(",") if url.strip()]
+SHARD_DIRECTORY_CACHE_SIZE = int(os.getenv("SHARD_DIRECTORY_CACHE_SIZE", "100000"))
+SAGA_RECOVERY_AFTER_SECONDS = float(os.getenv("SAGA_RECOVERY_AFTER_SECONDS", "60"))  # Saga ferme da più tempo vengono riprese
+
+# Report generati in background (estratti conto mensili, riepiloghi annuali)
+REPORT_OUTPUT_DIR = os.getenv("REPORT_OUTPUT_DIR", "reports")
+REPORT_WORKER_PROCESSES = int(os.getenv("REPORT_WORKER_PROCESSES", "2"))
+REPORT_POLL_SECONDS = float(os.getenv("REPORT_POLL_SECONDS", "2"))
+REPORT_LEASE_SECONDS = int(os.getenv("REPORT_LEASE_SECONDS", "900"))  # Un job fermo da più tempo viene ripreso
+REPORT_MAX_ATTEMPTS = int(os.getenv("REPORT_MAX_ATTEMPTS", "3"))
+REPORT_MAX_QUEUED_PER_USER = int(os.getenv("REPORT_MAX_QUEUED_PER_USER", "5"))  # In coda o in esecuzione
+REPORT_MAX_RUNNING_PER_USER = int(os.getenv("REPORT_MAX_RUNNING_PER_USER", "1"))
+REPORT_STREAM_BATCH_SIZE = int(os.getenv("REPORT_STREAM_BATCH_SIZE", "1000"))  # Righe per fetch del cursore
+
+# Rate limiting per rotta (token bucket per IP e per utente del token)
+# Formato: "METODO /percorso=ip:N/secondi,sub:N/secondi;..." ("*" vale per le rotte non elencate);
+# i parametri si indicano tra graffe come nelle rotte (es. "POST /admin/users/import/{job_id}/resume")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS",
+    "POST /login=ip:20/60;"
+    "POST /register=ip:10/60;"
+    "POST /refresh-token=sub:10/60;"
+    "POST /transfer=ip:120/60,sub:30/60;"
+    "POST /recharge=ip:60/60,sub:10/60;"
+    "POST /scheduled-transfers=sub:20/60;"
+    "POST /reports=sub:10/60;"
+    "GET /transactions/export=sub:5/60;"
+    "GET /recipients/search=sub:120/60;"
+    "*=ip:600/60"
+)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # 'memory' (per processo) o 'redis' (condiviso, richiede il pacchetto redis)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # Bucket tenuti in memoria
+# Proxy fidati davanti all'API, ciascuno aggiunge un indirizzo a X-Forwarded-For (0: header ignorato)
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from config import COUNTERPARTY_CACHE_SIZE, COUNTERPARTY_CACHE_TTL_SECONDS
+from database import shard_for_user, session_for_shard
+from models import User, Transaction
+from schemas import TransactionResponse, TRANSACTION_LIST_ADAPTER
+
+
+def mask_email(email: str) -> str:
+    """Maschera la parte locale dell'email (es. m***o@example.com)"""
+    local, _, domain = email.partition("@")
+    if len(local) <= 2:
+        masked = local[:1] + "***"
+    else:
+        masked = f"{local[0]}***{local[-1]}"
+    return f"{masked}@{domain}" if domain else masked
+
+
+def _load_users(db: Session, shard_id: int, user_ids: List[int]):
+    # Le controparti su un altro shard si leggono con una sessione dedicata
+    if shard_id == db.info.get("shard_id", 0):
+        return db.query(User.id, User.first_name, User.last_name, User.email).filter(User.id.in_(user_ids)).all()
+    other = session_for_shard(shard_id)
+    try:
+        return other.query(User.id, User.first_name, User.last_name, User.email).filter(User.id.in_(user_ids)).all()
+    finally:
+        other.close()
+
+
+class CounterpartyCache:
+    """
+    Cache LRU condivisa user_id -> (nome visualizzato, email mascherata)
+
+    Gli utenti mancanti di una pagina di transazioni vengono letti con una sola
+    query IN per shard, quindi il numero di query per pagina è costante. Le voci vengono
+    invalidate quando l'utente modifica il profilo; il TTL copre le modifiche
+    fatte da altri worker.
+    """
+
+    def __init__(self, max_size: int = COUNTERPARTY_CACHE_SIZE, ttl: float = COUNTERPARTY_CACHE_TTL_SECONDS):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (caricato_il, display_name, masked_email)
+        self._max_size = max_size
+        self._ttl = ttl
+
+    def get_many(self, db: Session, user_ids: Iterable[int]) -> Dict[int, Dict]:
+        now = time.monotonic()
+        found = {}
+        missing = set()
+
+        with self._lock:
+            for user_id in set(user_ids):
+                entry = self._entries.get(user_id)
+                if entry is not None and now - entry[0] < self._ttl:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = {"name": entry[1], "email": entry[2]}
+                else:
+                    missing.add(user_id)
+
+        if missing:
+            rows = []
+            by_shard = {}
+            for user_id in missing:
+                by_shard.setdefault(shard_for_user(user_id), []).append(user_id)
+            for shard_id, ids in by_shard.items():
+                rows.extend(_load_users(db, shard_id, ids))
+            with self._lock:
+                for row in rows:
+                    # Come User.display_name, ma senza nome si mostra l'email mascherata: mai quella in chiaro
+                    masked_email = mask_email(row.email)
+                    name = f"{row.first_name} {row.last_name}" if row.first_name else masked_email
+                    self._entries[row.id] = (now, name, masked_email)
+                    self._entries.move_to_end(row.id)
+                    found[row.id] = {"name": name, "email": masked_email}
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+
+        return found
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+def counterparty_id(transaction: Transaction, viewer_id: int) -> Optional[int]:
+    """L'altro utente della transazione dal punto di vista di viewer_id (None per le ricariche)"""
+    if transaction.from_user_id == viewer_id:
+        return transaction.to_user_id
+    return transaction.from_user_id
+
+
+def enrich_transactions(db: Session, transactions: List[Transaction], viewer_id: int) -> List[TransactionResponse]:
+    """Aggiunge nome ed email mascherata della controparte a una pagina di transazioni"""
+    ids = {counterparty_id(transaction, viewer_id) for transaction in transactions}
+    ids.discard(None)
+    counterparties = counterparty_cache.get_many(db, ids) if ids else {}
+
+    # Tutta la pagina validata in una sola chiamata, poi solo assegnazioni
+    enriched = TRANSACTION_LIST_ADAPTER.validate_python(transactions, from_attributes=True)
+    for transaction, response in zip(transactions, enriched):
+        counterparty = counterparties.get(counterparty_id(transaction, viewer_id))
+        if counterparty:
+            response.counterparty_name = counterparty["name"]
+            response.counterparty_email = counterparty["email"]
+    return enriched
+
+
+# Istanza globale per il processo corrente
+counterparty_cache = CounterpartyCache()
@@ -1,17 +1,221 @@
-from sqlalchemy import create_engine
+import threading
+from collections import deque
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool, StaticPool
+from config import (
+    DATABASE_URL,
+    SHARD_DATABASE_URLS,
+    SQLITE_BUSY_TIMEOUT_SECONDS,
+    SQLITE_POOL_SIZE,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+    SQLITE_SYNCHRONOUS
+)
+
+
+class WriterQueue:
+    """
+    Coda FIFO di un solo scrittore per processo
+
+    SQLite ammette un solo writer alla volta: mettere in fila i thread qui, in
+    ordine di arrivo, evita che si contendano il lock del file ripetendo i
+    tentativi fino al busy timeout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._busy = False
+        self._waiting = deque()
+
+    def acquire(self, timeout: float = None) -> bool:
+        with self._lock:
+            if not self._busy:
+                self._busy = True
+                return True
+            turn = threading.Event()
+            self._waiting.append(turn)
+
+        if turn.wait(timeout):
+            return True
+
+        with self._lock:
+            # Il turno potrebbe essere arrivato proprio allo scadere del timeout
+            if turn.is_set():
+                return True
+            self._waiting.remove(turn)
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._waiting:
+                # Il turno passa direttamente al primo in coda
+                self._waiting.popleft().set()
+            else:
+                self._busy = False
+
+
+# Code di scrittura degli engine SQLite configurati con create_sqlite_engine
+_writer_queues = {}
+
+
+def create_sqlite_engine(url: str, foreign_keys: bool = True):
+    """
+    Engine SQLite per installazioni a nodo singolo
+
+    - WAL e pragma (synchronous, cache, mmap, busy timeout) applicati a ogni connessione
+    - transazioni gestite da SQLAlchemy, così begin_write() può usare BEGIN IMMEDIATE
+    - pool di connessioni limitato: in WAL i lettori non bloccano lo scrittore
+    - foreign_keys=False per gli shard, dove la controparte di un movimento può stare altrove
+    """
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_SECONDS},
+        # Un database in memoria esiste solo sulla sua connessione
+        poolclass=StaticPool if in_memory else QueuePool,
+        **({} if in_memory else {"pool_size": SQLITE_POOL_SIZE, "max_overflow": 0})
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # Disattiva la gestione implicita delle transazioni di pysqlite
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_SECONDS * 1000)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA foreign_keys={'ON' if foreign_keys else 'OFF'}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def do_begin(connection):
+        connection.exec_driver_sql(connection.get_execution_options().get("sqlite_begin", "BEGIN"))
+
+    _writer_queues[engine] = WriterQueue()
+    return engine
+
+
+def begin_write(db: Session, model=None):
+    """
+    Inizia una transazione di scrittura sulla sessione
+
+    Su SQLite with_for_update() viene ignorato: qui la transazione parte con
+    BEGIN IMMEDIATE (lock di scrittura preso subito, quindi il controllo del
+    saldo e l'aggiornamento restano serializzati) dopo aver atteso il proprio
+    turno nella coda degli scrittori del processo. Sugli altri database non fa
+    nulla e valgono i lock di riga di with_for_update().
+
+    model indica la tabella da scrivere e quindi il database da bloccare: le
+    tabelle globali stanno sul database principale, le altre sullo shard
+    della sessione (il default).
+    """
+    mapper = inspect(model) if model is not None else None
+    writer_queue = _writer_queues.get(db.get_bind(mapper))
+    if writer_queue is None:
+        return
+
+    # Chiude l'eventuale transazione di sola lettura aperta (es. da get_current_user)
+    if db.in_transaction():
+        db.commit()
+
+    if not writer_queue.acquire(timeout=SQLITE_BUSY_TIMEOUT_SECONDS):
+        raise TimeoutError("Timeout in attesa della coda di scrittura SQLite")
+    db.info["sqlite_writer_queue"] = writer_queue
+    try:
+        db.connection(bind_arguments={"mapper": mapper}, execution_options={"sqlite_begin": "BEGIN IMMEDIATE"})
+    except Exception:
+        writer_queue = db.info.pop("sqlite_writer_queue", None)
+        if writer_queue is not None:
+            writer_queue.release()
+        raise
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _release_writer_queue(session, transaction):
+    # Il turno nella coda termina con il commit o il rollback della transazione di scrittura
+    if transaction.parent is None and "sqlite_writer_queue" in session.info:
+        session.info.pop("sqlite_writer_queue").release()
+
+
+def _engine_for_url(url: str, foreign_keys: bool = True):
+    return create_sqlite_engine(url, foreign_keys) if url.startswith("sqlite") else create_engine(url)
+
 
 # Configurazione del database
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = _engine_for_url(DATABASE_URL)
+
+# Shard di utenti e saldi: senza SHARD_DATABASE_URLS c'è un solo shard, il database principale.
+# Movimenti e bonifici programmati riferiscono utenti di altri shard: lì le chiavi esterne
+# verso users non possono valere (su SQLite vengono disattivate, altrove vanno rimosse)
+shard_engines = [
+    engine if url == DATABASE_URL else _engine_for_url(url, foreign_keys=len(SHARD_DATABASE_URLS) < 2)
+    for url in SHARD_DATABASE_URLS
+] or [engine]
+
+# Tabelle che restano sul database principale; tutte le altre seguono lo shard dell'utente
+GLOBAL_TABLES = {
+    "schema_migrations", "user_directory", "transfer_sagas",
+    "revoked_tokens", "import_jobs", "import_job_errors"
+}
+
+
+def all_engines():
+    """Database principale e shard, senza duplicati (con un solo database coincidono)"""
+    return list(dict.fromkeys([engine, *shard_engines]))
+
+
+def is_sharded() -> bool:
+    return len(shard_engines) > 1
+
+
+def shard_for_user(user_id: int) -> int:
+    """Shard che contiene l'utente, i suoi movimenti e le sue carte"""
+    return user_id % len(shard_engines)
+
+
+class RoutingSession(Session):
+    """
+    Sessione che sceglie il database per tabella
+
+    Le tabelle globali vanno sempre sul database principale, le altre sullo
+    shard indicato in session.info["shard_id"] (impostato da use_shard(), di
+    norma appena noto l'utente della richiesta; 0 se assente). Con un solo
+    shard tutto resta sull'engine principale.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if mapper is not None and mapper.local_table.name in GLOBAL_TABLES:
+            return engine
+        return shard_engines[self.info.get("shard_id", 0)]
+
+
+def use_shard(db: Session, shard_id: int):
+    """Instrada sullo shard indicato le query successive della sessione"""
+    db.info["shard_id"] = shard_id
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
 Base = declarative_base()
 
+
+def session_for_user(user_id: int) -> Session:
+    """Nuova sessione già instradata sullo shard dell'utente"""
+    return SessionLocal(info={"shard_id": shard_for_user(user_id)})
+
+
+def session_for_shard(shard_id: int) -> Session:
+    return SessionLocal(info={"shard_id": shard_id})
+
+
 # Dependency per ottenere la sessione del database
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
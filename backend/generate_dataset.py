@@ -0,0 +1,310 @@
+import argparse
+import itertools
+import logging
+import math
+import random
+import time
+from array import array
+from bisect import bisect
+from datetime import date, datetime, timedelta
+from typing import List
+
+import bcrypt
+from sqlalchemy import bindparam, create_engine, func, insert, select, update
+
+from config import DATABASE_URL
+from migrations import upgrade
+from models import User, Transaction, Card
+from payment_handler import payment_handler
+
+logger = logging.getLogger(__name__)
+
+FIRST_NAMES = [
+    "Marco", "Giulia", "Luca", "Francesca", "Alessandro", "Chiara", "Andrea", "Sara",
+    "Matteo", "Martina", "Lorenzo", "Valentina", "Davide", "Elena", "Simone", "Alessia",
+    "Federico", "Giorgia", "Riccardo", "Anna", "Stefano", "Laura", "Paolo", "Silvia"
+]
+LAST_NAMES = [
+    "Rossi", "Russo", "Ferrari", "Esposito", "Bianchi", "Romano", "Colombo", "Ricci",
+    "Marino", "Greco", "Bruno", "Gallo", "Conti", "De Luca", "Mancini", "Costa",
+    "Giordano", "Rizzo", "Lombardi", "Moretti", "Barbieri", "Fontana", "Santoro", "Mariani"
+]
+CITIES = [
+    ("Roma", "00100"), ("Milano", "20100"), ("Napoli", "80100"), ("Torino", "10100"),
+    ("Palermo", "90100"), ("Genova", "16100"), ("Bologna", "40100"), ("Firenze", "50100"),
+    ("Bari", "70100"), ("Catania", "95100"), ("Venezia", "30100"), ("Verona", "37100")
+]
+STREETS = ["Via Roma", "Via Garibaldi", "Corso Italia", "Via Mazzini", "Via Dante", "Piazza Verdi"]
+
+# Prefissi riconosciuti da FakePaymentHandler._detect_card_brand, con peso di mercato
+CARD_PREFIXES = [
+    ("4", 0.52), ("51", 0.06), ("52", 0.06), ("53", 0.06), ("54", 0.05), ("55", 0.05),
+    ("34", 0.03), ("37", 0.04), ("6011", 0.03), ("65", 0.02), ("35", 0.03),
+    ("36", 0.02), ("62", 0.03)
+]
+
+# Password in chiaro del pool pre-calcolato (utile per fare login sugli utenti generati)
+PASSWORD_POOL = [f"password{i}" for i in range(8)]
+BCRYPT_ALPHABET = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+
+def zipf_cum_weights(count: int, exponent: float) -> List[float]:
+    """Pesi cumulativi di una distribuzione a legge di potenza sui ranghi 1..count"""
+    total = 0.0
+    cum_weights = []
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** exponent
+        cum_weights.append(total)
+    return cum_weights
+
+
+def pick(rng: random.Random, cum_weights: List[float]) -> int:
+    """Estrae un indice (0-based) dai pesi cumulativi"""
+    return bisect(cum_weights, rng.random() * cum_weights[-1])
+
+
+def _daily_factor(hour: int) -> float:
+    """Intensità relativa del traffico: minima alle 3, massima alle 15"""
+    return 0.5 + 1.5 * (1 - math.cos((hour - 3) / 24 * 2 * math.pi)) / 2
+
+
+def bursty_timestamps(rng: random.Random, count: int, start: datetime, end: datetime):
+    """
+    Genera timestamp crescenti a raffiche
+
+    Gli eventi arrivano in sessioni: dentro una sessione gli intervalli sono di
+    pochi secondi, tra una sessione e l'altra l'attesa è esponenziale. Il processo
+    è generato in "tempo operativo" e poi riportato sull'orologio secondo il ciclo
+    giornaliero (fino a 4 volte più traffico di giorno che di notte).
+    start deve cadere a mezzanotte.
+    """
+    hourly_mass = [_daily_factor(hour) * 3600 for hour in range(24)]
+    hourly_cum = list(itertools.accumulate(hourly_mass))
+    day_mass = hourly_cum[-1]
+    total_mass = (end - start).total_seconds() / 86400 * day_mass
+
+    mean_burst = 6
+    mean_gap = total_mass / max(1, count / mean_burst)
+    current = 0.0
+    offsets = array("d")
+
+    while len(offsets) < count:
+        burst = min(count - len(offsets), 1 + int(rng.expovariate(1 / mean_burst)))
+        for _ in range(burst):
+            current += rng.expovariate(1 / 20)
+            offsets.append(current)
+        current += rng.expovariate(1 / mean_gap)
+
+    # Riporta gli istanti esattamente sul periodo richiesto, poi sull'orologio reale
+    scale = total_mass / current if current else 0.0
+    for offset in offsets:
+        day, remainder = divmod(offset * scale, day_mass)
+        hour = min(23, bisect(hourly_cum, remainder))
+        within_hour = (remainder - (hourly_cum[hour - 1] if hour else 0.0)) / hourly_mass[hour] * 3600
+        yield start + timedelta(days=day, seconds=hour * 3600 + within_hour)
+
+
+def card_number(rng: random.Random, prefix: str) -> str:
+    length = 15 if prefix in ("34", "37") else 16
+    return prefix + "".join(str(rng.randrange(10)) for _ in range(length - len(prefix)))
+
+
+class DatasetGenerator:
+    """
+    Generatore deterministico (a parità di seed e parametri) di utenti, carte e transazioni
+
+    Scrive con INSERT multi-riga di SQLAlchemy Core direttamente sulle tabelle
+    costruite da Base.metadata, quindi funziona sia con SQLite che con MySQL.
+    """
+
+    def __init__(self, engine, seed: int = 42, batch_size: int = 5000):
+        self.engine = engine
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+
+    def _insert_batches(self, table, rows):
+        """Inserisce le righe a blocchi, un commit per blocco"""
+        inserted = 0
+        iterator = iter(rows)
+        while True:
+            batch = list(itertools.islice(iterator, self.batch_size))
+            if not batch:
+                return inserted
+            with self.engine.begin() as connection:
+                connection.execute(insert(table), batch)
+            inserted += len(batch)
+
+    def _password_pool(self) -> List[str]:
+        # bcrypt è lento per costruzione: pochi hash riutilizzati da tutti gli utenti.
+        # Anche il salt deriva dal seed, così il dataset è identico tra due esecuzioni
+        hashes = []
+        for password in PASSWORD_POOL:
+            salt = "$2b$12$" + "".join(self.rng.choice(BCRYPT_ALPHABET) for _ in range(21)) + self.rng.choice(".Oeu")
+            hashes.append(bcrypt.hashpw(password.encode("utf-8"), salt.encode("utf-8")).decode("utf-8"))
+        return hashes
+
+    def generate(self, users: int, cards_per_user: float, transactions: int, days: int, end_date: date):
+        with self.engine.connect() as connection:
+            first_id = (connection.execute(select(func.max(User.id))).scalar() or 0) + 1
+
+        end = datetime.combine(end_date, datetime.min.time())
+        start = end - timedelta(days=days)
+        password_hashes = self._password_pool()
+
+        # Gli id sono assegnati qui per poter generare le transazioni senza rileggere gli utenti
+        user_ids = list(range(first_id, first_id + users))
+        balances = [1000.0] * users
+
+        started = time.perf_counter()
+        self._insert_batches(User.__table__, self._users(user_ids, password_hashes, start))
+        logger.info(f"{users} utenti inseriti in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        cards = self._insert_batches(Card.__table__, self._cards(user_ids, cards_per_user, start))
+        logger.info(f"{cards} carte inserite in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        count = self._insert_batches(
+            Transaction.__table__,
+            self._transactions(user_ids, balances, transactions, start, end)
+        )
+        logger.info(f"{count} transazioni inserite in {time.perf_counter() - started:.1f}s")
+
+        # I saldi finali sono coerenti con il registro delle transazioni generate
+        started = time.perf_counter()
+        self._update_balances(user_ids, balances)
+        logger.info(f"Saldi aggiornati in {time.perf_counter() - started:.1f}s")
+
+    def _users(self, user_ids: List[int], password_hashes: List[str], start: datetime):
+        rng = self.rng
+        for user_id in user_ids:
+            first_name = rng.choice(FIRST_NAMES)
+            last_name = rng.choice(LAST_NAMES)
+            city, postal_code = rng.choice(CITIES)
+            created_at = start - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+            yield {
+                "id": user_id,
+                "email": f"{first_name}.{last_name.replace(' ', '')}.{user_id}@example.com".lower(),
+                "password_hash": rng.choice(password_hashes),
+                "first_name": first_name,
+                "last_name": last_name,
+                "phone_number": f"+39 3{rng.randrange(10**8, 10**9)}",
+                "date_of_birth": date(1940, 1, 1) + timedelta(days=rng.randrange(365 * 65)),
+                "address": f"{rng.choice(STREETS)} {rng.randrange(1, 200)}",
+                "city": city,
+                "postal_code": postal_code,
+                "country": "Italia",
+                "balance": 1000.0,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "is_active": True,
+                "is_verified": rng.random() < 0.7
+            }
+
+    def _cards(self, user_ids: List[int], cards_per_user: float, start: datetime):
+        rng = self.rng
+        prefix_weights = list(itertools.accumulate(weight for _, weight in CARD_PREFIXES))
+        for user_id in user_ids:
+            # Numero di carte geometrico: molti utenti con 0-1 carte, pochi con molte
+            count = int(rng.expovariate(1 / cards_per_user)) if cards_per_user > 0 else 0
+            for position in range(count):
+                number = card_number(rng, CARD_PREFIXES[pick(rng, prefix_weights)][0])
+                yield {
+                    "user_id": user_id,
+                    "card_token": f"tok_{rng.getrandbits(64):016x}",
+                    "card_last4": number[-4:],
+                    "card_brand": payment_handler._detect_card_brand(number),
+                    "is_default": position == 0,
+                    "created_at": start - timedelta(seconds=rng.randrange(30 * 24 * 3600))
+                }
+
+    def _transactions(self, user_ids: List[int], balances: List[float], count: int, start: datetime, end: datetime):
+        rng = self.rng
+        users = len(user_ids)
+
+        # Attività dei mittenti e popolarità dei destinatari seguono leggi di potenza
+        # su permutazioni diverse: pochi utenti inviano (o ricevono) la maggior parte
+        sender_rank = list(range(users))
+        recipient_rank = list(range(users))
+        rng.shuffle(sender_rank)
+        rng.shuffle(recipient_rank)
+        sender_weights = zipf_cum_weights(users, 0.8)
+        recipient_weights = zipf_cum_weights(users, 1.1)
+
+        for created_at in bursty_timestamps(rng, count, start, end):
+            sender = sender_rank[pick(rng, sender_weights)]
+            # Importi log-normali arrotondati al centesimo (mediana ~25€)
+            amount = round(min(5000.0, rng.lognormvariate(3.2, 1.0)), 2)
+
+            if rng.random() < 0.15 or balances[sender] < amount:
+                amount = round(rng.choice((20, 50, 100, 200, 500)) + max(0.0, amount - balances[sender]), 2)
+                balances[sender] += amount
+                yield {
+                    "from_user_id": None,
+                    "to_user_id": user_ids[sender],
+                    "amount": amount,
+                    "transaction_type": "recharge",
+                    "created_at": created_at,
+                    "description": f"Ricarica tramite carta (ID: pay_{rng.randrange(10**9, 10**10)}_{rng.randrange(1000, 9999)})"
+                }
+                continue
+
+            recipient = recipient_rank[pick(rng, recipient_weights)]
+            if recipient == sender:
+                recipient = (recipient + 1) % users
+            balances[sender] -= amount
+            balances[recipient] += amount
+            yield {
+                "from_user_id": user_ids[sender],
+                "to_user_id": user_ids[recipient],
+                "amount": amount,
+                "transaction_type": "transfer",
+                "created_at": created_at,
+                "description": None
+            }
+
+    def _update_balances(self, user_ids: List[int], balances: List[float]):
+        statement = update(User.__table__).where(User.__table__.c.id == bindparam("user_id")).values(
+            balance=bindparam("new_balance")
+        )
+        rows = (
+            {"user_id": user_id, "new_balance": round(balance, 2)}
+            for user_id, balance in zip(user_ids, balances)
+            if balance != 1000.0
+        )
+        iterator = iter(rows)
+        while True:
+            batch = list(itertools.islice(iterator, self.batch_size))
+            if not batch:
+                return
+            with self.engine.begin() as connection:
+                connection.execute(statement, batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un database di test su larga scala")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Database di destinazione (default: DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--cards-per-user", type=float, default=1.2, help="Numero medio di carte per utente")
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=365, help="Ampiezza del periodo delle transazioni")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today(),
+                        help="Fine del periodo (YYYY-MM-DD); fissarla per risultati riproducibili")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--create-schema", action="store_true", help="Applica le migrazioni dello schema")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    engine = create_engine(args.database_url)
+    if args.create_schema:
+        upgrade(engine)
+
+    generator = DatasetGenerator(engine, seed=args.seed, batch_size=args.batch_size)
+    generator.generate(args.users, args.cards_per_user, args.transactions, args.days, args.end_date)
+    print(f"Password degli utenti generati: {', '.join(PASSWORD_POOL)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from config import LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_RATES
+
+# Correlation id della richiesta in corso
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributi standard di LogRecord: tutto il resto arriva da extra={...}
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+class JsonFormatter(logging.Formatter):
+    """Una riga JSON per record, con request_id e gli eventuali campi extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Campiona le categorie rumorose (es. errori 422, rinnovi del token)
+
+    Una categoria si assegna con extra={"log_category": "validation"}; i record
+    senza categoria o con categoria non configurata passano sempre.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(getattr(record, "log_category", None))
+        return rate is None or random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler su coda limitata che non blocca mai il thread della richiesta
+
+    Se la coda è piena il record viene scartato e conteggiato. La formattazione
+    (JSON, traceback) avviene nel thread del QueueListener.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Solo l'interpolazione del messaggio (economica) resta sul thread chiamante
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = _request_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+_queue_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging():
+    """Configura il root logger con la pipeline asincrona (idempotente)"""
+    global _queue_handler, _listener
+    if _queue_handler is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def dropped_log_records() -> int:
+    """Numero di record scartati perché la coda dei log era piena"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def install_request_id_middleware(app):
+    """Assegna un correlation id a ogni richiesta (header X-Request-ID in ingresso e in uscita)"""
+
+    @app.middleware("http")
+    async def request_id_middleware(request, call_next):
+        # L'id fornito dal client viene troncato per non gonfiare i log
+        request_id = request.headers.get("X-Request-ID", "")[:64] or uuid.uuid4().hex
+        token = _request_id.set(request_id)
+        try:
+            response = await call_next(request)
+        finally:
+            _request_id.reset(token)
+        response.headers["X-Request-ID"] = request_id
+        return response
@@ -0,0 +1,32 @@
+import argparse
+import logging
+
+from database import all_engines
+from migrations import available_migrations, current_version, latest_version, upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrazioni dello schema del database")
+    parser.add_argument("--status", action="store_true", help="Mostra la versione applicata e quelle disponibili")
+    parser.add_argument("--target", type=int, default=None, help="Versione a cui fermarsi (default: l'ultima)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    # Lo schema è lo stesso sul database principale e su tutti gli shard
+    for database_engine in all_engines():
+        print(f"== {database_engine.url.render_as_string(hide_password=True)}")
+        if args.status:
+            with database_engine.connect() as connection:
+                version = current_version(connection)
+            for number, name in available_migrations():
+                print(f"{'x' if number <= version else ' '} {name}")
+            print(f"Versione applicata: {version} (ultima disponibile: {latest_version()})")
+            continue
+
+        applied = upgrade(database_engine, args.target)
+        print(f"{len(applied)} migrazioni applicate" if applied else "Schema già aggiornato")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Migrazioni versionate dello schema
+
+Ogni modulo mNNNN_descrizione.py definisce upgrade(connection) e viene applicato
+una sola volta, in ordine di numero, nella propria transazione; la versione
+raggiunta è registrata nella tabella schema_migrations. Le migrazioni descrivono
+le tabelle con definizioni proprie (non con i modelli), così restano valide
+anche quando i modelli cambiano.
+"""
+import importlib
+import logging
+import pkgutil
+import re
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select
+
+logger = logging.getLogger(__name__)
+
+_MODULE_NAME = re.compile(r"^m(\d{4})_\w+$")
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False)
+)
+
+
+class SchemaVersionError(RuntimeError):
+    """Lo schema del database non corrisponde a quello atteso dal codice"""
+
+
+def available_migrations() -> List[Tuple[int, str]]:
+    """(versione, nome modulo) delle migrazioni presenti, senza importarle"""
+    migrations = []
+    for module in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.match(module.name)
+        if match:
+            migrations.append((int(match.group(1)), module.name))
+    return sorted(migrations)
+
+
+def latest_version() -> int:
+    migrations = available_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def current_version(connection) -> int:
+    """Versione applicata al database (0 se le migrazioni non sono mai state eseguite)"""
+    if not inspect(connection).has_table(schema_migrations.name):
+        return 0
+    return connection.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def upgrade(engine, target: int = None) -> List[int]:
+    """
+    Applica le migrazioni mancanti fino a target (default: l'ultima)
+
+    Da eseguire da un solo processo (deploy o CLI), non da ogni worker.
+    Le migrazioni iniziali sono idempotenti: su un database creato in passato
+    con create_all registrano solo la versione.
+    """
+    with engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+        applied = current_version(connection)
+
+    done = []
+    for version, name in available_migrations():
+        if version <= applied or (target is not None and version > target):
+            continue
+        module = importlib.import_module(f"{__name__}.{name}")
+        with engine.begin() as connection:
+            module.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        logger.info("Migrazione %s applicata", name)
+        done.append(version)
+    return done
+
+
+def check_schema(engine) -> int:
+    """
+    Verifica all'avvio che il database sia aggiornato
+
+    Costa una sola connessione e due query leggere; solleva SchemaVersionError
+    se mancano migrazioni. Uno schema più recente del codice (deploy in corso)
+    è solo segnalato: le migrazioni devono restare compatibili con la versione
+    precedente dell'applicazione.
+    """
+    expected = latest_version()
+    with engine.connect() as connection:
+        version = current_version(connection)
+    if version < expected:
+        raise SchemaVersionError(
+            f"Schema del database alla versione {version}, richiesta {expected}: eseguire 'python migrate.py'"
+        )
+    if version > expected:
+        logger.warning("Schema del database alla versione %s, più recente del codice (%s)", version, expected)
+    return version
@@ -0,0 +1,52 @@
+"""Schema iniziale: utenti, transazioni e carte"""
+from sqlalchemy import Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, func
+
+metadata = MetaData()
+
+users = Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String(255), unique=True, index=True, nullable=False),
+    Column("password_hash", String(255), nullable=False),
+    Column("first_name", String(100), nullable=False),
+    Column("last_name", String(100), nullable=False),
+    Column("phone_number", String(20), nullable=False),
+    Column("date_of_birth", Date, nullable=False),
+    Column("address", String(255), nullable=False),
+    Column("city", String(100), nullable=False),
+    Column("postal_code", String(20), nullable=False),
+    Column("country", String(100), nullable=False),
+    Column("balance", Float),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    Column("is_active", Boolean),
+    Column("is_verified", Boolean)
+)
+
+transactions = Table(
+    "transactions", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("from_user_id", Integer, ForeignKey("users.id"), nullable=True),
+    Column("to_user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("amount", Float, nullable=False),
+    Column("transaction_type", String(50), nullable=False),
+    Column("created_at", DateTime),
+    Column("description", String(255), nullable=True)
+)
+
+cards = Table(
+    "cards", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("card_token", String(255), nullable=False),
+    Column("card_last4", String(4), nullable=False),
+    Column("card_brand", String(50), nullable=False),
+    Column("is_default", Boolean),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True))
+)
+
+
+def upgrade(connection):
+    # checkfirst: i database creati in passato con create_all hanno già queste tabelle
+    metadata.create_all(connection, checkfirst=True)
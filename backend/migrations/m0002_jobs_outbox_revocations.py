@@ -0,0 +1,57 @@
+"""Import massivo, outbox degli eventi e revoca dei token"""
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text
+
+metadata = MetaData()
+
+import_jobs = Table(
+    "import_jobs", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("source_path", String(500), nullable=False),
+    Column("source_format", String(10), nullable=False),
+    Column("status", String(20), nullable=False),
+    Column("processed_rows", Integer, nullable=False),
+    Column("inserted_rows", Integer, nullable=False),
+    Column("failed_rows", Integer, nullable=False),
+    Column("last_error", Text, nullable=True),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime)
+)
+
+import_job_errors = Table(
+    "import_job_errors", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("job_id", Integer, ForeignKey("import_jobs.id"), nullable=False, index=True),
+    Column("row_number", Integer, nullable=False),
+    Column("email", String(255), nullable=True),
+    Column("message", Text, nullable=False)
+)
+
+outbox_events = Table(
+    "outbox_events", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("event_type", String(100), nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("available_at", DateTime, nullable=False),
+    Column("claimed_by", String(100), nullable=True),
+    Column("claimed_until", DateTime, nullable=True),
+    Column("attempts", Integer, nullable=False),
+    Column("last_error", Text, nullable=True),
+    Column("processed_at", DateTime, nullable=True),
+    Column("failed_at", DateTime, nullable=True),
+    Index("ix_outbox_events_pending", "processed_at", "available_at")
+)
+
+revoked_tokens = Table(
+    "revoked_tokens", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("jti", String(64), nullable=True, unique=True, index=True),
+    Column("subject", String(255), nullable=True, index=True),
+    Column("revoked_before", DateTime, nullable=True),
+    Column("expires_at", DateTime, nullable=False, index=True),
+    Column("created_at", DateTime)
+)
+
+
+def upgrade(connection):
+    metadata.create_all(connection, checkfirst=True)
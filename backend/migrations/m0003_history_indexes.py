@@ -0,0 +1,30 @@
+"""Indici per cronologia, contatti frequenti ed elenco carte"""
+from sqlalchemy import Column, Index, Integer, MetaData, Table, DateTime
+
+metadata = MetaData()
+
+transactions = Table(
+    "transactions", metadata,
+    Column("from_user_id", Integer),
+    Column("to_user_id", Integer),
+    Column("created_at", DateTime)
+)
+
+cards = Table(
+    "cards", metadata,
+    Column("user_id", Integer),
+    Column("created_at", DateTime)
+)
+
+INDEXES = (
+    # Filtro per utente e ordinamento per data sulla cronologia delle transazioni
+    Index("ix_transactions_from_user_created", transactions.c.from_user_id, transactions.c.created_at),
+    Index("ix_transactions_to_user_created", transactions.c.to_user_id, transactions.c.created_at),
+    # /cards filtra per utente (SQLite non indicizza da solo le chiavi esterne)
+    Index("ix_cards_user_id", cards.c.user_id),
+)
+
+
+def upgrade(connection):
+    for index in INDEXES:
+        index.create(connection, checkfirst=True)
@@ -0,0 +1,25 @@
+"""Archivio delle transazioni più vecchie (storage freddo)"""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table
+
+metadata = MetaData()
+
+# Solo per risolvere le chiavi esterne: la tabella esiste già
+Table("users", metadata, Column("id", Integer, primary_key=True))
+
+transactions_archive = Table(
+    "transactions_archive", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("from_user_id", Integer, ForeignKey("users.id"), nullable=True),
+    Column("to_user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("amount", Float, nullable=False),
+    Column("transaction_type", String(50), nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("description", String(255), nullable=True),
+    Column("archived_at", DateTime, nullable=False),
+    Index("ix_transactions_archive_from_user_created", "from_user_id", "created_at"),
+    Index("ix_transactions_archive_to_user_created", "to_user_id", "created_at")
+)
+
+
+def upgrade(connection):
+    transactions_archive.create(connection, checkfirst=True)
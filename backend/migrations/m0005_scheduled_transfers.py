@@ -0,0 +1,34 @@
+"""Bonifici programmati e ricorrenti"""
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text
+
+metadata = MetaData()
+
+# Solo per risolvere le chiavi esterne: la tabella esiste già
+Table("users", metadata, Column("id", Integer, primary_key=True))
+
+scheduled_transfers = Table(
+    "scheduled_transfers", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False, index=True),
+    Column("to_user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("amount", Float, nullable=False),
+    Column("description", String(255), nullable=True),
+    Column("frequency", String(20), nullable=False),
+    Column("anchor_day", Integer, nullable=False),
+    Column("next_run_at", DateTime, nullable=False),
+    Column("scheduled_for", DateTime, nullable=False),
+    Column("end_at", DateTime, nullable=True),
+    Column("status", String(20), nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("last_error", Text, nullable=True),
+    Column("last_run_at", DateTime, nullable=True),
+    Column("claimed_by", String(100), nullable=True),
+    Column("claimed_until", DateTime, nullable=True),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    Index("ix_scheduled_transfers_due", "status", "next_run_at")
+)
+
+
+def upgrade(connection):
+    scheduled_transfers.create(connection, checkfirst=True)
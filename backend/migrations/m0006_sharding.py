@@ -0,0 +1,40 @@
+"""Directory degli utenti, saga dei trasferimenti tra shard e passi applicati"""
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table, Text, UniqueConstraint
+
+metadata = MetaData()
+
+# Le migrazioni girano su tutti i database: le tabelle che un database non usa restano vuote
+user_directory = Table(
+    "user_directory", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String(255), unique=True, index=True, nullable=False),
+    Column("created_at", DateTime)
+)
+
+transfer_sagas = Table(
+    "transfer_sagas", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("from_user_id", Integer, nullable=False),
+    Column("to_user_id", Integer, nullable=False),
+    Column("amount", Float, nullable=False),
+    Column("description", String(255), nullable=True),
+    Column("state", String(20), nullable=False),
+    Column("last_error", Text, nullable=True),
+    Column("transaction_id", Integer, nullable=True),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    Index("ix_transfer_sagas_state_updated", "state", "updated_at")
+)
+
+saga_steps = Table(
+    "saga_steps", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("saga_id", Integer, nullable=False),
+    Column("step", String(20), nullable=False),
+    Column("created_at", DateTime),
+    UniqueConstraint("saga_id", "step", name="uq_saga_steps_saga_step")
+)
+
+
+def upgrade(connection):
+    metadata.create_all(connection, checkfirst=True)
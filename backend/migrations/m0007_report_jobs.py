@@ -0,0 +1,34 @@
+"""Coda dei report generati in background (estratti conto, riepiloghi annuali)"""
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text
+
+metadata = MetaData()
+
+# Solo per risolvere le chiavi esterne: la tabella esiste già
+Table("users", metadata, Column("id", Integer, primary_key=True))
+
+report_jobs = Table(
+    "report_jobs", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("report_type", String(30), nullable=False),
+    Column("period_start", DateTime, nullable=False),
+    Column("period_end", DateTime, nullable=False),
+    Column("status", String(20), nullable=False),
+    Column("dedup_key", String(100), nullable=True, unique=True),
+    Column("claimed_by", String(100), nullable=True),
+    Column("claimed_until", DateTime, nullable=True),
+    Column("attempts", Integer, nullable=False),
+    Column("last_error", Text, nullable=True),
+    Column("file_path", String(500), nullable=True),
+    Column("file_size", Integer, nullable=True),
+    Column("transaction_count", Integer, nullable=True),
+    Column("created_at", DateTime),
+    Column("started_at", DateTime, nullable=True),
+    Column("finished_at", DateTime, nullable=True),
+    Index("ix_report_jobs_status_created", "status", "created_at"),
+    Index("ix_report_jobs_user_status", "user_id", "status")
+)
+
+
+def upgrade(connection):
+    report_jobs.create(connection, checkfirst=True)
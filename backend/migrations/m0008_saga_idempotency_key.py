@@ -0,0 +1,20 @@
+"""Chiave di idempotenza delle saga (un bonifico programmato non parte due volte)"""
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, inspect, text
+
+metadata = MetaData()
+
+transfer_sagas = Table(
+    "transfer_sagas", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("idempotency_key", String(100), nullable=True)
+)
+
+INDEX = Index("ux_transfer_sagas_idempotency_key", transfer_sagas.c.idempotency_key, unique=True)
+
+
+def upgrade(connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("transfer_sagas")}
+    if "idempotency_key" not in columns:
+        column_type = transfer_sagas.c.idempotency_key.type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE transfer_sagas ADD COLUMN idempotency_key {column_type}"))
+    INDEX.create(connection, checkfirst=True)
@@ -0,0 +1,17 @@
+"""Movimento scritto da un passo di saga (la conferma ripetuta lo ritrova)"""
+from sqlalchemy import Column, Integer, MetaData, Table, inspect, text
+
+metadata = MetaData()
+
+saga_steps = Table(
+    "saga_steps", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("transaction_id", Integer, nullable=True)
+)
+
+
+def upgrade(connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("saga_steps")}
+    if "transaction_id" not in columns:
+        column_type = saga_steps.c.transaction_id.type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE saga_steps ADD COLUMN transaction_id {column_type}"))
@@ -0,0 +1,19 @@
+"""Lease degli import (un import fermo può essere ripreso alla scadenza)"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, text
+
+metadata = MetaData()
+
+import_jobs = Table(
+    "import_jobs", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("claimed_by", String(100), nullable=True),
+    Column("claimed_until", DateTime, nullable=True)
+)
+
+
+def upgrade(connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("import_jobs")}
+    for column in (import_jobs.c.claimed_by, import_jobs.c.claimed_until):
+        if column.name not in columns:
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE import_jobs ADD COLUMN {column.name} {column_type}"))
@@ -1,5 +1,17 @@
 from .user import User
 from .transaction import Transaction
+from .archived_transaction import ArchivedTransaction
 from .card import Card
+from .import_job import ImportJob, ImportJobError
+from .outbox_event import OutboxEvent
+from .revoked_token import RevokedToken
+from .scheduled_transfer import ScheduledTransfer
+from .user_directory import UserDirectoryEntry
+from .transfer_saga import TransferSaga, SagaStep
+from .report_job import ReportJob
 
-__all__ = ["User", "Transaction", "Card"] 
\ No newline at end of file
+__all__ = [
+    "User", "Transaction", "ArchivedTransaction", "Card", "ImportJob", "ImportJobError",
+    "OutboxEvent", "RevokedToken", "ScheduledTransfer", "UserDirectoryEntry", "TransferSaga", "SagaStep",
+    "ReportJob"
+]
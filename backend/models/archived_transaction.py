@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
+from datetime import datetime
+from database import Base
+
+class ArchivedTransaction(Base):
+    """Transazioni più vecchie dell'orizzonte di archiviazione (stesse colonne e id di transactions)"""
+    __tablename__ = "transactions_archive"
+    __table_args__ = (
+        Index("ix_transactions_archive_from_user_created", "from_user_id", "created_at"),
+        Index("ix_transactions_archive_to_user_created", "to_user_id", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)  # Id originale della transazione
+    from_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    to_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    amount = Column(Float, nullable=False)
+    transaction_type = Column(String(50), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    description = Column(String(255), nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -7,7 +7,7 @@ class Card(Base):
     __tablename__ = "cards"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     card_token = Column(String(255), nullable=False)
     card_last4 = Column(String(4), nullable=False)
     card_brand = Column(String(50), nullable=False)
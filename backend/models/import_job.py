@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from database import Base
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source_path = Column(String(500), nullable=False)
+    source_format = Column(String(10), nullable=False)  # 'csv', 'ndjson'
+    status = Column(String(20), nullable=False, default="pending")  # 'pending', 'running', 'completed', 'failed'
+    
+    # Avanzamento: aggiornato nello stesso commit degli inserimenti di ogni blocco
+    processed_rows = Column(Integer, nullable=False, default=0)
+    inserted_rows = Column(Integer, nullable=False, default=0)
+    failed_rows = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    
+    # Lease del runner che lo sta eseguendo, rinnovato a ogni blocco
+    claimed_by = Column(String(100), nullable=True)
+    claimed_until = Column(DateTime, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relazioni
+    errors = relationship("ImportJobError", back_populates="job", cascade="all, delete-orphan")
+
+class ImportJobError(Base):
+    __tablename__ = "import_job_errors"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("import_jobs.id"), nullable=False, index=True)
+    row_number = Column(Integer, nullable=False)
+    email = Column(String(255), nullable=True)
+    message = Column(Text, nullable=False)
+    
+    # Relazioni
+    job = relationship("ImportJob", back_populates="errors")
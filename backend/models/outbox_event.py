@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from datetime import datetime
+from database import Base
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        # Il dispatcher cerca gli eventi non ancora consegnati e già disponibili
+        Index("ix_outbox_events_pending", "processed_at", "available_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_type = Column(String(100), nullable=False)  # 'transfer.completed', 'recharge.completed'
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Stato della consegna
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # Posticipato dai retry
+    claimed_by = Column(String(100), nullable=True)
+    claimed_until = Column(DateTime, nullable=True)  # Lease del dispatcher che lo sta elaborando
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+    failed_at = Column(DateTime, nullable=True)  # Tentativi esauriti
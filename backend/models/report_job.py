@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Text
+from datetime import datetime
+from database import Base
+
+class ReportJob(Base):
+    """Report pesanti (estratti conto, riepiloghi annuali) generati dai worker dei report"""
+    __tablename__ = "report_jobs"
+    __table_args__ = (
+        # I worker cercano i job in coda per ordine di arrivo
+        Index("ix_report_jobs_status_created", "status", "created_at"),
+        Index("ix_report_jobs_user_status", "user_id", "status"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    report_type = Column(String(30), nullable=False)  # 'monthly_statement', 'yearly_summary'
+    period_start = Column(DateTime, nullable=False)
+    period_end = Column(DateTime, nullable=False)  # Escluso
+    status = Column(String(20), nullable=False, default="pending")  # 'pending', 'running', 'completed', 'failed'
+    
+    # Valorizzata finché il job è in coda o in esecuzione: una richiesta identica riusa lo stesso job
+    dedup_key = Column(String(100), nullable=True, unique=True)
+    
+    # Lease del worker che lo sta elaborando
+    claimed_by = Column(String(100), nullable=True)
+    claimed_until = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    
+    # Risultato
+    file_path = Column(String(500), nullable=True)
+    file_size = Column(Integer, nullable=True)
+    transaction_count = Column(Integer, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from database import Base
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Revoca di un singolo token (logout) oppure di tutte le sessioni di un utente
+    jti = Column(String(64), nullable=True, unique=True, index=True)
+    subject = Column(String(255), nullable=True, index=True)
+    revoked_before = Column(DateTime, nullable=True)  # Token emessi fino a questo istante (solo revoca per utente)
+    
+    # Dopo questa data nessun token interessato è ancora valido: la riga può essere eliminata
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
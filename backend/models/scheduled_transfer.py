@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, Text
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from database import Base
+
+class ScheduledTransfer(Base):
+    __tablename__ = "scheduled_transfers"
+    __table_args__ = (
+        # Lo scheduler cerca gli ordini attivi già scaduti
+        Index("ix_scheduled_transfers_due", "status", "next_run_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)  # Ordinante
+    to_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    amount = Column(Float, nullable=False)
+    description = Column(String(255), nullable=True)
+    
+    # Pianificazione
+    frequency = Column(String(20), nullable=False)  # 'once', 'daily', 'weekly', 'monthly'
+    anchor_day = Column(Integer, nullable=False)  # Giorno del mese richiesto (es. 31 -> ultimo giorno nei mesi più corti)
+    next_run_at = Column(DateTime, nullable=False)  # Prossima esecuzione (UTC), posticipata dai retry
+    scheduled_for = Column(DateTime, nullable=False)  # Scadenza originale dell'esecuzione in corso
+    end_at = Column(DateTime, nullable=True)
+    status = Column(String(20), nullable=False, default="active")  # 'active', 'paused', 'completed', 'failed'
+    
+    # Esito delle esecuzioni
+    attempts = Column(Integer, nullable=False, default=0)  # Tentativi falliti dell'esecuzione in corso
+    last_error = Column(Text, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    
+    # Lease dello scheduler che lo sta elaborando
+    claimed_by = Column(String(100), nullable=True)
+    claimed_until = Column(DateTime, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relazioni
+    recipient = relationship("User", foreign_keys=[to_user_id])
+    
+    @property
+    def to_email(self):
+        if self.recipient is not None:
+            return self.recipient.email
+        # Destinatario su un altro shard: email letta dalla directory (vedi app._with_remote_recipients)
+        return self.__dict__.get("remote_to_email")
@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Cronologia e contatti frequenti filtrano per utente e ordinano per data
+        Index("ix_transactions_from_user_created", "from_user_id", "created_at"),
+        Index("ix_transactions_to_user_created", "to_user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     from_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Null per ricariche esterne
@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Index, UniqueConstraint
+from datetime import datetime
+from database import Base
+
+class TransferSaga(Base):
+    """Trasferimento tra utenti di shard diversi (database principale)"""
+    __tablename__ = "transfer_sagas"
+    __table_args__ = (
+        # Il recupero cerca le saga non concluse ferme da tempo
+        Index("ix_transfer_sagas_state_updated", "state", "updated_at"),
+        # Un'operazione ripetuta (es. scheduler ripartito dopo un crash) ritrova la propria saga
+        Index("ux_transfer_sagas_idempotency_key", "idempotency_key", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    from_user_id = Column(Integer, nullable=False)
+    to_user_id = Column(Integer, nullable=False)
+    amount = Column(Float, nullable=False)
+    description = Column(String(255), nullable=True)
+    
+    # 'started' -> 'debited' -> 'credited' -> 'completed'
+    # oppure 'failed' (addebito rifiutato) / 'compensating' -> 'compensated' (accredito impossibile)
+    state = Column(String(20), nullable=False, default="started")
+    last_error = Column(Text, nullable=True)
+    transaction_id = Column(Integer, nullable=True)  # Movimento dell'ordinante, sul suo shard
+    idempotency_key = Column(String(100), nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SagaStep(Base):
+    """Passo di una saga già applicato su questo shard (rende i passi idempotenti)"""
+    __tablename__ = "saga_steps"
+    __table_args__ = (
+        UniqueConstraint("saga_id", "step", name="uq_saga_steps_saga_step"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    saga_id = Column(Integer, nullable=False)
+    step = Column(String(20), nullable=False)  # 'debit', 'credit', 'confirm', 'release'
+    transaction_id = Column(Integer, nullable=True)  # Movimento scritto dal passo (confirm)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from database import Base
+
+class UserDirectoryEntry(Base):
+    """Directory globale email -> id utente (database principale); lo shard si ricava dall'id"""
+    __tablename__ = "user_directory"
+    
+    id = Column(Integer, primary_key=True, index=True)  # Id assegnato all'utente su tutti gli shard
+    email = Column(String(255), unique=True, index=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
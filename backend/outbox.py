@@ -0,0 +1,252 @@
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from config import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_POLL_SECONDS,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_BASE_SECONDS,
+    OUTBOX_BACKOFF_MAX_SECONDS,
+    OUTBOX_RETENTION_HOURS
+)
+from database import begin_write, shard_engines, session_for_shard
+from models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# event_type -> lista di handler; ogni handler riceve (event_id, payload)
+_handlers: Dict[str, List[Callable[[int, dict], None]]] = {}
+
+
+def register_handler(event_type: str):
+    """
+    Registra un handler per un tipo di evento
+
+    La consegna è at-least-once: un handler può ricevere lo stesso evento più
+    volte (es. dopo un crash del dispatcher) e deve usare event_id per
+    riconoscere i duplicati.
+    """
+    def decorator(handler: Callable[[int, dict], None]):
+        _handlers.setdefault(event_type, []).append(handler)
+        return handler
+    return decorator
+
+
+def add_event(db: Session, event_type: str, payload: dict) -> OutboxEvent:
+    """
+    Accoda un evento nella sessione corrente
+
+    Va chiamata prima del commit della transazione di business: l'evento viene
+    scritto nello stesso commit (un solo INSERT in più), quindi esiste se e solo
+    se la modifica che lo ha generato è stata confermata.
+    """
+    event = OutboxEvent(event_type=event_type, payload=json.dumps(payload, default=str))
+    db.add(event)
+    return event
+
+
+def _backoff(attempts: int) -> float:
+    """Attesa esponenziale con jitter prima del prossimo tentativo"""
+    delay = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class OutboxDispatcher:
+    """
+    Consegna gli eventi dell'outbox agli handler registrati
+
+    Gli eventi vengono presi a blocchi con un lease (claimed_by/claimed_until):
+    sui database che lo supportano la selezione usa FOR UPDATE SKIP LOCKED, così
+    più dispatcher non si contendono le stesse righe; altrove (SQLite) l'UPDATE
+    condizionato sul lease basta a evitare doppie assegnazioni. Un evento il cui
+    dispatcher si ferma torna disponibile alla scadenza del lease.
+    """
+
+    def __init__(self, batch_size: int = OUTBOX_BATCH_SIZE, lease_seconds: int = OUTBOX_LEASE_SECONDS):
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        # Metriche del processo corrente
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.last_lag_seconds = 0.0
+
+    @staticmethod
+    def _supports_skip_locked(db: Session) -> bool:
+        return db.get_bind().dialect.name in ("postgresql", "mysql", "mariadb")
+
+    def claim_batch(self, db: Session) -> List[OutboxEvent]:
+        """Assegna a questo dispatcher un blocco di eventi disponibili"""
+        now = datetime.utcnow()
+        lease_free = (OutboxEvent.claimed_until == None) | (OutboxEvent.claimed_until < now)
+
+        query = db.query(OutboxEvent.id).filter(
+            OutboxEvent.processed_at == None,
+            OutboxEvent.failed_at == None,
+            OutboxEvent.available_at <= now,
+            lease_free
+        ).order_by(OutboxEvent.id).limit(self.batch_size)
+        if self._supports_skip_locked(db):
+            query = query.with_for_update(skip_locked=True)
+
+        ids = [row.id for row in query.all()]
+        if not ids:
+            db.commit()
+            return []
+
+        # Su SQLite la lettura non può diventare scrittura se un'altra istanza ha scritto nel frattempo
+        begin_write(db)
+        # Il lease viene preso solo se nessun altro lo ha fatto nel frattempo
+        db.query(OutboxEvent).filter(OutboxEvent.id.in_(ids), lease_free).update({
+            "claimed_by": self.worker_id,
+            "claimed_until": now + timedelta(seconds=self.lease_seconds)
+        }, synchronize_session=False)
+        db.commit()
+
+        return db.query(OutboxEvent).filter(
+            OutboxEvent.id.in_(ids),
+            OutboxEvent.claimed_by == self.worker_id
+        ).order_by(OutboxEvent.id).all()
+
+    def _deliver(self, event: OutboxEvent):
+        payload = json.loads(event.payload)
+        for handler in _handlers.get(event.event_type, []):
+            handler(event.id, payload)
+
+    def run_once(self) -> int:
+        """Elabora un blocco di eventi per shard; restituisce quanti ne sono stati presi"""
+        # Gli eventi stanno sullo stesso database (shard) della modifica che li ha generati
+        return sum(self._run_shard(shard_id) for shard_id in range(len(shard_engines)))
+
+    def _run_shard(self, shard_id: int) -> int:
+        db = session_for_shard(shard_id)
+        try:
+            events = self.claim_batch(db)
+            for event in events:
+                now = datetime.utcnow()
+                try:
+                    self._deliver(event)
+                    error = None
+                except Exception as e:
+                    error = e
+                # L'esito viene scritto dopo la consegna: la coda degli scrittori non attende gli handler
+                begin_write(db)
+                if error is not None:
+                    event.attempts += 1
+                    event.last_error = str(error)[:1000]
+                    event.claimed_by = None
+                    event.claimed_until = None
+                    if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                        event.failed_at = now
+                        self.dead += 1
+                        logger.error("Evento outbox %s (%s) scartato dopo %s tentativi: %s",
+                                     event.id, event.event_type, event.attempts, error)
+                    else:
+                        event.available_at = now + timedelta(seconds=_backoff(event.attempts))
+                        self.retried += 1
+                        logger.warning("Evento outbox %s (%s) fallito, nuovo tentativo alle %s: %s",
+                                       event.id, event.event_type, event.available_at, error)
+                else:
+                    event.processed_at = now
+                    event.claimed_until = None
+                    self.delivered += 1
+                    self.last_lag_seconds = (now - event.created_at).total_seconds()
+                # Ogni esito viene confermato subito: un crash ripete al massimo un evento
+                db.commit()
+            return len(events)
+        finally:
+            db.close()
+
+    def purge_processed(self) -> int:
+        """Elimina gli eventi consegnati più vecchi della retention"""
+        deleted = 0
+        for shard_id in range(len(shard_engines)):
+            db = session_for_shard(shard_id)
+            try:
+                begin_write(db)
+                deleted += db.query(OutboxEvent).filter(
+                    OutboxEvent.processed_at < datetime.utcnow() - timedelta(hours=OUTBOX_RETENTION_HOURS)
+                ).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+        return deleted
+
+    def run_forever(self, poll_seconds: float = OUTBOX_POLL_SECONDS):
+        logger.info("Dispatcher outbox %s avviato", self.worker_id)
+        last_purge = 0.0
+        while True:
+            try:
+                claimed = self.run_once()
+                if time.monotonic() - last_purge > 600:
+                    self.purge_processed()
+                    last_purge = time.monotonic()
+            except Exception:
+                logger.exception("Errore del dispatcher outbox")
+                claimed = 0
+            # Con un blocco pieno c'è probabilmente altro arretrato: niente attesa
+            if claimed < self.batch_size:
+                time.sleep(poll_seconds)
+
+
+def outbox_stats() -> dict:
+    """Arretrato e ritardo dell'outbox su tutti gli shard (per monitoraggio)"""
+    now = datetime.utcnow()
+    pending, oldest, dead = 0, None, 0
+    for shard_id in range(len(shard_engines)):
+        db = session_for_shard(shard_id)
+        try:
+            shard_pending, shard_oldest = db.query(func.count(OutboxEvent.id), func.min(OutboxEvent.created_at)).filter(
+                OutboxEvent.processed_at == None,
+                OutboxEvent.failed_at == None
+            ).one()
+            dead += db.query(func.count(OutboxEvent.id)).filter(OutboxEvent.failed_at != None).scalar()
+        finally:
+            db.close()
+        pending += shard_pending
+        if shard_oldest is not None and (oldest is None or shard_oldest < oldest):
+            oldest = shard_oldest
+    return {
+        "pending": pending,
+        "dead": dead,
+        "oldest_pending_age_seconds": (now - oldest).total_seconds() if oldest else 0.0
+    }
+
+
+@register_handler("transfer.completed")
+@register_handler("recharge.completed")
+def log_notification(event_id: int, payload: dict):
+    """Notifica simulata all'utente (in un sistema reale: email/push)"""
+    logger.info("Notifica evento %s per utente %s: %.2f€", event_id, payload.get("to_user_id"), payload.get("amount", 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispatcher degli eventi dell'outbox")
+    parser.add_argument("--once", action="store_true", help="Elabora un solo blocco ed esce")
+    parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    dispatcher = OutboxDispatcher(batch_size=args.batch_size)
+    if args.once:
+        print(f"{dispatcher.run_once()} eventi elaborati")
+    else:
+        dispatcher.run_forever()
+
+
+if __name__ == "__main__":
+    main()
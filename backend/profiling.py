@@ -0,0 +1,106 @@
+import logging
+import re
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+
+from config import SQL_PROFILING_SLOW_MS, SQL_PROFILING_REPEAT_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"IN \(__\[POSTCOMPILE_\w+\]\)|IN \([^)]*\)", re.IGNORECASE)
+
+# Profilo della richiesta in corso (None fuori da una richiesta HTTP)
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("sql_profile", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """Forma normalizzata di uno statement: stessi parametri vincolati, spazi e liste IN compattati"""
+    return _IN_LIST.sub("IN (...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class RequestProfile:
+    """Statement eseguiti durante una singola richiesta"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = defaultdict(lambda: [0, 0.0])  # forma -> [esecuzioni, tempo totale]
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        entry = self.shapes[statement_shape(statement)]
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def repeated(self, threshold: int = SQL_PROFILING_REPEAT_THRESHOLD):
+        """Forme eseguite almeno threshold volte (tipico pattern N+1 da lazy loading)"""
+        return sorted(
+            ((shape, count, elapsed) for shape, (count, elapsed) in self.shapes.items() if count >= threshold),
+            key=lambda item: item[1],
+            reverse=True
+        )
+
+    def report(self, limit: int = 5) -> str:
+        """Riepilogo degli statement più costosi e di quelli ripetuti"""
+        lines = [f"{self.count} query in {self.total_time * 1000:.1f} ms"]
+        for shape, count, elapsed in self.repeated():
+            lines.append(f"  N+1? {count}x ({elapsed * 1000:.1f} ms): {shape[:300]}")
+        slowest = sorted(self.shapes.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        for shape, (count, elapsed) in slowest:
+            lines.append(f"  {elapsed * 1000:.1f} ms ({count}x): {shape[:300]}")
+        return "\n".join(lines)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(statement, time.perf_counter() - started)
+
+
+def install_sql_profiling(app, engines: Iterable):
+    """
+    Attiva la profilazione SQL per richiesta (solo ambienti di sviluppo/staging)
+
+    Registra i listener su ogni engine (database principale e shard: una
+    richiesta può toccarne più d'uno) e un middleware che aggiunge gli header
+    X-DB-Queries / X-DB-Time e scrive un report per le richieste lente o con
+    statement ripetuti. Se non viene chiamata non c'è alcun costo: nessun
+    listener e nessun middleware vengono installati.
+    """
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.middleware("http")
+    async def sql_profiling_middleware(request, call_next):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _current_profile.reset(token)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        response.headers["X-DB-Queries"] = str(profile.count)
+        response.headers["X-DB-Time"] = f"{profile.total_time * 1000:.2f}"
+
+        if elapsed_ms >= SQL_PROFILING_SLOW_MS or profile.repeated():
+            logger.warning(
+                "Profilo SQL %s %s (%.1f ms): %s",
+                request.method, request.url.path, elapsed_ms, profile.report()
+            )
+        return response
+
+    logger.info("Profilazione SQL attiva")
@@ -0,0 +1,298 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import jwt
+from fastapi.responses import JSONResponse
+from starlette.routing import compile_path
+
+from config import (
+    SECRET_KEY,
+    ALGORITHM,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMITS,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_REDIS_URL,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_TRUSTED_PROXIES
+)
+
+logger = logging.getLogger(__name__)
+
+# Bucket scaduti rimossi al massimo a ogni richiesta (la pulizia resta O(1) per richiesta)
+EXPIRE_PER_CALL = 8
+
+
+class Limit(NamedTuple):
+    """Token bucket: capacity richieste di picco, ricaricate in period secondi"""
+    capacity: int
+    period: float
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.period
+
+
+class RoutePolicy(NamedTuple):
+    route: str
+    ip: Optional[Limit]
+    subject: Optional[Limit]
+
+
+def parse_policies(spec: str) -> Dict[str, RoutePolicy]:
+    """
+    Legge le policy da "METODO /percorso=ip:N/secondi,sub:N/secondi;..."
+
+    ip limita per indirizzo del client, sub per utente del token (sulle rotte
+    autenticate). "*" è la policy delle rotte non elencate.
+    """
+    policies = {}
+    for item in spec.split(";"):
+        if "=" not in item:
+            continue
+        route, limits = (part.strip() for part in item.split("=", 1))
+        parsed = {}
+        for limit in limits.split(","):
+            kind, _, value = limit.strip().partition(":")
+            capacity, _, period = value.partition("/")
+            if kind not in ("ip", "sub"):
+                raise ValueError(f"Limite non valido per {route}: {limit}")
+            parsed[kind] = Limit(int(capacity), float(period))
+        policies[route] = RoutePolicy(route, parsed.get("ip"), parsed.get("sub"))
+    return policies
+
+
+class MemoryBackend:
+    """
+    Bucket nella memoria del processo
+
+    Ogni bucket è una tupla (token, ultimo accesso, istante in cui torna pieno)
+    in un OrderedDict per ordine di accesso. Niente thread di pulizia: un
+    bucket di nuovo pieno equivale a uno assente, quindi i più vecchi vengono
+    rimossi pigramente durante le richieste, e oltre max_keys si scarta il
+    meno recente (nel peggiore dei casi un client ritrova il bucket pieno).
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._max_keys = max_keys
+
+    def __len__(self):
+        return len(self._buckets)
+
+    async def take(self, buckets: List[Tuple[str, Limit]]) -> float:
+        """
+        Consuma un token da ogni bucket solo se tutti ne hanno uno
+
+        Restituisce 0 se la richiesta è concessa, altrimenti i secondi di
+        attesa del bucket più lento; una richiesta rifiutata non consuma nulla.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+
+            levels = []
+            for key, limit in buckets:
+                entry = self._buckets.pop(key, None)
+                tokens = limit.capacity if entry is None else min(limit.capacity, entry[0] + (now - entry[1]) * limit.refill_rate)
+                levels.append(tokens)
+            wait = max((0.0 if tokens >= 1 else (1 - tokens) / limit.refill_rate
+                        for tokens, (_, limit) in zip(levels, buckets)), default=0.0)
+
+            for tokens, (key, limit) in zip(levels, buckets):
+                if not wait:
+                    tokens -= 1
+                self._buckets[key] = (tokens, now, now + (limit.capacity - tokens) / limit.refill_rate)
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def _expire(self, now: float):
+        for _ in range(EXPIRE_PER_CALL):
+            if not self._buckets:
+                return
+            key, entry = next(iter(self._buckets.items()))
+            if entry[2] > now:
+                return
+            del self._buckets[key]
+
+
+class RedisBackend:
+    """
+    Bucket condivisi tra worker e macchine su Redis
+
+    Lettura, ricarica e consumo di tutti i bucket della richiesta avvengono
+    in uno script Lua (atomico) con l'orologio di Redis, così i worker non
+    dipendono dai propri orologi; ogni chiave scade da sola quando il bucket
+    torna pieno.
+    """
+
+    # ARGV: capacità e ricarica al secondo di ciascuna chiave, nell'ordine di KEYS
+    _SCRIPT = """
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local levels = {}
+    local wait = 0
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[2 * i - 1])
+        local rate = tonumber(ARGV[2 * i])
+        local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+        local tokens = tonumber(bucket[1]) or capacity
+        local ts = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+        if tokens < 1 then wait = math.max(wait, (1 - tokens) / rate) end
+        levels[i] = tokens
+    end
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[2 * i - 1])
+        local rate = tonumber(ARGV[2 * i])
+        local tokens = levels[i]
+        if wait == 0 then tokens = tokens - 1 end
+        redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+        redis.call('PEXPIRE', key, math.ceil((capacity - tokens) / rate * 1000) + 1000)
+    end
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "ratelimit:"):
+        # Dipendenza opzionale: serve solo con RATE_LIMIT_BACKEND=redis
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(self._SCRIPT)
+        self._prefix = prefix
+
+    async def take(self, buckets: List[Tuple[str, Limit]]) -> float:
+        args = []
+        for _, limit in buckets:
+            args.extend((limit.capacity, limit.refill_rate))
+        result = await self._script(keys=[self._prefix + key for key, _ in buckets], args=args)
+        return float(result)
+
+
+def _create_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend()
+    if RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(f"RATE_LIMIT_BACKEND non valido: {RATE_LIMIT_BACKEND}")
+    return MemoryBackend()
+
+
+def _client_ip(request) -> str:
+    """
+    Indirizzo del client per i bucket per IP
+
+    Le voci di X-Forwarded-For più a sinistra le scrive il client stesso:
+    conta solo quella aggiunta dal più esterno dei proxy fidati, cioè la
+    RATE_LIMIT_TRUSTED_PROXIES-esima da destra.
+    """
+    if RATE_LIMIT_TRUSTED_PROXIES:
+        forwarded = [entry.strip() for entry in request.headers.get("X-Forwarded-For", "").split(",") if entry.strip()]
+        if forwarded:
+            return forwarded[-min(RATE_LIMIT_TRUSTED_PROXIES, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+
+def _token_subject(request) -> Optional[str]:
+    """Utente del token (solo firma e scadenza: nessun accesso al database)"""
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None
+    try:
+        return jwt.decode(auth_header[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except jwt.PyJWTError:
+        return None
+
+
+class RateLimiter:
+    """
+    Rate limiting per rotta, prima di qualsiasi lavoro della richiesta
+
+    Una richiesta consuma un token da ciascun bucket della sua policy: quello
+    del suo IP e, se presenta un token valido, quello del suo utente (senza
+    token la quota per utente ricade sull'IP). Basta un bucket vuoto per
+    rifiutarla con 429 e il Retry-After del bucket più lento; in quel caso
+    non consuma nulla neanche dagli altri bucket.
+
+    Il middleware gira prima del routing, quindi la rotta non è ancora nota:
+    le policy con parametri (es. "GET /users/{user_id}") vengono confrontate
+    con il percorso dell'URL come fa il router, dopo quelle esatte.
+    """
+
+    def __init__(self, policies: Dict[str, RoutePolicy], backend):
+        self.policies = policies
+        self.backend = backend
+        self.rejected = 0
+        # (metodo, regex del percorso, policy) per le rotte con parametri, nell'ordine di configurazione
+        self._templates = []
+        for route, policy in policies.items():
+            method, _, path = route.partition(" ")
+            if "{" in path:
+                self._templates.append((method, compile_path(path)[0], policy))
+
+    def policy_for(self, method: str, path: str) -> Optional[RoutePolicy]:
+        policy = self.policies.get(f"{method} {path}")
+        if policy is not None:
+            return policy
+        for template_method, regex, policy in self._templates:
+            if template_method == method and regex.match(path):
+                return policy
+        return self.policies.get("*")
+
+    def _buckets(self, request, policy: RoutePolicy) -> List[Tuple[str, Limit]]:
+        ip = _client_ip(request)
+        buckets = []
+        if policy.ip:
+            buckets.append((f"{policy.route}|ip|{ip}", policy.ip))
+        if policy.subject:
+            subject = _token_subject(request)
+            buckets.append((f"{policy.route}|sub|{subject}" if subject else f"{policy.route}|anon|{ip}", policy.subject))
+        return buckets
+
+    async def check(self, request) -> float:
+        """Secondi da attendere prima di riprovare (0 se la richiesta può passare)"""
+        policy = self.policy_for(request.method, request.url.path)
+        if policy is None:
+            return 0.0
+        buckets = self._buckets(request, policy)
+        if not buckets:
+            return 0.0
+
+        try:
+            wait = await self.backend.take(buckets)
+        except Exception:
+            # Backend condiviso non raggiungibile: meglio nessun limite che nessun servizio
+            logger.warning("Rate limiting non disponibile", exc_info=True, extra={"log_category": "rate_limit"})
+            return 0.0
+        if wait:
+            self.rejected += 1
+        return wait
+
+
+def install_rate_limiting(app, limiter: RateLimiter = None):
+    """
+    Rifiuta con 429 le richieste oltre i limiti
+
+    Va registrato prima del middleware CORS (quindi più interno), così anche
+    le risposte 429 hanno gli header CORS e il frontend può leggerle.
+    """
+    limiter = limiter or rate_limiter
+
+    @app.middleware("http")
+    async def rate_limit_middleware(request, call_next):
+        retry_after = await limiter.check(request)
+        if retry_after:
+            return JSONResponse(
+                status_code=429,
+                content={"detail": "Troppe richieste, riprova più tardi"},
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+        return await call_next(request)
+
+
+# Istanza globale per il processo corrente (None con il rate limiting disattivato)
+rate_limiter = RateLimiter(parse_policies(RATE_LIMITS), _create_backend()) if RATE_LIMIT_ENABLED else None
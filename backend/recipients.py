@@ -0,0 +1,309 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from config import (
+    RECIPIENT_INDEX_SYNC_SECONDS,
+    RECIPIENT_SEARCH_MIN_PREFIX,
+    FREQUENT_CONTACTS_HISTORY,
+    FREQUENT_CONTACTS_SIZE,
+    FREQUENT_CONTACTS_MAX_USERS,
+    FREQUENT_CONTACTS_TTL_SECONDS
+)
+from database import shard_engines, session_for_shard
+from models import User, Transaction
+
+# Margine con cui la sincronizzazione rilegge gli utenti modificati di recente (commit fuori ordine, orologi)
+SYNC_OVERLAP_SECONDS = 30
+
+
+class RecipientIndex:
+    """
+    Indice in memoria per la ricerca per prefisso dei destinatari.
+
+    Le chiavi (email, nome, cognome, nome completo) sono mantenute in una lista
+    ordinata: una ricerca è una bisect sul prefisso seguita da una scansione
+    delle sole chiavi che lo condividono. L'indice viene caricato una volta dal
+    database e poi aggiornato in modo incrementale (registrazioni e modifiche
+    del profilo nel processo corrente, più una sincronizzazione periodica per
+    quelle degli altri worker: utenti con id superiore all'ultimo visto o con
+    updated_at entro l'ultima sincronizzazione meno SYNC_OVERLAP_SECONDS; quelli
+    disattivati vengono rimossi). Con più shard gli utenti si leggono da tutti,
+    ciascuno con il proprio ultimo id e istante di sincronizzazione.
+    """
+
+    def __init__(self, sync_interval: float = RECIPIENT_INDEX_SYNC_SECONDS):
+        self._lock = threading.Lock()
+        self._keys = []  # Lista ordinata di tuple (chiave, user_id)
+        self._users = {}  # user_id -> (email, full_name, chiavi)
+        self._synced_user_ids = {}  # shard_id -> ultimo id letto da quello shard
+        self._synced_at = {}  # shard_id -> inizio dell'ultima sincronizzazione di quello shard
+        self._loaded = False
+        self._last_sync = 0.0
+        self._sync_interval = sync_interval
+
+    @staticmethod
+    def _keys_for(email: str, first_name: str, last_name: str) -> set:
+        """Chiavi normalizzate con cui un utente può essere trovato"""
+        first = (first_name or "").strip().lower()
+        last = (last_name or "").strip().lower()
+        keys = {email.lower()}
+        for key in (first, last, f"{first} {last}".strip(), f"{last} {first}".strip()):
+            if key:
+                keys.add(key)
+        return keys
+
+    def _add_locked(self, user_id: int, email: str, first_name: str, last_name: str):
+        if user_id in self._users:
+            self._remove_locked(user_id)
+
+        keys = self._keys_for(email, first_name, last_name)
+        for key in keys:
+            insort(self._keys, (key, user_id))
+
+        self._users[user_id] = (email, f"{first_name} {last_name}".strip(), keys)
+
+    def _remove_locked(self, user_id: int):
+        _, _, keys = self._users.pop(user_id)
+        for key in keys:
+            position = bisect_left(self._keys, (key, user_id))
+            if position < len(self._keys) and self._keys[position] == (key, user_id):
+                del self._keys[position]
+
+    def _add_many_locked(self, entries: Dict[int, tuple], keys: List[tuple]):
+        """Aggiunge in blocco utenti e chiavi già ordinate (un solo ordinamento invece di un insort per chiave)"""
+        # Utenti già indicizzati: rimossi e reinseriti solo se nome o email sono cambiati
+        present = entries.keys() & self._users.keys()
+        unchanged = {user_id for user_id in present if self._users[user_id] == entries[user_id]}
+        for user_id in present - unchanged:
+            self._remove_locked(user_id)
+        if unchanged:
+            keys = [item for item in keys if item[1] not in unchanged]
+            entries = {user_id: entry for user_id, entry in entries.items() if user_id not in unchanged}
+        if not entries:
+            return
+
+        self._users.update(entries)
+        if not self._keys:
+            self._keys = keys
+        else:
+            # Due sequenze già ordinate: il sort le fonde in tempo lineare
+            self._keys.extend(keys)
+            self._keys.sort()
+
+    def _fetch_changes(self, db: Session, shard_id: int) -> list:
+        """Utenti dello shard nuovi o modificati dall'ultima sincronizzazione (al primo caricamento tutti gli attivi)"""
+        # La sessione della richiesta serve il proprio shard, gli altri ne usano una propria
+        shard_db = db if db.info.get("shard_id", 0) == shard_id else session_for_shard(shard_id)
+        try:
+            query = shard_db.query(User.id, User.email, User.first_name, User.last_name, User.is_active)
+            synced_at = self._synced_at.get(shard_id)
+            if synced_at is None:
+                query = query.filter(User.is_active == True)
+            else:
+                cutoff = synced_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+                query = query.filter(
+                    (User.id > self._synced_user_ids.get(shard_id, 0)) | (User.updated_at >= cutoff)
+                )
+            return query.order_by(User.id).all()
+        finally:
+            if shard_db is not db:
+                shard_db.close()
+
+    def sync(self, db: Session):
+        """Carica gli utenti nuovi o modificati (tutti al primo utilizzo) e rimuove i disattivati"""
+        now = time.monotonic()
+        if self._loaded and now - self._last_sync < self._sync_interval:
+            return
+
+        started = datetime.utcnow()
+        rows_by_shard = {shard_id: self._fetch_changes(db, shard_id) for shard_id in range(len(shard_engines))}
+        rows = [row for shard_rows in rows_by_shard.values() for row in shard_rows]
+
+        # Chiavi calcolate e ordinate fuori dal lock: al primo caricamento sono
+        # quelle di tutti gli utenti e le ricerche non devono attenderle
+        entries = {}
+        keys = []
+        deactivated = []
+        for row in rows:
+            if not row.is_active:
+                deactivated.append(row.id)
+                continue
+            user_keys = self._keys_for(row.email, row.first_name, row.last_name)
+            entries[row.id] = (row.email, f"{row.first_name} {row.last_name}".strip(), user_keys)
+            keys.extend((key, row.id) for key in user_keys)
+        keys.sort()
+
+        with self._lock:
+            for user_id in deactivated:
+                if user_id in self._users:
+                    self._remove_locked(user_id)
+            self._add_many_locked(entries, keys)
+            for shard_id, shard_rows in rows_by_shard.items():
+                if shard_rows:
+                    self._synced_user_ids[shard_id] = max(self._synced_user_ids.get(shard_id, 0), shard_rows[-1].id)
+                self._synced_at[shard_id] = started
+            self._loaded = True
+            self._last_sync = now
+
+    def add_user(self, user: User):
+        """Aggiunge o aggiorna un utente nell'indice (registrazione o modifica del profilo)"""
+        with self._lock:
+            self._add_locked(user.id, user.email, user.first_name, user.last_name)
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        """Restituisce email e nome di un utente indicizzato"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        return {"id": user_id, "email": entry[0], "full_name": entry[1]}
+
+    def matches(self, user_id: int, prefix: str) -> bool:
+        """Verifica se un utente indicizzato corrisponde al prefisso"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return False
+        return any(key.startswith(prefix) for key in entry[2])
+
+    def search(self, db: Session, prefix: str, limit: int = 10, exclude_user_id: Optional[int] = None) -> List[int]:
+        """
+        Cerca gli utenti con almeno una chiave che inizia con il prefisso
+
+        Args:
+            db: Sessione usata solo per la sincronizzazione incrementale
+            prefix: Prefisso da cercare (email, nome o cognome)
+            limit: Numero massimo di risultati
+            exclude_user_id: Utente da escludere (tipicamente l'utente corrente)
+
+        Returns:
+            Lista di user_id in ordine alfabetico di chiave
+        """
+        self.sync(db)
+
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, (prefix, 0))
+            while position < len(self._keys) and len(results) < limit:
+                key, user_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                if user_id != exclude_user_id and user_id not in seen:
+                    seen.add(user_id)
+                    results.append(user_id)
+                position += 1
+
+        return results
+
+
+class FrequentContactsCache:
+    """
+    Cache per utente dei destinatari più frequenti.
+
+    Alla prima richiesta (o alla scadenza del TTL) la lista viene ricavata dagli
+    ultimi trasferimenti inviati dall'utente; ogni nuovo trasferimento la aggiorna
+    direttamente in memoria, senza ulteriori query.
+    """
+
+    def __init__(
+        self,
+        history: int = FREQUENT_CONTACTS_HISTORY,
+        size: int = FREQUENT_CONTACTS_SIZE,
+        max_users: int = FREQUENT_CONTACTS_MAX_USERS,
+        ttl: float = FREQUENT_CONTACTS_TTL_SECONDS
+    ):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (caricato_il, Counter)
+        self._history = history
+        self._size = size
+        self._max_users = max_users
+        self._ttl = ttl
+
+    def _load(self, db: Session, user_id: int) -> Counter:
+        rows = db.query(Transaction.to_user_id).filter(
+            Transaction.from_user_id == user_id,
+            Transaction.transaction_type == "transfer"
+        ).order_by(Transaction.created_at.desc()).limit(self._history).all()
+        return Counter(row.to_user_id for row in rows)
+
+    def _store_locked(self, user_id: int, counts: Counter, loaded_at: float):
+        self._entries[user_id] = (loaded_at, counts)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self._max_users:
+            self._entries.popitem(last=False)
+
+    def get(self, db: Session, user_id: int) -> List[int]:
+        """Restituisce gli user_id dei contatti più frequenti, dal più usato"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[0] < self._ttl:
+                self._entries.move_to_end(user_id)
+                return [contact for contact, _ in entry[1].most_common(self._size)]
+
+        counts = self._load(db, user_id)
+        with self._lock:
+            self._store_locked(user_id, counts, now)
+        return [contact for contact, _ in counts.most_common(self._size)]
+
+    def record_transfer(self, from_user_id: int, to_user_id: int):
+        """Aggiorna la cache dopo un trasferimento completato"""
+        with self._lock:
+            entry = self._entries.get(from_user_id)
+            if entry is None:
+                # Sarà caricata dal database alla prima richiesta
+                return
+            entry[1][to_user_id] += 1
+            self._entries.move_to_end(from_user_id)
+
+
+# Istanze globali per il processo corrente
+recipient_index = RecipientIndex()
+frequent_contacts = FrequentContactsCache()
+
+
+def suggest_recipients(db: Session, user_id: int, prefix: str, limit: int = 10) -> List[Dict]:
+    """
+    Suggerimenti per l'autocompletamento del destinatario
+
+    Args:
+        db: Sessione del database (usata solo a cache fredda)
+        user_id: Utente che sta compilando il trasferimento
+        prefix: Testo digitato; se più corto di RECIPIENT_SEARCH_MIN_PREFIX vengono
+            restituiti solo i contatti frequenti che vi corrispondono
+        limit: Numero massimo di suggerimenti
+
+    Returns:
+        Lista di dict con id, email, full_name e is_frequent
+    """
+    recipient_index.sync(db)
+    prefix = prefix.strip().lower()
+    # Un prefisso di una o due lettere corrisponde a una parte enorme dell'indice
+    matches = recipient_index.search(db, prefix, limit=limit, exclude_user_id=user_id) if len(prefix) >= RECIPIENT_SEARCH_MIN_PREFIX else []
+
+    results = []
+    seen = set()
+
+    # I contatti frequenti che corrispondono al prefisso vengono proposti per primi
+    for contact_id in frequent_contacts.get(db, user_id):
+        if contact_id == user_id or (prefix and not recipient_index.matches(contact_id, prefix)):
+            continue
+        info = recipient_index.get(contact_id)
+        if info:
+            results.append({**info, "is_frequent": True})
+            seen.add(contact_id)
+
+    for contact_id in matches:
+        if contact_id not in seen:
+            results.append({**recipient_index.get(contact_id), "is_frequent": False})
+
+    return results[:limit]
@@ -0,0 +1,412 @@
+import argparse
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterator, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import (
+    REPORT_OUTPUT_DIR,
+    REPORT_WORKER_PROCESSES,
+    REPORT_POLL_SECONDS,
+    REPORT_LEASE_SECONDS,
+    REPORT_MAX_ATTEMPTS,
+    REPORT_MAX_QUEUED_PER_USER,
+    REPORT_MAX_RUNNING_PER_USER,
+    REPORT_STREAM_BATCH_SIZE
+)
+from database import begin_write, shard_engines, session_for_shard, session_for_user
+from models import User, Transaction, ArchivedTransaction, ReportJob
+from counterparties import enrich_transactions
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ("pending", "running")
+
+# Candidati esaminati a ogni assegnazione (quelli di utenti già al limite vengono saltati)
+CLAIM_SCAN_SIZE = 50
+
+
+def report_period(report_type: str, period: str) -> Tuple[datetime, datetime]:
+    """Inizio (incluso) e fine (esclusa) del periodo: un mese per l'estratto conto, un anno per il riepilogo"""
+    if report_type == "yearly_summary":
+        start = datetime.strptime(period, "%Y")
+        return start, start.replace(year=start.year + 1)
+    start = datetime.strptime(period, "%Y-%m")
+    return start, (start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1))
+
+
+def enqueue_report(db: Session, user_id: int, report_type: str, period: str) -> Tuple[ReportJob, bool]:
+    """
+    Mette in coda un report per l'utente
+
+    Una richiesta identica a un job ancora in coda o in esecuzione restituisce
+    quel job (dedup_key è unica finché il job è attivo, quindi anche due
+    richieste concorrenti ne creano uno solo).
+
+    Returns:
+        (job, True se appena creato)
+    """
+    period_start, period_end = report_period(report_type, period)
+    dedup_key = f"{user_id}:{report_type}:{period_start:%Y-%m}"
+
+    # Controllo del limite e inserimento nella stessa transazione di scrittura
+    begin_write(db)
+    existing = db.query(ReportJob).filter(ReportJob.dedup_key == dedup_key).first()
+    if existing:
+        return existing, False
+
+    active = db.query(func.count(ReportJob.id)).filter(
+        ReportJob.user_id == user_id,
+        ReportJob.status.in_(ACTIVE_STATES)
+    ).scalar()
+    if active >= REPORT_MAX_QUEUED_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Troppi report in coda, riprova al termine di quelli già richiesti"
+        )
+
+    job = ReportJob(
+        user_id=user_id,
+        report_type=report_type,
+        period_start=period_start,
+        period_end=period_end,
+        status="pending",
+        dedup_key=dedup_key,
+        attempts=0
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Creato nel frattempo da una richiesta identica
+        db.rollback()
+        return db.query(ReportJob).filter(ReportJob.dedup_key == dedup_key).first(), False
+    db.refresh(job)
+    return job, True
+
+
+def _stream_rows(db: Session, model, user_id: int, start: datetime, end: datetime):
+    # yield_per usa un cursore lato server (stream_results): le righe arrivano a blocchi e
+    # la sessione non le trattiene, quindi quelle già scritte vengono liberate
+    return db.query(model).filter(
+        (model.from_user_id == user_id) | (model.to_user_id == user_id),
+        model.created_at >= start,
+        model.created_at < end
+    ).order_by(model.created_at, model.id).yield_per(REPORT_STREAM_BATCH_SIZE)
+
+
+def iter_period_transactions(user_id: int, start: datetime, end: datetime) -> Iterator:
+    """
+    Transazioni del periodo in ordine cronologico, da tabella calda e archivio
+
+    Ogni cursore lato server ha la propria sessione (quindi la propria
+    connessione): su una connessione si può leggere un solo risultato non
+    bufferizzato alla volta, e con MySQL un secondo statement scarterebbe in
+    silenzio le righe non ancora lette del primo. Il cursore della tabella
+    calda parte per primo: una riga archiviata nel frattempo compare in
+    entrambi (ed è scartata come duplicato), mai in nessuno dei due.
+    """
+    hot_db = session_for_user(user_id)
+    archive_db = session_for_user(user_id)
+    try:
+        last_id = None
+        for transaction in heapq.merge(
+            _stream_rows(hot_db, Transaction, user_id, start, end),
+            _stream_rows(archive_db, ArchivedTransaction, user_id, start, end),
+            key=lambda transaction: (transaction.created_at, transaction.id)
+        ):
+            # Una riga archiviata mentre i due cursori partivano compare in entrambi (adiacente)
+            if transaction.id == last_id:
+                continue
+            last_id = transaction.id
+            yield transaction
+    finally:
+        hot_db.close()
+        archive_db.close()
+
+
+def _bucket(report_type: str, moment: datetime) -> str:
+    # Totali giornalieri nell'estratto conto, mensili nel riepilogo annuale
+    return moment.strftime("%Y-%m") if report_type == "yearly_summary" else moment.strftime("%Y-%m-%d")
+
+
+def generate_report(db: Session, job: ReportJob) -> Tuple[str, int]:
+    """
+    Scrive il report su disco in JSON; restituisce (percorso, numero di transazioni)
+
+    Le transazioni arrivano dal cursore a blocchi, vengono arricchite con la
+    controparte (stessa forma di TransactionResponse usata da /transactions)
+    e scritte subito nel file: la memoria usata non dipende dalla lunghezza
+    del periodo. Il file compare con il nome finale solo quando è completo.
+    """
+    os.makedirs(REPORT_OUTPUT_DIR, exist_ok=True)
+    path = os.path.join(REPORT_OUTPUT_DIR, f"{job.report_type}-{job.user_id}-{job.id}.json")
+    partial = f"{path}.{os.getpid()}.tmp"
+    try:
+        count = _write_report(db, job, partial)
+    except Exception:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, path)
+    return path, count
+
+
+def _write_report(db: Session, job: ReportJob, path: str) -> int:
+    totals = {}
+    count = 0
+    # Le controparti si risolvono sulla sessione del job, non su quelle dei cursori;
+    # closing() chiude cursori e sessioni anche se la scrittura si interrompe
+    with closing(iter_period_transactions(job.user_id, job.period_start, job.period_end)) as rows, \
+            open(path, "w", encoding="utf-8") as output:
+        header = {
+            "report_type": job.report_type,
+            "user_id": job.user_id,
+            "period_start": job.period_start.isoformat(),
+            "period_end": job.period_end.isoformat(),
+            "generated_at": datetime.utcnow().isoformat()
+        }
+        output.write(json.dumps(header)[:-1] + ', "transactions": [')
+
+        while True:
+            chunk = list(islice(rows, REPORT_STREAM_BATCH_SIZE))
+            if not chunk:
+                break
+            for transaction in enrich_transactions(db, chunk, job.user_id):
+                output.write(("," if count else "") + "\n" + transaction.model_dump_json())
+                count += 1
+
+                bucket = totals.setdefault(_bucket(job.report_type, transaction.created_at), {
+                    "incoming": 0.0, "outgoing": 0.0, "count": 0
+                })
+                bucket["outgoing" if transaction.from_user_id == job.user_id else "incoming"] += transaction.amount
+                bucket["count"] += 1
+
+        periods = [
+            {
+                "period": period,
+                "incoming": round(values["incoming"], 2),
+                "outgoing": round(values["outgoing"], 2),
+                "net": round(values["incoming"] - values["outgoing"], 2),
+                "count": values["count"]
+            }
+            for period, values in sorted(totals.items())
+        ]
+        summary = {
+            "incoming": round(sum(period["incoming"] for period in periods), 2),
+            "outgoing": round(sum(period["outgoing"] for period in periods), 2),
+            "count": count
+        }
+        summary["net"] = round(summary["incoming"] - summary["outgoing"], 2)
+        output.write(f'\n], "totals": {json.dumps(periods)}, "summary": {json.dumps(summary)}}}\n')
+    return count
+
+
+class ReportWorker:
+    """
+    Esegue i job della coda dei report, uno alla volta
+
+    Come lo scheduler dei bonifici, i job vengono presi con un lease (FOR
+    UPDATE SKIP LOCKED dove disponibile), quindi più processi possono girare
+    insieme; un job il cui worker si ferma viene ripreso alla scadenza del
+    lease. Un utente non ha mai più di REPORT_MAX_RUNNING_PER_USER job in
+    esecuzione: la verifica avviene con la riga dell'utente bloccata, così due
+    worker non la superano insieme.
+    """
+
+    def __init__(self, lease_seconds: int = REPORT_LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        # Metriche del processo corrente
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    @staticmethod
+    def _supports_skip_locked(db: Session) -> bool:
+        return db.get_bind().dialect.name in ("postgresql", "mysql", "mariadb")
+
+    @staticmethod
+    def _claimable(now: datetime):
+        # In coda, oppure in esecuzione con il lease scaduto (worker fermo)
+        return (ReportJob.status == "pending") | (
+            (ReportJob.status == "running") & (ReportJob.claimed_until < now)
+        )
+
+    def _candidates(self, db: Session, now: datetime):
+        query = db.query(ReportJob.id, ReportJob.user_id).filter(
+            self._claimable(now)
+        ).order_by(ReportJob.created_at, ReportJob.id).limit(CLAIM_SCAN_SIZE)
+        if self._supports_skip_locked(db):
+            query = query.with_for_update(skip_locked=True)
+        return query.all()
+
+    def claim_next(self, db: Session) -> Optional[int]:
+        """Assegna a questo worker il prossimo job eseguibile"""
+        now = datetime.utcnow()
+        # Lettura senza lock di scrittura: con la coda vuota il polling non blocca nessuno
+        if not self._candidates(db, now):
+            db.commit()
+            return None
+
+        begin_write(db)
+        for job_id, user_id in self._candidates(db, now):
+            db.query(User.id).filter(User.id == user_id).with_for_update().first()
+            running = db.query(func.count(ReportJob.id)).filter(
+                ReportJob.user_id == user_id,
+                ReportJob.status == "running",
+                ReportJob.claimed_until >= now,
+                ReportJob.id != job_id
+            ).scalar()
+            if running >= REPORT_MAX_RUNNING_PER_USER:
+                continue
+
+            claimed = db.query(ReportJob).filter(ReportJob.id == job_id, self._claimable(now)).update({
+                "status": "running",
+                "claimed_by": self.worker_id,
+                "claimed_until": now + timedelta(seconds=self.lease_seconds),
+                "attempts": ReportJob.attempts + 1,
+                "started_at": now
+            }, synchronize_session=False)
+            if claimed:
+                db.commit()
+                return job_id
+        db.commit()
+        return None
+
+    def _finish(self, db: Session, job_id: int, **fields):
+        """Aggiorna il job solo se il lease è ancora di questo worker"""
+        begin_write(db)
+        db.query(ReportJob).filter(
+            ReportJob.id == job_id,
+            ReportJob.claimed_by == self.worker_id
+        ).update({"claimed_by": None, "claimed_until": None, **fields}, synchronize_session=False)
+        db.commit()
+
+    def process(self, db: Session, job_id: int):
+        job = db.query(ReportJob).filter(ReportJob.id == job_id).first()
+        if job.attempts > REPORT_MAX_ATTEMPTS:
+            self.failed += 1
+            self._finish(db, job_id, status="failed", dedup_key=None, finished_at=datetime.utcnow(),
+                         last_error=job.last_error or "Tentativi esauriti")
+            return
+
+        started = time.perf_counter()
+        try:
+            path, count = generate_report(db, job)
+        except Exception as e:
+            db.rollback()
+            logger.exception("Report %s non generato (tentativo %s)", job_id, job.attempts)
+            if job.attempts >= REPORT_MAX_ATTEMPTS:
+                self.failed += 1
+                self._finish(db, job_id, status="failed", dedup_key=None, finished_at=datetime.utcnow(), last_error=str(e))
+            else:
+                self.retried += 1
+                self._finish(db, job_id, status="pending", last_error=str(e))
+            return
+
+        self.completed += 1
+        self._finish(
+            db, job_id,
+            status="completed",
+            dedup_key=None,
+            file_path=path,
+            file_size=os.path.getsize(path),
+            transaction_count=count,
+            last_error=None,
+            finished_at=datetime.utcnow()
+        )
+        logger.info("Report %s generato: %s transazioni in %.1fs", job_id, count, time.perf_counter() - started)
+
+    def run_once(self) -> int:
+        """Esegue al più un job per shard; restituisce quanti ne ha eseguiti"""
+        done = 0
+        for shard_id in range(len(shard_engines)):
+            db = session_for_shard(shard_id)
+            try:
+                job_id = self.claim_next(db)
+                if job_id is not None:
+                    self.process(db, job_id)
+                    done += 1
+            finally:
+                db.close()
+        return done
+
+    def run_forever(self, poll_seconds: float = REPORT_POLL_SECONDS):
+        logger.info("Worker dei report %s avviato", self.worker_id)
+        while True:
+            try:
+                done = self.run_once()
+            except Exception:
+                logger.exception("Errore del worker dei report")
+                done = 0
+            # Finché ci sono job in coda si procede senza attesa
+            if not done:
+                time.sleep(poll_seconds)
+
+
+def _worker_process():
+    logging.basicConfig(level=logging.INFO)
+    ReportWorker().run_forever()
+
+
+def run_pool(processes: int = REPORT_WORKER_PROCESSES):
+    """
+    Pool di processi worker, riavviati se terminano
+
+    Processi e non thread: la generazione è CPU-bound (serializzazione JSON) e
+    non deve competere con il GIL dei worker dell'API. Con "spawn" ogni
+    processo apre i propri engine invece di ereditare le connessioni del padre.
+    """
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    try:
+        while True:
+            alive = [worker for worker in workers if worker.is_alive()]
+            if workers and len(alive) < len(workers):
+                logger.warning("%s worker dei report terminati, riavvio", len(workers) - len(alive))
+            workers = alive
+            while len(workers) < processes:
+                worker = context.Process(target=_worker_process, name=f"report-worker-{len(workers)}", daemon=True)
+                worker.start()
+                workers.append(worker)
+            time.sleep(REPORT_POLL_SECONDS)
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker dei report in background (estratti conto, riepiloghi)")
+    parser.add_argument("--once", action="store_true", help="Esegue i job in coda nel processo corrente ed esce")
+    parser.add_argument("--processes", type=int, default=REPORT_WORKER_PROCESSES)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.once:
+        worker = ReportWorker()
+        while worker.run_once():
+            pass
+        print(f"{worker.completed} report generati, {worker.failed} falliti")
+    else:
+        run_pool(args.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    REVOCATION_SYNC_SECONDS,
+    REVOCATION_REBUILD_SECONDS,
+    REVOCATION_BLOOM_CAPACITY,
+    REVOCATION_BLOOM_ERROR_RATE
+)
+from database import SessionLocal, begin_write
+from models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Margine con cui la sincronizzazione rilegge le revoche recenti (commit fuori ordine, orologi)
+SYNC_OVERLAP_SECONDS = 30
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class BloomFilter:
+    """
+    Filtro di Bloom su bytearray
+
+    Nessun falso negativo: se might_contain() restituisce False la chiave non è
+    mai stata aggiunta. I falsi positivi (circa error_rate) vanno verificati a parte.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: k posizioni da due valori a 64 bit di un solo digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _jti_key(jti: str) -> str:
+    return f"jti:{jti}"
+
+
+def _subject_key(subject: str) -> str:
+    return f"sub:{subject}"
+
+
+class TokenRevocationList:
+    """
+    Revoche dei token JWT: tabella revoked_tokens con un filtro di Bloom davanti
+
+    Per quasi tutte le richieste il controllo è solo in memoria: si interroga il
+    database solo quando il filtro segnala un possibile match. Il filtro viene
+    aggiornato subito per le revoche del processo corrente e in modo incrementale
+    (ogni REVOCATION_SYNC_SECONDS) per quelle degli altri worker; periodicamente il
+    filtro viene ricostruito da zero. Le righe scadute le elimina prune_expired(),
+    fuori dalle richieste.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        self._last_id = 0
+        self._last_sync: Optional[datetime] = None
+        self._next_sync = 0.0
+        self._next_rebuild = 0.0
+
+    def _add_row(self, bloom: BloomFilter, row):
+        if row.jti:
+            bloom.add(_jti_key(row.jti))
+        if row.subject:
+            bloom.add(_subject_key(row.subject))
+
+    def _refresh(self, db: Session):
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+
+        with self._lock:
+            if now < self._next_sync:
+                return
+            started = datetime.utcnow()
+
+            if now >= self._next_rebuild:
+                # Ricostruzione del filtro (senza le righe eliminate da prune_expired):
+                # il nuovo filtro sostituisce il vecchio solo quando è completo
+                bloom = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+                last_id = 0
+                for row in db.query(RevokedToken.id, RevokedToken.jti, RevokedToken.subject).all():
+                    self._add_row(bloom, row)
+                    last_id = max(last_id, row.id)
+                self._bloom = bloom
+                self._last_id = last_id
+                self._next_rebuild = now + REVOCATION_REBUILD_SECONDS
+            else:
+                cutoff = self._last_sync - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+                rows = db.query(RevokedToken.id, RevokedToken.jti, RevokedToken.subject).filter(
+                    (RevokedToken.id > self._last_id) | (RevokedToken.created_at >= cutoff)
+                ).all()
+                for row in rows:
+                    self._add_row(self._bloom, row)
+                    self._last_id = max(self._last_id, row.id)
+
+            self._last_sync = started
+            self._next_sync = now + REVOCATION_SYNC_SECONDS
+
+    def is_revoked(self, payload: dict, db: Optional[Session] = None) -> bool:
+        """
+        Verifica se un token decodificato è stato revocato
+
+        Args:
+            payload: Claims del token (jti, sub, iat)
+            db: Sessione da usare; se assente ne viene aperta una solo quando serve
+
+        Returns:
+            True se il token è revocato
+        """
+        own_session = db is None
+        if own_session and time.monotonic() >= self._next_sync:
+            db = SessionLocal()
+        try:
+            if db is not None:
+                self._refresh(db)
+
+            jti = payload.get("jti")
+            subject = payload.get("sub")
+            jti_hit = bool(jti) and self._bloom.might_contain(_jti_key(jti))
+            subject_hit = bool(subject) and self._bloom.might_contain(_subject_key(subject))
+            if not jti_hit and not subject_hit:
+                return False
+
+            # Possibile revoca (o falso positivo): conferma dal database
+            if db is None:
+                db = SessionLocal()
+            conditions = []
+            if jti_hit:
+                conditions.append(RevokedToken.jti == jti)
+            if subject_hit:
+                # Revocati i token emessi fino all'istante della revoca compreso
+                conditions.append((RevokedToken.subject == subject) & (RevokedToken.revoked_before >= _issued_at(payload)))
+            condition = conditions[0] if len(conditions) == 1 else conditions[0] | conditions[1]
+            return db.query(RevokedToken.id).filter(condition).first() is not None
+        finally:
+            if own_session and db is not None:
+                db.close()
+
+    def revoke_token(self, db: Session, payload: dict):
+        """Revoca un singolo token (logout)"""
+        jti = payload.get("jti")
+        if not jti:
+            return
+        try:
+            begin_write(db, RevokedToken)
+            db.add(RevokedToken(jti=jti, expires_at=datetime.utcfromtimestamp(payload["exp"])))
+            db.commit()
+        except IntegrityError:
+            # Già revocato (es. due logout concorrenti con lo stesso token)
+            db.rollback()
+        with self._lock:
+            self._bloom.add(_jti_key(jti))
+
+    def revoke_subject(self, db: Session, subject: str):
+        """
+        Revoca tutti i token già emessi per un utente
+
+        Il confronto usa iat_ms (millisecondi): un token emesso subito dopo la
+        revoca (es. il nuovo login dopo "esci da tutti i dispositivi") resta
+        valido anche se emesso nello stesso secondo, uno emesso prima no.
+        """
+        begin_write(db, RevokedToken)
+        now = datetime.utcnow()
+        db.add(RevokedToken(
+            subject=subject,
+            revoked_before=now,
+            # Tutti i token emessi finora scadono entro la loro durata massima
+            expires_at=now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        ))
+        db.commit()
+        with self._lock:
+            self._bloom.add(_subject_key(subject))
+
+    def prune_expired(self) -> int:
+        """Elimina le revoche scadute (i loro token non sono più validi comunque)"""
+        db = SessionLocal()
+        try:
+            begin_write(db, RevokedToken)
+            deleted = db.query(RevokedToken).filter(
+                RevokedToken.expires_at < datetime.utcnow()
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+
+def _issued_at(payload: dict) -> datetime:
+    """Istante di emissione: iat_ms se presente, altrimenti iat (token emessi prima di iat_ms)"""
+    if "iat_ms" in payload:
+        return _EPOCH + timedelta(milliseconds=payload["iat_ms"])
+    return datetime.utcfromtimestamp(payload.get("iat", 0))
+
+
+def prune_in_background(interval: float = REVOCATION_REBUILD_SECONDS):
+    """Pulizia periodica delle revoche scadute su un thread del worker, fuori dalle richieste"""
+    def run():
+        while True:
+            try:
+                deleted = token_revocations.prune_expired()
+                if deleted:
+                    logger.info("Eliminate %s revoche scadute", deleted)
+            except Exception:
+                logger.exception("Errore nella pulizia delle revoche scadute")
+            time.sleep(interval)
+    threading.Thread(target=run, name="revocation-prune", daemon=True).start()
+
+
+# Istanza globale per il processo corrente
+token_revocations = TokenRevocationList()
@@ -0,0 +1,331 @@
+import argparse
+import calendar
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import List
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from config import (
+    SCHEDULER_BATCH_SIZE,
+    SCHEDULER_POLL_SECONDS,
+    SCHEDULER_LEASE_SECONDS,
+    SCHEDULER_MAX_ATTEMPTS,
+    SCHEDULER_RETRY_BASE_SECONDS,
+    SCHEDULER_RETRY_MAX_SECONDS
+)
+from database import begin_write, shard_engines, shard_for_user, session_for_shard
+from models import User, Transaction, ScheduledTransfer
+from outbox import add_event
+from sharding import SAGA_FINAL_STATES, saga_runner
+
+logger = logging.getLogger(__name__)
+
+
+def next_occurrence(current: datetime, frequency: str, anchor_day: int) -> datetime:
+    """Scadenza successiva a current; i mensili restano sul giorno richiesto (o sull'ultimo del mese)"""
+    if frequency == "daily":
+        return current + timedelta(days=1)
+    if frequency == "weekly":
+        return current + timedelta(weeks=1)
+    year, month = (current.year + 1, 1) if current.month == 12 else (current.year, current.month + 1)
+    return current.replace(year=year, month=month, day=min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+def _retry_delay(attempts: int) -> float:
+    """Attesa esponenziale con jitter: i bonifici rifiutati insieme non riprovano tutti insieme"""
+    delay = min(SCHEDULER_RETRY_MAX_SECONDS, SCHEDULER_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class TransferScheduler:
+    """
+    Esegue i bonifici programmati scaduti a blocchi
+
+    Come il dispatcher dell'outbox, gli ordini vengono presi con un lease
+    (FOR UPDATE SKIP LOCKED dove disponibile), quindi più istanze possono girare
+    insieme. Ogni blocco è una sola transazione: gli ordini vengono bloccati,
+    poi gli utenti coinvolti tutti insieme in ordine di id (niente deadlock tra
+    istanze), gli ordini di uno stesso ordinante vengono applicati in sequenza
+    sul saldo già aggiornato e le transazioni inserite con un unico INSERT
+    multi-riga. Un saldo insufficiente riguarda solo il singolo ordine.
+    """
+
+    def __init__(self, batch_size: int = SCHEDULER_BATCH_SIZE, lease_seconds: int = SCHEDULER_LEASE_SECONDS):
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        # Metriche del processo corrente
+        self.executed = 0
+        self.retried = 0
+        self.skipped = 0
+        self.failed = 0
+        self.last_lateness_seconds = 0.0
+
+    @staticmethod
+    def _supports_skip_locked(db: Session) -> bool:
+        return db.get_bind().dialect.name in ("postgresql", "mysql", "mariadb")
+
+    def claim_batch(self, db: Session) -> List[int]:
+        """Assegna a questo scheduler un blocco di ordini scaduti"""
+        now = datetime.utcnow()
+        lease_free = (ScheduledTransfer.claimed_until == None) | (ScheduledTransfer.claimed_until < now)
+
+        query = db.query(ScheduledTransfer.id).filter(
+            ScheduledTransfer.status == "active",
+            ScheduledTransfer.next_run_at <= now,
+            lease_free
+        ).order_by(ScheduledTransfer.next_run_at, ScheduledTransfer.id).limit(self.batch_size)
+        if self._supports_skip_locked(db):
+            query = query.with_for_update(skip_locked=True)
+
+        ids = [row.id for row in query.all()]
+        if ids:
+            # Su SQLite la lettura non può diventare scrittura se un'altra istanza ha scritto nel frattempo
+            begin_write(db)
+            # Il lease viene preso solo se nessun altro lo ha fatto nel frattempo
+            db.query(ScheduledTransfer).filter(ScheduledTransfer.id.in_(ids), lease_free).update({
+                "claimed_by": self.worker_id,
+                "claimed_until": now + timedelta(seconds=self.lease_seconds)
+            }, synchronize_session=False)
+        db.commit()
+        return ids
+
+    def _advance(self, schedule: ScheduledTransfer, now: datetime):
+        """Passa alla scadenza successiva (le scadenze perse durante un fermo non si recuperano)"""
+        schedule.attempts = 0
+        if schedule.frequency == "once":
+            schedule.status = "completed"
+            return
+        scheduled_for = next_occurrence(schedule.scheduled_for, schedule.frequency, schedule.anchor_day)
+        while scheduled_for <= now:
+            scheduled_for = next_occurrence(scheduled_for, schedule.frequency, schedule.anchor_day)
+        if schedule.end_at is not None and scheduled_for > schedule.end_at:
+            schedule.status = "completed"
+            return
+        schedule.scheduled_for = scheduled_for
+        schedule.next_run_at = scheduled_for
+
+    def _retry(self, schedule: ScheduledTransfer, now: datetime, error: str):
+        schedule.attempts += 1
+        schedule.last_error = error
+        if schedule.attempts < SCHEDULER_MAX_ATTEMPTS:
+            schedule.next_run_at = now + timedelta(seconds=_retry_delay(schedule.attempts))
+            self.retried += 1
+            return
+        # Tentativi esauriti: l'esecuzione viene saltata
+        self.skipped += 1
+        logger.warning("Bonifico programmato %s saltato dopo %s tentativi: %s", schedule.id, schedule.attempts, error)
+        if schedule.frequency == "once":
+            schedule.status = "failed"
+        else:
+            self._advance(schedule, now)
+
+    def execute_batch(self, db: Session, ids: List[int]) -> int:
+        """Esegue gli ordini assegnati in una sola transazione; restituisce quanti bonifici sono partiti"""
+        begin_write(db)
+        # Ordini ancora nostri e attivi (possono essere stati sospesi o eliminati dopo l'assegnazione)
+        schedules = db.query(ScheduledTransfer).filter(
+            ScheduledTransfer.id.in_(ids),
+            ScheduledTransfer.claimed_by == self.worker_id,
+            ScheduledTransfer.status == "active"
+        ).order_by(ScheduledTransfer.id).with_for_update().all()
+        if not schedules:
+            db.commit()
+            return 0
+
+        # Destinatari su un altro shard: eseguiti come saga dopo il commit del blocco
+        shard_id = db.info.get("shard_id", 0)
+        remote_ids = [schedule.id for schedule in schedules if shard_for_user(schedule.to_user_id) != shard_id]
+        schedules = [schedule for schedule in schedules if shard_for_user(schedule.to_user_id) == shard_id]
+
+        user_ids = {schedule.user_id for schedule in schedules} | {schedule.to_user_id for schedule in schedules}
+        users = {
+            user.id: user
+            for user in db.query(User).filter(User.id.in_(user_ids)).order_by(User.id).with_for_update().all()
+        }
+
+        now = datetime.utcnow()
+        rows = []
+        events = []
+        schedules.sort(key=lambda schedule: (schedule.user_id, schedule.id))
+        for sender_id, group in groupby(schedules, key=lambda schedule: schedule.user_id):
+            sender = users.get(sender_id)
+            for schedule in group:
+                schedule.claimed_by = None
+                schedule.claimed_until = None
+                recipient = users.get(schedule.to_user_id)
+
+                if sender is None or recipient is None or not sender.is_active or not recipient.is_active:
+                    schedule.status = "failed"
+                    schedule.last_error = "Ordinante o destinatario non più attivo"
+                    self.failed += 1
+                    continue
+                if sender.balance < schedule.amount:
+                    self._retry(schedule, now, "Saldo insufficiente")
+                    continue
+
+                sender.balance -= schedule.amount
+                recipient.balance += schedule.amount
+                rows.append({
+                    "from_user_id": sender.id,
+                    "to_user_id": recipient.id,
+                    "amount": schedule.amount,
+                    "transaction_type": "transfer",
+                    "description": schedule.description or f"Bonifico programmato a {recipient.email}",
+                    "created_at": now
+                })
+                events.append({
+                    "scheduled_transfer_id": schedule.id,
+                    "from_user_id": sender.id,
+                    "to_user_id": recipient.id,
+                    "amount": schedule.amount
+                })
+
+                self.last_lateness_seconds = (now - schedule.scheduled_for).total_seconds()
+                schedule.last_run_at = now
+                schedule.last_error = None
+                self._advance(schedule, now)
+
+        if rows:
+            db.execute(insert(Transaction), rows)
+            for payload in events:
+                add_event(db, "transfer.completed", payload)
+        db.commit()
+        self.executed += len(rows)
+        return len(rows) + sum(self._execute_remote(db, schedule_id) for schedule_id in remote_ids)
+
+    def _execute_remote(self, db: Session, schedule_id: int) -> int:
+        """
+        Ordine verso un altro shard: saga come per /transfer, poi aggiornamento dell'ordine
+
+        La saga e l'ordine stanno su database diversi, quindi l'ordine avanza
+        solo dopo che la saga è conclusa: se il processo si ferma in mezzo, o la
+        saga resta in corso, alla scadenza del lease l'ordine viene ripreso con
+        la stessa scadenza. La chiave di idempotenza (ordine, scadenza,
+        tentativo) fa ritrovare la saga già registrata invece di trasferire di
+        nuovo.
+        """
+        schedule = db.query(ScheduledTransfer).filter(ScheduledTransfer.id == schedule_id).first()
+        saga = saga_runner.start(
+            schedule.user_id, schedule.to_user_id, schedule.amount,
+            schedule.description or "Bonifico programmato",
+            idempotency_key=f"schedule:{schedule.id}:{schedule.scheduled_for:%Y%m%d%H%M%S}:{schedule.attempts}"
+        )
+
+        if saga.state not in SAGA_FINAL_STATES:
+            # Saga ancora in corso (es. shard non raggiungibile): l'ordine resta assegnato e,
+            # alla scadenza del lease, viene ripreso con la stessa chiave, quindi con la stessa saga
+            logger.warning("Bonifico programmato %s: saga %s ancora nello stato %s", schedule_id, saga.id, saga.state)
+            db.commit()
+            return 0
+
+        begin_write(db)
+        schedule = db.query(ScheduledTransfer).filter(ScheduledTransfer.id == schedule_id).with_for_update().first()
+        now = datetime.utcnow()
+        schedule.claimed_by = None
+        schedule.claimed_until = None
+        executed = 0
+        if saga.state == "failed":
+            self._retry(schedule, now, saga.last_error)
+        elif saga.state == "compensated":
+            schedule.status = "failed"
+            schedule.last_error = saga.last_error
+            self.failed += 1
+        else:
+            self.last_lateness_seconds = (now - schedule.scheduled_for).total_seconds()
+            schedule.last_run_at = now
+            schedule.last_error = None
+            self._advance(schedule, now)
+            executed = 1
+        db.commit()
+        self.executed += executed
+        return executed
+
+    def run_once(self) -> int:
+        """Elabora un blocco di ordini per shard; restituisce quanti ne sono stati presi"""
+        # Gli ordini stanno sullo shard dell'ordinante
+        return sum(self._run_shard(shard_id) for shard_id in range(len(shard_engines)))
+
+    def _run_shard(self, shard_id: int) -> int:
+        db = session_for_shard(shard_id)
+        try:
+            ids = self.claim_batch(db)
+            if ids:
+                try:
+                    executed = self.execute_batch(db, ids)
+                except Exception:
+                    # Il lease scade e un'altra esecuzione riprende gli stessi ordini
+                    db.rollback()
+                    raise
+                logger.info("Bonifici programmati: %s eseguiti su %s ordini", executed, len(ids))
+            return len(ids)
+        finally:
+            db.close()
+
+    def run_forever(self, poll_seconds: float = SCHEDULER_POLL_SECONDS):
+        logger.info("Scheduler dei bonifici %s avviato", self.worker_id)
+        while True:
+            try:
+                claimed = self.run_once()
+            except Exception:
+                logger.exception("Errore dello scheduler dei bonifici")
+                claimed = 0
+            # Con un blocco pieno c'è probabilmente altro arretrato: niente attesa
+            if claimed < self.batch_size:
+                time.sleep(poll_seconds)
+
+
+def scheduler_stats() -> dict:
+    """Arretrato e ritardo dei bonifici programmati su tutti gli shard (per monitoraggio)"""
+    now = datetime.utcnow()
+    due, oldest, retrying, failed = 0, None, 0, 0
+    for shard_id in range(len(shard_engines)):
+        db = session_for_shard(shard_id)
+        try:
+            shard_due, shard_oldest = db.query(func.count(ScheduledTransfer.id), func.min(ScheduledTransfer.scheduled_for)).filter(
+                ScheduledTransfer.status == "active",
+                ScheduledTransfer.next_run_at <= now
+            ).one()
+            retrying += db.query(func.count(ScheduledTransfer.id)).filter(
+                ScheduledTransfer.status == "active",
+                ScheduledTransfer.attempts > 0
+            ).scalar()
+            failed += db.query(func.count(ScheduledTransfer.id)).filter(ScheduledTransfer.status == "failed").scalar()
+        finally:
+            db.close()
+        due += shard_due
+        if shard_oldest is not None and (oldest is None or shard_oldest < oldest):
+            oldest = shard_oldest
+    return {
+        "due": due,
+        "retrying": retrying,
+        "failed": failed,
+        "max_lateness_seconds": (now - oldest).total_seconds() if oldest else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scheduler dei bonifici programmati")
+    parser.add_argument("--once", action="store_true", help="Elabora un solo blocco ed esce")
+    parser.add_argument("--batch-size", type=int, default=SCHEDULER_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    scheduler = TransferScheduler(batch_size=args.batch_size)
+    if args.once:
+        print(f"{scheduler.run_once()} ordini elaborati")
+    else:
+        scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
-from .user import UserCreate, UserLogin, UserResponse, UserUpdate
+from .user import UserCreate, UserLogin, UserResponse, UserUpdate, RecipientResponse
 from .transaction import TransferRequest, RechargeRequest, TransactionResponse, CardData
 from .card import CardCreate, CardResponse, CardUpdate, CardListResponse
+from .import_job import ImportJobResponse, ImportJobErrorResponse
+from .bootstrap import BootstrapResponse
+from .scheduled_transfer import ScheduledTransferCreate, ScheduledTransferUpdate, ScheduledTransferResponse
+from .report_job import ReportJobCreate, ReportJobResponse
+from .adapters import TRANSACTION_LIST_ADAPTER, CARD_LIST_ADAPTER, SCHEDULED_TRANSFER_LIST_ADAPTER
 
 __all__ = [
-    "UserCreate", "UserLogin", "UserResponse", "UserUpdate",
+    "UserCreate", "UserLogin", "UserResponse", "UserUpdate", "RecipientResponse",
     "TransferRequest", "RechargeRequest", "TransactionResponse", "CardData",
-    "CardCreate", "CardResponse", "CardUpdate", "CardListResponse"
+    "CardCreate", "CardResponse", "CardUpdate", "CardListResponse",
+    "ImportJobResponse", "ImportJobErrorResponse", "BootstrapResponse",
+    "ScheduledTransferCreate", "ScheduledTransferUpdate", "ScheduledTransferResponse",
+    "ReportJobCreate", "ReportJobResponse",
+    "TRANSACTION_LIST_ADAPTER", "CARD_LIST_ADAPTER", "SCHEDULED_TRANSFER_LIST_ADAPTER"
 ] 
\ No newline at end of file
@@ -0,0 +1,11 @@
+from pydantic import TypeAdapter
+
+from .transaction import TransactionResponse
+from .card import CardResponse
+from .scheduled_transfer import ScheduledTransferResponse
+
+# Costruiti una volta all'import: una lista viene validata (anche da oggetti ORM) e
+# serializzata in una sola chiamata a pydantic-core invece che elemento per elemento
+TRANSACTION_LIST_ADAPTER = TypeAdapter(list[TransactionResponse])
+CARD_LIST_ADAPTER = TypeAdapter(list[CardResponse])
+SCHEDULED_TRANSFER_LIST_ADAPTER = TypeAdapter(list[ScheduledTransferResponse])
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import Optional
+
+from .user import UserResponse
+from .transaction import TransactionResponse
+from .card import CardListResponse
+
+class BootstrapResponse(BaseModel):
+    balance: float
+    user: Optional[UserResponse] = None
+    transactions: Optional[list[TransactionResponse]] = None
+    cards: Optional[CardListResponse] = None
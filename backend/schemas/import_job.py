@@ -0,0 +1,23 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import Optional
+
+class ImportJobErrorResponse(BaseModel):
+    row_number: int
+    email: Optional[str] = None
+    message: str
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class ImportJobResponse(BaseModel):
+    id: int
+    source_format: str
+    status: str
+    processed_rows: int
+    inserted_rows: int
+    failed_rows: int
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,42 @@
+from pydantic import BaseModel, ConfigDict, Field, ValidationInfo, field_validator
+from datetime import datetime
+from typing import Optional
+
+REPORT_TYPES = ("monthly_statement", "yearly_summary")
+
+class ReportJobCreate(BaseModel):
+    report_type: str = Field("monthly_statement", description="monthly_statement o yearly_summary")
+    period: str = Field(..., description="Mese (AAAA-MM) per l'estratto conto, anno (AAAA) per il riepilogo")
+    
+    @field_validator('report_type')
+    @classmethod
+    def validate_report_type(cls, v):
+        if v not in REPORT_TYPES:
+            raise ValueError('Tipo di report non valido (monthly_statement, yearly_summary)')
+        return v
+    
+    @field_validator('period')
+    @classmethod
+    def validate_period(cls, v, info: ValidationInfo):
+        layout = "%Y" if info.data.get('report_type') == "yearly_summary" else "%Y-%m"
+        try:
+            datetime.strptime(v, layout)
+        except ValueError:
+            raise ValueError('Periodo non valido (AAAA-MM per l\'estratto conto, AAAA per il riepilogo)')
+        return v
+
+class ReportJobResponse(BaseModel):
+    id: int
+    report_type: str
+    period_start: datetime
+    period_end: datetime
+    status: str
+    attempts: int
+    last_error: Optional[str] = None
+    transaction_count: Optional[int] = None
+    file_size: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,67 @@
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
+from datetime import datetime, timezone
+from typing import Optional
+
+FREQUENCIES = ("once", "daily", "weekly", "monthly")
+
+def _to_utc(v):
+    # Le date senza fuso sono già intese in UTC
+    if v is not None and v.tzinfo is not None:
+        return v.astimezone(timezone.utc).replace(tzinfo=None)
+    return v
+
+class ScheduledTransferCreate(BaseModel):
+    to_email: EmailStr
+    amount: float = Field(..., gt=0)
+    description: Optional[str] = None
+    frequency: str = Field("monthly", description="once, daily, weekly o monthly")
+    start_at: datetime = Field(..., description="Prima esecuzione")
+    end_at: Optional[datetime] = Field(None, description="Nessuna esecuzione dopo questa data")
+    
+    @field_validator('frequency')
+    @classmethod
+    def validate_frequency(cls, v):
+        if v not in FREQUENCIES:
+            raise ValueError('Frequenza non valida (once, daily, weekly, monthly)')
+        return v
+    
+    @field_validator('start_at', 'end_at')
+    @classmethod
+    def validate_dates(cls, v):
+        return _to_utc(v)
+
+class ScheduledTransferUpdate(BaseModel):
+    amount: Optional[float] = Field(None, gt=0)
+    description: Optional[str] = None
+    next_run_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
+    status: Optional[str] = Field(None, description="active o paused")
+    
+    @field_validator('status')
+    @classmethod
+    def validate_status(cls, v):
+        if v is not None and v not in ("active", "paused"):
+            raise ValueError('Stato non valido (active, paused)')
+        return v
+    
+    @field_validator('next_run_at', 'end_at')
+    @classmethod
+    def validate_dates(cls, v):
+        return _to_utc(v)
+
+class ScheduledTransferResponse(BaseModel):
+    id: int
+    to_user_id: int
+    to_email: Optional[str] = None
+    amount: float
+    description: Optional[str] = None
+    frequency: str
+    next_run_at: datetime
+    end_at: Optional[datetime] = None
+    status: str
+    attempts: int
+    last_error: Optional[str] = None
+    last_run_at: Optional[datetime] = None
+    created_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from datetime import datetime
 from typing import Optional
 
@@ -28,5 +28,8 @@ class TransactionResponse(BaseModel):
     description: Optional[str] = None
     created_at: datetime
     
-    class Config:
-        from_attributes = True 
\ No newline at end of file
+    # Controparte dal punto di vista dell'utente corrente (assente per le ricariche)
+    counterparty_name: Optional[str] = None
+    counterparty_email: Optional[str] = None
+    
+    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
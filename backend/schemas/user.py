@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import BaseModel, ConfigDict, EmailStr, computed_field, field_validator
 from datetime import datetime, date
 from typing import Optional
 
@@ -17,43 +17,50 @@ class UserCreate(BaseModel):
     postal_code: str
     country: str = "Italia"
     
-    @validator('first_name')
+    @field_validator('first_name')
+    @classmethod
     def validate_first_name(cls, v):
         if not v or len(v.strip()) < 2:
             raise ValueError('Il nome è obbligatorio e deve avere almeno 2 caratteri')
         return v.strip().title()
     
-    @validator('last_name')
+    @field_validator('last_name')
+    @classmethod
     def validate_last_name(cls, v):
         if not v or len(v.strip()) < 2:
             raise ValueError('Il cognome è obbligatorio e deve avere almeno 2 caratteri')
         return v.strip().title()
     
-    @validator('phone_number')
+    @field_validator('phone_number')
+    @classmethod
     def validate_phone(cls, v):
         if not v or len(v.replace(' ', '').replace('+', '').replace('-', '')) < 8:
             raise ValueError('Il numero di telefono è obbligatorio e deve essere valido (minimo 8 cifre)')
         return v
     
-    @validator('address')
+    @field_validator('address')
+    @classmethod
     def validate_address(cls, v):
         if not v or len(v.strip()) < 5:
             raise ValueError('L\'indirizzo è obbligatorio e deve avere almeno 5 caratteri')
         return v.strip()
     
-    @validator('city')
+    @field_validator('city')
+    @classmethod
     def validate_city(cls, v):
         if not v or len(v.strip()) < 2:
             raise ValueError('La città è obbligatoria e deve avere almeno 2 caratteri')
         return v.strip().title()
     
-    @validator('postal_code')
+    @field_validator('postal_code')
+    @classmethod
     def validate_postal_code(cls, v):
         if not v or len(v.strip()) < 3:
             raise ValueError('Il codice postale è obbligatorio (minimo 3 caratteri)')
         return v.strip()
     
-    @validator('password')
+    @field_validator('password')
+    @classmethod
     def validate_password(cls, v):
         if len(v) < 6:
             raise ValueError('La password deve avere almeno 6 caratteri')
@@ -78,19 +85,18 @@ class UserResponse(BaseModel):
     created_at: datetime
     is_verified: bool
     
-    # Proprietà calcolate
-    full_name: Optional[str] = None
-    display_name: Optional[str] = None
+    model_config = ConfigDict(from_attributes=True)
     
-    class Config:
-        from_attributes = True
-        
-    def __init__(self, **data):
-        super().__init__(**data)
-        # Calcola i nomi derivati
-        if hasattr(self, 'first_name') and hasattr(self, 'last_name'):
-            self.full_name = f"{self.first_name} {self.last_name}"
-            self.display_name = self.full_name
+    # Proprietà calcolate: incluse nella serializzazione, senza lavoro in fase di validazione
+    @computed_field
+    @property
+    def full_name(self) -> str:
+        return f"{self.first_name} {self.last_name}"
+    
+    @computed_field
+    @property
+    def display_name(self) -> str:
+        return self.full_name
 
 class UserUpdate(BaseModel):
     first_name: Optional[str] = None
@@ -102,8 +108,15 @@ class UserUpdate(BaseModel):
     postal_code: Optional[str] = None
     country: Optional[str] = None
     
-    @validator('first_name', 'last_name')
+    @field_validator('first_name', 'last_name')
+    @classmethod
     def validate_names(cls, v):
         if v and len(v.strip()) < 2:
             raise ValueError('Nome e cognome devono avere almeno 2 caratteri')
-        return v.strip().title() if v else v 
\ No newline at end of file
+        return v.strip().title() if v else v
+
+class RecipientResponse(BaseModel):
+    id: int
+    email: str
+    full_name: str
+    is_frequent: bool = False
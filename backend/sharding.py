@@ -0,0 +1,391 @@
+import argparse
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import SHARD_DIRECTORY_CACHE_SIZE, SAGA_RECOVERY_AFTER_SECONDS
+from database import SessionLocal, begin_write, is_sharded, shard_for_user, session_for_shard, session_for_user, use_shard
+from models import User, Transaction, UserDirectoryEntry, TransferSaga, SagaStep
+from outbox import add_event
+
+logger = logging.getLogger(__name__)
+
+SAGA_FINAL_STATES = ("completed", "failed", "compensated")
+
+
+class ShardDirectory:
+    """
+    Directory globale email -> id utente, sul database principale
+
+    Assegna gli id dei nuovi utenti (unici su tutti gli shard) e risolve le
+    email in /login, get_current_user e /transfer. Le voci non cambiano mai
+    (l'email non è modificabile), quindi la cache LRU non ha bisogno di TTL.
+    """
+
+    def __init__(self, max_size: int = SHARD_DIRECTORY_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # email -> user_id
+        self._max_size = max_size
+
+    def locate(self, db: Session, email: str) -> Optional[int]:
+        """Id dell'utente con questa email (None se non registrato)"""
+        with self._lock:
+            user_id = self._entries.get(email)
+            if user_id is not None:
+                self._entries.move_to_end(email)
+                return user_id
+
+        row = db.query(UserDirectoryEntry.id).filter(UserDirectoryEntry.email == email).first()
+        if row is None:
+            return None
+        self._remember(email, row.id)
+        return row.id
+
+    def register(self, email: str) -> Optional[int]:
+        """
+        Riserva l'email e assegna l'id del nuovo utente (None se l'email è già registrata)
+
+        La voce viene scritta prima dell'utente (ne decide id e shard): se il
+        processo si ferma in mezzo resta una voce senza utente, che la
+        registrazione successiva con la stessa email riprende.
+        """
+        db = SessionLocal()
+        try:
+            begin_write(db, UserDirectoryEntry)
+            entry = UserDirectoryEntry(email=email)
+            db.add(entry)
+            db.commit()
+            self._remember(email, entry.id)
+            return entry.id
+        except IntegrityError:
+            db.rollback()
+            user_id = db.query(UserDirectoryEntry.id).filter(UserDirectoryEntry.email == email).scalar()
+        finally:
+            db.close()
+
+        if user_id is None or _user_exists(user_id):
+            return None
+        logger.warning("Voce della directory %s senza utente sullo shard: riassegnata", user_id)
+        return user_id
+
+    def remove(self, email: str):
+        """Libera l'email se la creazione dell'utente sullo shard non è andata a buon fine"""
+        with self._lock:
+            self._entries.pop(email, None)
+        db = SessionLocal()
+        try:
+            begin_write(db, UserDirectoryEntry)
+            db.query(UserDirectoryEntry).filter(UserDirectoryEntry.email == email).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _remember(self, email: str, user_id: int):
+        with self._lock:
+            self._entries[email] = user_id
+            self._entries.move_to_end(email)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+
+def _user_exists(user_id: int) -> bool:
+    db = session_for_user(user_id)
+    try:
+        return db.query(User.id).filter(User.id == user_id).first() is not None
+    finally:
+        db.close()
+
+
+def route_by_email(db: Session, email: str) -> bool:
+    """
+    Instrada la sessione sullo shard dell'utente con questa email
+
+    Returns:
+        False se l'email non è registrata (con un solo shard sempre True: decide la query)
+    """
+    if not is_sharded():
+        return True
+    user_id = shard_directory.locate(db, email)
+    if user_id is None:
+        return False
+    use_shard(db, shard_for_user(user_id))
+    return True
+
+
+def directory_emails(db: Session, user_ids) -> dict:
+    """Email degli utenti (anche di altri shard) dalla directory globale"""
+    if not user_ids:
+        return {}
+    rows = db.query(UserDirectoryEntry.id, UserDirectoryEntry.email).filter(UserDirectoryEntry.id.in_(set(user_ids))).all()
+    return {row.id: row.email for row in rows}
+
+
+class SagaAborted(Exception):
+    """Un passo della saga non può essere applicato (la saga va chiusa o compensata)"""
+
+
+class TransferSagaRunner:
+    """
+    Trasferimento tra utenti di shard diversi come saga
+
+    1. addebito sullo shard dell'ordinante (i fondi restano riservati)
+    2. accredito e movimento sullo shard del destinatario
+    3. conferma: movimento dell'ordinante; oppure, se l'accredito è impossibile,
+       compensazione che restituisce i fondi riservati
+
+    Ogni passo è una transazione locale allo shard che registra anche il passo
+    in saga_steps: ripeterlo (recupero dopo un crash, due worker sulla stessa
+    saga) non ha effetto. Lo stato della saga è sul database principale e
+    avanza con UPDATE condizionati, quindi un solo processo la porta avanti.
+    """
+
+    def _apply(self, shard_id: int, saga: TransferSaga, step: str, action: Callable[[Session], Optional[int]]):
+        db = session_for_shard(shard_id)
+        try:
+            begin_write(db)
+            applied = db.query(SagaStep.transaction_id).filter(SagaStep.saga_id == saga.id, SagaStep.step == step).first()
+            if applied:
+                # Passo ripetuto (es. dopo un crash prima della transizione): stesso risultato
+                db.commit()
+                return applied.transaction_id
+            saga_step = SagaStep(saga_id=saga.id, step=step)
+            db.add(saga_step)
+            saga_step.transaction_id = action(db)
+            db.commit()
+            return saga_step.transaction_id
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _debit(self, saga: TransferSaga):
+        def action(db: Session):
+            sender = db.query(User).filter(User.id == saga.from_user_id).with_for_update().first()
+            if sender is None or sender.balance < saga.amount:
+                raise SagaAborted("Saldo insufficiente")
+            sender.balance -= saga.amount
+        self._apply(shard_for_user(saga.from_user_id), saga, "debit", action)
+
+    def _credit(self, saga: TransferSaga):
+        def action(db: Session):
+            recipient = db.query(User).filter(User.id == saga.to_user_id).with_for_update().first()
+            if recipient is None or not recipient.is_active:
+                raise SagaAborted("Utente destinatario non disponibile")
+            recipient.balance += saga.amount
+            db.add(self._movement(saga))
+            add_event(db, "transfer.completed", {
+                "saga_id": saga.id,
+                "from_user_id": saga.from_user_id,
+                "to_user_id": saga.to_user_id,
+                "amount": saga.amount
+            })
+        self._apply(shard_for_user(saga.to_user_id), saga, "credit", action)
+
+    def _confirm(self, saga: TransferSaga) -> Optional[int]:
+        def action(db: Session):
+            transaction = self._movement(saga)
+            db.add(transaction)
+            db.flush()
+            return transaction.id
+        return self._apply(shard_for_user(saga.from_user_id), saga, "confirm", action)
+
+    def _release(self, saga: TransferSaga):
+        def action(db: Session):
+            sender = db.query(User).filter(User.id == saga.from_user_id).with_for_update().first()
+            sender.balance += saga.amount
+        self._apply(shard_for_user(saga.from_user_id), saga, "release", action)
+
+    @staticmethod
+    def _movement(saga: TransferSaga) -> Transaction:
+        # Stesso movimento su entrambi gli shard: ciascun utente vede la propria cronologia completa
+        return Transaction(
+            from_user_id=saga.from_user_id,
+            to_user_id=saga.to_user_id,
+            amount=saga.amount,
+            transaction_type="transfer",
+            description=saga.description,
+            created_at=saga.created_at
+        )
+
+    @staticmethod
+    def _transition(db: Session, saga: TransferSaga, state: str, **fields) -> bool:
+        # Stato da cui si parte, letto prima che l'inizio della scrittura scada la saga
+        saga_id, expected = saga.id, saga.state
+        begin_write(db, TransferSaga)
+        updated = db.query(TransferSaga).filter(
+            TransferSaga.id == saga_id,
+            TransferSaga.state == expected
+        ).update({"state": state, "updated_at": datetime.utcnow(), **fields}, synchronize_session=False)
+        # Il commit scade la saga: il prossimo accesso rilegge lo stato dal database
+        db.commit()
+        return bool(updated)
+
+    def advance(self, db: Session, saga: TransferSaga) -> TransferSaga:
+        """Porta avanti la saga fino a uno stato finale (o finché un altro processo non la prende)"""
+        while saga.state not in SAGA_FINAL_STATES:
+            if saga.state == "started":
+                try:
+                    self._debit(saga)
+                    moved = self._transition(db, saga, "debited")
+                except SagaAborted as e:
+                    moved = self._transition(db, saga, "failed", last_error=str(e))
+            elif saga.state == "debited":
+                try:
+                    self._credit(saga)
+                    moved = self._transition(db, saga, "credited")
+                except SagaAborted as e:
+                    moved = self._transition(db, saga, "compensating", last_error=str(e))
+            elif saga.state == "credited":
+                moved = self._transition(db, saga, "completed", transaction_id=self._confirm(saga))
+            elif saga.state == "compensating":
+                self._release(saga)
+                moved = self._transition(db, saga, "compensated")
+            else:
+                raise ValueError(f"Stato della saga sconosciuto: {saga.state}")
+            if not moved:
+                break
+        return saga
+
+    def start(self, from_user_id: int, to_user_id: int, amount: float, description: str,
+              idempotency_key: Optional[str] = None) -> TransferSaga:
+        """
+        Registra ed esegue un trasferimento tra shard
+
+        Con idempotency_key una chiave già vista non crea una nuova saga: viene
+        ripresa (se non conclusa) e restituita quella registrata allora.
+        """
+        db = SessionLocal()
+        try:
+            saga = None
+            if idempotency_key is not None:
+                saga = db.query(TransferSaga).filter(TransferSaga.idempotency_key == idempotency_key).first()
+            if saga is None:
+                begin_write(db, TransferSaga)
+                saga = TransferSaga(
+                    from_user_id=from_user_id,
+                    to_user_id=to_user_id,
+                    amount=amount,
+                    description=description,
+                    idempotency_key=idempotency_key,
+                    state="started",
+                    created_at=datetime.utcnow()
+                )
+                db.add(saga)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Registrata nel frattempo da un altro processo con la stessa chiave
+                    db.rollback()
+                    if idempotency_key is None:
+                        raise
+                    saga = db.query(TransferSaga).filter(TransferSaga.idempotency_key == idempotency_key).one()
+                else:
+                    db.refresh(saga)
+            self.advance(db, saga)
+            # Stato finale caricato prima di chiudere la sessione
+            db.refresh(saga)
+            return saga
+        finally:
+            db.close()
+
+    def recover(self, older_than: float = SAGA_RECOVERY_AFTER_SECONDS) -> int:
+        """Riprende le saga interrotte (crash o errore di uno shard); restituisce quante ne ha chiuse"""
+        db = SessionLocal()
+        try:
+            stale = db.query(TransferSaga).filter(
+                TransferSaga.state.notin_(SAGA_FINAL_STATES),
+                TransferSaga.updated_at < datetime.utcnow() - timedelta(seconds=older_than)
+            ).order_by(TransferSaga.id).all()
+            db.commit()
+            closed = 0
+            for saga in stale:
+                try:
+                    if self.advance(db, saga).state in SAGA_FINAL_STATES:
+                        closed += 1
+                        logger.info("Saga %s ripresa e chiusa nello stato %s", saga.id, saga.state)
+                except Exception:
+                    db.rollback()
+                    logger.exception("Saga %s non ripresa, nuovo tentativo al prossimo recupero", saga.id)
+            return closed
+        finally:
+            db.close()
+
+
+def cross_shard_transfer(db: Session, sender: User, recipient_id: int, amount: float, description: str) -> Transaction:
+    """
+    Trasferimento verso un utente di un altro shard (db è instradata sullo shard dell'ordinante)
+
+    Restituisce il movimento dell'ordinante come il trasferimento normale.
+    """
+    try:
+        saga = saga_runner.start(sender.id, recipient_id, amount, description)
+    except Exception:
+        # Shard o database principale non raggiungibile: la saga già registrata
+        # viene chiusa (o compensata) dal recupero
+        logger.exception("Trasferimento tra shard interrotto (da %s a %s)", sender.id, recipient_id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servizio temporaneamente non disponibile, riprova più tardi"
+        )
+    if saga.state == "failed":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=saga.last_error
+        )
+    if saga.state == "compensated":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=saga.last_error
+        )
+    if saga.state != "completed":
+        # Completata in seguito dal recupero delle saga
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Trasferimento in elaborazione"
+        )
+    # Il movimento è stato scritto da un'altra sessione: la transazione di lettura aperta
+    # dall'autenticazione non lo vedrebbe
+    db.commit()
+    return db.query(Transaction).filter(Transaction.id == saga.transaction_id).first()
+
+
+def recover_in_background():
+    """Recupero delle saga interrotte all'avvio del worker, senza ritardarne l'avvio"""
+    def run():
+        try:
+            saga_runner.recover()
+        except Exception:
+            logger.exception("Errore nel recupero delle saga")
+    threading.Thread(target=run, name="saga-recovery", daemon=True).start()
+
+
+# Istanze globali per il processo corrente
+shard_directory = ShardDirectory()
+saga_runner = TransferSagaRunner()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recupero delle saga dei trasferimenti tra shard")
+    parser.add_argument("--loop", action="store_true", help="Ripete il recupero periodicamente")
+    parser.add_argument("--older-than", type=float, default=SAGA_RECOVERY_AFTER_SECONDS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    while True:
+        print(f"{saga_runner.recover(args.older_than)} saga chiuse")
+        if not args.loop:
+            break
+        time.sleep(args.older_than)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+# Database SQLite temporaneo: va impostato prima di importare i moduli dell'applicazione
+_tmpdir = tempfile.mkdtemp(prefix="creditodomestico-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ["REPORT_OUTPUT_DIR"] = os.path.join(_tmpdir, "reports")
+os.environ["IMPORT_UPLOAD_DIR"] = os.path.join(_tmpdir, "imports")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ.pop("SHARD_DATABASE_URLS", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base, SessionLocal, all_engines  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from models import User  # noqa: E402
+
+for _engine in all_engines():
+    upgrade(_engine)
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    """Ogni test parte da tabelle vuote"""
+    yield
+    for database_engine in all_engines():
+        with database_engine.begin() as connection:
+            for table in reversed(Base.metadata.sorted_tables):
+                connection.execute(table.delete())
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    def create(email: str, **fields) -> User:
+        user = User(
+            email=email,
+            password_hash="x",
+            first_name=fields.pop("first_name", "Mario"),
+            last_name=fields.pop("last_name", "Rossi"),
+            phone_number="+39 333 1234567",
+            date_of_birth=date(1990, 1, 1),
+            address="Via Roma 1",
+            city="Roma",
+            postal_code="00100",
+            **fields
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+    return create
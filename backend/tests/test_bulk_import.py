@@ -0,0 +1,123 @@
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+
+import bulk_import
+from bulk_import import (
+    RESUMABLE_STATES, ImportLeaseLost, claim_import_job, create_import_job, run_import_job,
+    run_import_job_in_background
+)
+from models import User, ImportJob, ImportJobError
+
+HEADER = "email,password,first_name,last_name,phone_number,date_of_birth,address,city,postal_code\n"
+
+
+def _row(email: str, first_name: str = "Anna") -> str:
+    return f"{email},Password1!,{first_name},Bianchi,+39 3331234567,1990-01-01,Via Roma 1,Roma,00100\n"
+
+
+@pytest.fixture
+def import_file(tmp_path):
+    def write(*rows: str) -> str:
+        path = tmp_path / "utenti.csv"
+        path.write_text(HEADER + "".join(rows), encoding="utf-8")
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def chunk_sizes(monkeypatch):
+    """Dimensione dei blocchi passati a _process_chunk"""
+    sizes = []
+    process_chunk = bulk_import._process_chunk
+
+    def recording(db, job, runner_id, chunk, pool):
+        sizes.append(len(chunk))
+        return process_chunk(db, job, runner_id, chunk, pool)
+
+    monkeypatch.setattr(bulk_import, "_process_chunk", recording)
+    return sizes
+
+
+def test_import_commits_in_chunks_and_records_row_errors(db, make_user, import_file, chunk_sizes):
+    make_user("mario@example.com")
+    path = import_file(
+        _row("anna@example.com"),
+        _row("anna@example.com"),
+        _row("mario@example.com"),
+        _row("bruno@example.com", first_name="Bruno"),
+        _row("carla@example.com", first_name="C")
+    )
+
+    job = run_import_job(create_import_job(db, path).id, chunk_size=2)
+
+    assert chunk_sizes == [2, 2, 1]
+    assert (job.status, job.processed_rows, job.inserted_rows, job.failed_rows) == ("completed", 5, 2, 3)
+    assert job.claimed_by is None and job.claimed_until is None
+    db.rollback()
+    errors = {row.row_number: row.message for row in db.query(ImportJobError).all()}
+    assert errors[2] == "Email duplicata nel file"
+    assert errors[3] == "Email già registrata"
+    assert "first_name" in errors[5]
+    assert {user.email for user in db.query(User).all()} == {
+        "mario@example.com", "anna@example.com", "bruno@example.com"
+    }
+
+
+def test_failed_import_resumes_after_last_committed_chunk(db, import_file, monkeypatch):
+    path = import_file(*(_row(f"utente{i}@example.com") for i in range(5)))
+    job_id = create_import_job(db, path).id
+    process_chunk = bulk_import._process_chunk
+    calls = []
+
+    def failing_second_chunk(db, job, runner_id, chunk, pool):
+        calls.append(len(chunk))
+        if len(calls) == 2:
+            raise RuntimeError("connessione persa")
+        return process_chunk(db, job, runner_id, chunk, pool)
+
+    monkeypatch.setattr(bulk_import, "_process_chunk", failing_second_chunk)
+    with pytest.raises(RuntimeError):
+        run_import_job(job_id, chunk_size=2)
+
+    db.rollback()
+    job = db.get(ImportJob, job_id)
+    assert (job.status, job.processed_rows, job.last_error) == ("failed", 2, "connessione persa")
+    assert job.claimed_by is None
+
+    monkeypatch.setattr(bulk_import, "_process_chunk", process_chunk)
+    job = run_import_job(job_id, chunk_size=2)
+
+    assert (job.status, job.processed_rows, job.inserted_rows) == ("completed", 5, 5)
+    db.rollback()
+    assert db.query(User).count() == 5
+
+
+def test_background_import_logs_failure(caplog):
+    with caplog.at_level(logging.ERROR, logger="bulk_import"):
+        run_import_job_in_background(404)
+
+    assert "Import 404 interrotto" in caplog.text
+
+
+def test_running_import_is_reclaimed_only_after_lease_expires(db, import_file):
+    job_id = create_import_job(db, import_file(_row("anna@example.com"))).id
+    assert claim_import_job(db, job_id, "runner-1")
+
+    # Il runner è ancora vivo: la ripresa viene rifiutata
+    assert not claim_import_job(db, job_id, "runner-2", RESUMABLE_STATES)
+
+    # Il runner si è fermato senza aggiornare il job: il lease scade
+    db.rollback()
+    db.get(ImportJob, job_id).claimed_until = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert claim_import_job(db, job_id, "runner-2", RESUMABLE_STATES)
+
+    # Il vecchio runner, se riparte, non scrive più nulla
+    with pytest.raises(ImportLeaseLost):
+        run_import_job(job_id, runner_id="runner-1")
+    db.rollback()
+    job = db.get(ImportJob, job_id)
+    assert (job.status, job.claimed_by, job.processed_rows) == ("running", "runner-2", 0)
+    assert db.query(User).count() == 0
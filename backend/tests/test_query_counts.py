@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import transaction_export
+from bootstrap import load_transaction_page
+from counterparties import counterparty_cache
+from database import engine
+from models import Transaction, ArchivedTransaction
+
+
+@contextmanager
+def count_statements():
+    """Conta gli statement SQL eseguiti sull'engine nel blocco"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def history(db, make_user):
+    """Utente con 120 movimenti, ognuno con una controparte diversa; i più vecchi archiviati"""
+    user = make_user("mario@example.com")
+    start = datetime(2026, 1, 1)
+    for i in range(120):
+        other = make_user(f"contatto{i}@example.com", first_name=f"Contatto{i}")
+        fields = dict(
+            id=i + 1,
+            from_user_id=user.id if i % 2 else other.id,
+            to_user_id=other.id if i % 2 else user.id,
+            amount=1.0 + i,
+            transaction_type="transfer",
+            created_at=start + timedelta(hours=i)
+        )
+        db.add(ArchivedTransaction(**fields) if i < 40 else Transaction(**fields))
+    db.commit()
+    user_id = user.id
+    db.close()
+    yield user_id
+    counterparty_cache._entries.clear()
+
+
+def test_transaction_page_statements_do_not_grow_with_page_size(db, history):
+    counts = {}
+    for page_size in (5, 20, 60):
+        counterparty_cache._entries.clear()
+        with count_statements() as statements:
+            page = load_transaction_page(db, history, page_size)
+        db.rollback()
+
+        assert len(page) == page_size
+        assert all(transaction.counterparty_name for transaction in page)
+        counts[page_size] = len(statements)
+
+    # Una query per tabella (calda e archivio) più una per le controparti, a ogni dimensione
+    assert counts[5] == counts[20] == counts[60]
+    assert counts[5] <= 4
+
+
+def test_export_statements_per_page_do_not_grow_with_page_size(history, monkeypatch):
+    for page_size in (10, 30, 120):
+        monkeypatch.setattr(transaction_export, "EXPORT_PAGE_SIZE", page_size)
+        counterparty_cache._entries.clear()
+        with count_statements() as statements:
+            lines = "".join(transaction_export.export_transactions_csv(history)).splitlines()
+
+        assert len(lines) == 121
+        # Per pagina al più un blocco per tabella e una query per le controparti,
+        # più le query finali che trovano le tabelle esaurite
+        pages = 120 // page_size
+        assert len(statements) <= 3 * pages + 4
+
+
+def test_counterparty_without_name_shows_masked_email(db, make_user):
+    user = make_user("mario@example.com")
+    other = make_user("giulia.verdi@example.com", first_name="", last_name="")
+    db.add(Transaction(from_user_id=user.id, to_user_id=other.id, amount=10.0,
+                       transaction_type="transfer", created_at=datetime(2026, 3, 1)))
+    db.commit()
+    counterparty_cache._entries.clear()
+
+    try:
+        page = load_transaction_page(db, user.id, 10)
+    finally:
+        counterparty_cache._entries.clear()
+
+    assert page[0].counterparty_name == "g***i@example.com"
+    assert page[0].counterparty_email == "g***i@example.com"
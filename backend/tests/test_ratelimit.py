@@ -0,0 +1,73 @@
+import jwt
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import ratelimit
+from ratelimit import MemoryBackend, RateLimiter, install_rate_limiting, parse_policies
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Un proxy fidato davanti all'API: conta la voce più a destra di X-Forwarded-For
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUSTED_PROXIES", 1)
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    install_rate_limiting(app, RateLimiter(parse_policies("*=ip:2/60"), MemoryBackend()))
+    return TestClient(app)
+
+
+def test_spoofed_forwarded_prefix_does_not_reset_bucket(client):
+    statuses = [
+        client.get("/ping", headers={"X-Forwarded-For": f"198.51.100.{i}, 203.0.113.7"}).status_code
+        for i in range(3)
+    ]
+
+    assert statuses == [200, 200, 429]
+
+
+def test_clients_behind_proxy_have_separate_buckets(client):
+    for _ in range(2):
+        assert client.get("/ping", headers={"X-Forwarded-For": "203.0.113.7"}).status_code == 200
+
+    assert client.get("/ping", headers={"X-Forwarded-For": "203.0.113.7"}).status_code == 429
+    assert client.get("/ping", headers={"X-Forwarded-For": "203.0.113.8"}).status_code == 200
+
+
+def _bearer(subject: str) -> dict:
+    return {"Authorization": f"Bearer {jwt.encode({'sub': subject}, ratelimit.SECRET_KEY, algorithm=ratelimit.ALGORITHM)}"}
+
+
+def test_request_rejected_by_one_bucket_does_not_consume_the_others():
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    install_rate_limiting(app, RateLimiter(parse_policies("*=ip:3/60,sub:1/60"), MemoryBackend()))
+    client = TestClient(app)
+
+    assert client.get("/ping", headers=_bearer("mario@example.com")).status_code == 200
+    # Quota dell'utente esaurita: l'IP non perde il suo token
+    assert client.get("/ping", headers=_bearer("mario@example.com")).status_code == 429
+    assert client.get("/ping", headers=_bearer("anna@example.com")).status_code == 200
+    assert client.get("/ping", headers=_bearer("luca@example.com")).status_code == 200
+
+
+def test_policy_matches_route_template():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        return {"id": item_id}
+
+    install_rate_limiting(app, RateLimiter(parse_policies("GET /items/{item_id}=ip:1/60;*=ip:100/60"), MemoryBackend()))
+    client = TestClient(app)
+
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 429
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from models import User
+import recipients
+from recipients import RecipientIndex, suggest_recipients
+
+
+def test_sync_picks_up_profile_changes_and_deactivations_from_other_workers(db, make_user):
+    anna = make_user("anna@example.com", first_name="Anna")
+    luca = make_user("luca@example.com", first_name="Luca")
+    index = RecipientIndex(sync_interval=0)
+    index.sync(db)
+
+    # Modifiche di un altro worker: non passano da add_user() di questo indice
+    db.get(User, anna.id).first_name = "Annalisa"
+    db.get(User, luca.id).is_active = False
+    db.commit()
+    index.sync(db)
+
+    assert index.search(db, "annalisa") == [anna.id]
+    assert index.search(db, "luca") == []
+    assert index.get(luca.id) is None
+
+
+def test_sync_finds_lower_id_committed_after_higher_one(db, make_user):
+    make_user("anna@example.com", first_name="Anna")
+    index = RecipientIndex(sync_interval=0)
+    index.sync(db)
+    make_user("zeno@example.com", first_name="Zeno", id=50)
+    index.sync(db)
+
+    # Id assegnato prima di 50 ma confermato dopo l'ultima sincronizzazione
+    make_user("bice@example.com", first_name="Bice", id=10, updated_at=datetime.utcnow() - timedelta(seconds=5))
+    index.sync(db)
+
+    assert index.search(db, "bice") == [10]
+
+
+def test_short_prefix_searches_only_frequent_contacts(db, make_user, monkeypatch):
+    mario = make_user("mario@example.com")
+    make_user("anna@example.com", first_name="Anna")
+    monkeypatch.setattr(recipients, "recipient_index", RecipientIndex(sync_interval=0))
+
+    assert suggest_recipients(db, mario.id, "an") == []
+    assert [suggestion["email"] for suggestion in suggest_recipients(db, mario.id, "ann")] == ["anna@example.com"]
@@ -0,0 +1,77 @@
+import json
+from datetime import datetime, timedelta
+
+import reports
+from models import Transaction, ArchivedTransaction, ReportJob
+
+
+def _add_history(db, user, other, archived: int, hot: int, start: datetime):
+    """archived movimenti più vecchi nell'archivio, hot più recenti nella tabella calda"""
+    for i in range(archived + hot):
+        fields = dict(
+            id=i + 1,
+            from_user_id=user.id if i % 2 else other.id,
+            to_user_id=other.id if i % 2 else user.id,
+            amount=1.0 + i,
+            transaction_type="transfer",
+            created_at=start + timedelta(hours=i)
+        )
+        db.add(ArchivedTransaction(**fields) if i < archived else Transaction(**fields))
+    db.commit()
+
+
+def _monthly_job(db, user, period: str) -> ReportJob:
+    period_start, period_end = reports.report_period("monthly_statement", period)
+    job = ReportJob(
+        user_id=user.id,
+        report_type="monthly_statement",
+        period_start=period_start,
+        period_end=period_end,
+        status="running",
+        attempts=1
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def test_report_counts_rows_across_archive_boundary(db, make_user, monkeypatch):
+    # Blocchi piccoli: i cursori restano aperti mentre si arricchiscono le pagine
+    monkeypatch.setattr(reports, "REPORT_STREAM_BATCH_SIZE", 7)
+    user = make_user("mario@example.com")
+    other = make_user("anna@example.com", first_name="Anna")
+    _add_history(db, user, other, archived=45, hot=38, start=datetime(2026, 3, 1))
+
+    path, count = reports.generate_report(db, _monthly_job(db, user, "2026-03"))
+
+    with open(path, encoding="utf-8") as source:
+        report = json.load(source)
+    ids = [transaction["id"] for transaction in report["transactions"]]
+    assert count == 83
+    assert report["summary"]["count"] == 83
+    assert ids == list(range(1, 84))
+    assert all(transaction["counterparty_name"] for transaction in report["transactions"])
+
+
+def test_report_skips_row_present_in_both_tables(db, make_user, monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_STREAM_BATCH_SIZE", 4)
+    user = make_user("mario@example.com")
+    other = make_user("anna@example.com", first_name="Anna")
+    _add_history(db, user, other, archived=10, hot=10, start=datetime(2026, 3, 1))
+
+    # Riga copiata nell'archivio ma non ancora rimossa dalla tabella calda
+    moving = db.query(Transaction).filter(Transaction.id == 11).first()
+    db.add(ArchivedTransaction(
+        id=moving.id,
+        from_user_id=moving.from_user_id,
+        to_user_id=moving.to_user_id,
+        amount=moving.amount,
+        transaction_type=moving.transaction_type,
+        created_at=moving.created_at
+    ))
+    db.commit()
+
+    _, count = reports.generate_report(db, _monthly_job(db, user, "2026-03"))
+
+    assert count == 20
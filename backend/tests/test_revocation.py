@@ -0,0 +1,71 @@
+import calendar
+from datetime import datetime, timedelta
+
+from models import RevokedToken
+from revocation import TokenRevocationList
+
+
+def _timestamp(moment: datetime) -> int:
+    # Come PyJWT per iat/exp: secondi UTC interi
+    return calendar.timegm(moment.utctimetuple())
+
+
+def _payload(jti: str, issued_at: datetime) -> dict:
+    # Come create_access_token: iat al secondo, iat_ms al millisecondo
+    return {
+        "sub": "mario@example.com",
+        "jti": jti,
+        "iat": _timestamp(issued_at),
+        "iat_ms": (issued_at - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+    }
+
+
+def test_revoke_subject_compares_issue_time_below_the_second(db):
+    # Revoca a metà di un secondo (es. "esci da tutti i dispositivi" seguito da un nuovo login)
+    revoked_before = datetime(2026, 3, 1, 12, 0, 0, 500000)
+    db.add(RevokedToken(subject="mario@example.com", revoked_before=revoked_before,
+                        expires_at=datetime.utcnow() + timedelta(minutes=30)))
+    db.commit()
+    revocations = TokenRevocationList()
+
+    before = _payload("prima", revoked_before - timedelta(milliseconds=5))
+    after = _payload("dopo", revoked_before + timedelta(milliseconds=5))
+
+    assert before["iat"] == after["iat"]
+    assert revocations.is_revoked(before, db)
+    assert not revocations.is_revoked(after, db)
+
+
+def test_token_without_iat_ms_falls_back_to_iat(db):
+    revocations = TokenRevocationList()
+    revocations.revoke_subject(db, "mario@example.com")
+    revoked_before = db.query(RevokedToken.revoked_before).scalar()
+
+    earlier = {"sub": "mario@example.com", "jti": "vecchio", "iat": _timestamp(revoked_before - timedelta(seconds=1))}
+    later = {"sub": "mario@example.com", "jti": "nuovo", "iat": _timestamp(revoked_before + timedelta(seconds=1))}
+
+    assert revocations.is_revoked(earlier, db)
+    assert not revocations.is_revoked(later, db)
+
+
+def test_revoking_same_token_twice_is_not_an_error(db):
+    revocations = TokenRevocationList()
+    payload = {"sub": "mario@example.com", "jti": "abc", "exp": _timestamp(datetime.utcnow() + timedelta(minutes=30))}
+
+    revocations.revoke_token(db, payload)
+    # Secondo logout concorrente: l'altro processo non vede la riga nel proprio filtro
+    TokenRevocationList().revoke_token(db, payload)
+
+    assert db.query(RevokedToken).count() == 1
+    assert revocations.is_revoked(payload, db)
+
+
+def test_prune_expired_removes_only_expired_rows(db):
+    revocations = TokenRevocationList()
+    now = datetime.utcnow()
+    db.add(RevokedToken(jti="scaduto", expires_at=now - timedelta(minutes=1)))
+    db.add(RevokedToken(jti="attivo", expires_at=now + timedelta(minutes=30)))
+    db.commit()
+
+    assert revocations.prune_expired() == 1
+    assert [row.jti for row in db.query(RevokedToken).all()] == ["attivo"]
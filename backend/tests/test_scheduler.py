@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import scheduler
+from config import SCHEDULER_RETRY_BASE_SECONDS, SCHEDULER_RETRY_MAX_SECONDS
+from models import User, Transaction, ScheduledTransfer
+from scheduler import TransferScheduler, next_occurrence, _retry_delay
+
+
+@pytest.fixture
+def make_schedule(db):
+    def create(sender, recipient, amount: float = 10.0, due: datetime = None, frequency: str = "once") -> ScheduledTransfer:
+        due = due or datetime.utcnow() - timedelta(minutes=1)
+        schedule = ScheduledTransfer(
+            user_id=sender.id,
+            to_user_id=recipient.id,
+            amount=amount,
+            frequency=frequency,
+            anchor_day=due.day,
+            next_run_at=due,
+            scheduled_for=due,
+            status="active",
+            attempts=0
+        )
+        db.add(schedule)
+        db.commit()
+        db.refresh(schedule)
+        return schedule
+    return create
+
+
+def test_batch_executes_orders_of_same_sender_in_sequence(db, make_user, make_schedule):
+    mario = make_user("mario@example.com", balance=25.0)
+    anna = make_user("anna@example.com", first_name="Anna")
+    luca = make_user("luca@example.com", first_name="Luca")
+    for recipient in (anna, luca, anna, luca):
+        make_schedule(mario, recipient, amount=10.0)
+
+    transfers = TransferScheduler(batch_size=3)
+    assert transfers.run_once() == 3
+
+    # Nuova transazione di lettura: le scritture dello scheduler sono di altre sessioni
+    db.rollback()
+    # Il terzo ordine trova il saldo già scalato dai primi due
+    assert db.get(User, mario.id).balance == 5.0
+    assert db.query(Transaction).count() == 2
+    assert db.query(ScheduledTransfer).filter(ScheduledTransfer.attempts == 1).count() == 1
+    # Il quarto ordine resta per il blocco successivo
+    assert db.query(ScheduledTransfer).filter(ScheduledTransfer.status == "active", ScheduledTransfer.attempts == 0).count() == 1
+
+
+def test_leased_orders_are_not_claimed_by_another_instance(db, make_user, make_schedule):
+    mario = make_user("mario@example.com", balance=100.0)
+    anna = make_user("anna@example.com", first_name="Anna")
+    schedule = make_schedule(mario, anna)
+
+    first = TransferScheduler()
+    second = TransferScheduler()
+    second.worker_id = "altro-host:1"
+
+    assert first.claim_batch(db) == [schedule.id]
+    assert second.claim_batch(db) == []
+
+    # Istanza ferma dopo l'assegnazione: alla scadenza del lease l'ordine passa all'altra
+    db.query(ScheduledTransfer).update({"claimed_until": datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    assert second.claim_batch(db) == [schedule.id]
+    assert second.execute_batch(db, [schedule.id]) == 1
+    assert first.execute_batch(db, [schedule.id]) == 0
+
+
+def test_retry_delay_grows_with_jitter_up_to_the_cap():
+    for attempts in range(1, 12):
+        expected = min(SCHEDULER_RETRY_MAX_SECONDS, SCHEDULER_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        delays = [_retry_delay(attempts) for _ in range(50)]
+        assert all(expected * 0.5 <= delay <= expected for delay in delays)
+        # Jitter: ordini rifiutati insieme non riprovano tutti allo stesso istante
+        assert len(set(delays)) > 1
+
+
+def test_insufficient_balance_is_retried_later(db, make_user, make_schedule):
+    mario = make_user("mario@example.com", balance=5.0)
+    anna = make_user("anna@example.com", first_name="Anna")
+    schedule = make_schedule(mario, anna, amount=10.0)
+
+    before = datetime.utcnow()
+    TransferScheduler().run_once()
+
+    db.rollback()
+    schedule = db.get(ScheduledTransfer, schedule.id)
+    assert schedule.status == "active"
+    assert schedule.attempts == 1
+    assert schedule.last_error == "Saldo insufficiente"
+    delay = (schedule.next_run_at - before).total_seconds()
+    assert SCHEDULER_RETRY_BASE_SECONDS * 0.5 <= delay <= SCHEDULER_RETRY_BASE_SECONDS + 5
+
+
+def test_late_order_records_lateness_and_skips_missed_occurrences(db, make_user, make_schedule):
+    mario = make_user("mario@example.com", balance=100.0)
+    anna = make_user("anna@example.com", first_name="Anna")
+    due = datetime.utcnow() - timedelta(days=3)
+    schedule = make_schedule(mario, anna, due=due, frequency="daily")
+
+    transfers = TransferScheduler()
+    transfers.run_once()
+
+    db.rollback()
+    schedule = db.get(ScheduledTransfer, schedule.id)
+    assert transfers.last_lateness_seconds >= timedelta(days=3).total_seconds()
+    # Un solo bonifico per il ritardo, poi la prossima scadenza futura
+    assert db.query(Transaction).count() == 1
+    assert schedule.next_run_at > datetime.utcnow()
+    assert schedule.next_run_at - due == timedelta(days=4)
+
+
+def test_monthly_occurrence_keeps_anchor_day():
+    assert next_occurrence(datetime(2026, 1, 31, 9), "monthly", 31) == datetime(2026, 2, 28, 9)
+    assert next_occurrence(datetime(2026, 2, 28, 9), "monthly", 31) == datetime(2026, 3, 31, 9)
+    assert next_occurrence(datetime(2026, 12, 15), "monthly", 15) == datetime(2027, 1, 15)
+
+
+def test_remote_order_waits_for_saga_in_progress(db, make_user, make_schedule, monkeypatch):
+    mario = make_user("mario@example.com", balance=100.0)
+    anna = make_user("anna@example.com", first_name="Anna")
+    schedule = make_schedule(mario, anna)
+    transfers = TransferScheduler()
+    transfers.claim_batch(db)
+
+    # Accredito non riuscito per uno shard irraggiungibile: la saga resta 'debited'
+    keys = []
+    def start(*args, idempotency_key=None):
+        keys.append(idempotency_key)
+        return SimpleNamespace(id=1, state="debited", last_error=None)
+    monkeypatch.setattr(scheduler, "saga_runner", SimpleNamespace(start=start))
+
+    assert transfers._execute_remote(db, schedule.id) == 0
+    assert transfers._execute_remote(db, schedule.id) == 0
+
+    db.rollback()
+    pending = db.get(ScheduledTransfer, schedule.id)
+    assert pending.status == "active"
+    assert pending.next_run_at == schedule.next_run_at
+    assert pending.claimed_by == transfers.worker_id
+    # Ogni ripresa ritrova la stessa saga
+    assert keys[0] == keys[1]
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from models import User, Transaction, TransferSaga, SagaStep
+from sharding import saga_runner
+
+
+def test_saga_with_known_idempotency_key_is_not_repeated(db, make_user):
+    sender = make_user("mario@example.com", balance=100.0)
+    recipient = make_user("anna@example.com", first_name="Anna", balance=0.0)
+    # Saga registrata da uno scheduler fermatosi prima di aggiornare l'ordine
+    db.add(TransferSaga(
+        from_user_id=sender.id,
+        to_user_id=recipient.id,
+        amount=30.0,
+        state="completed",
+        idempotency_key="schedule:1:20260301000000:0",
+        created_at=datetime(2026, 3, 1)
+    ))
+    db.commit()
+
+    saga = saga_runner.start(sender.id, recipient.id, 30.0, "Bonifico programmato", idempotency_key="schedule:1:20260301000000:0")
+
+    assert saga.state == "completed"
+    assert db.query(TransferSaga).count() == 1
+    db.expire_all()
+    assert db.get(User, sender.id).balance == 100.0
+    assert db.get(User, recipient.id).balance == 0.0
+
+
+def test_replayed_confirm_step_keeps_sender_movement(db, make_user):
+    sender = make_user("mario@example.com", balance=70.0)
+    recipient = make_user("anna@example.com", first_name="Anna", balance=30.0)
+    # Crash dopo il commit della conferma, prima della transizione a 'completed'
+    saga = TransferSaga(
+        from_user_id=sender.id,
+        to_user_id=recipient.id,
+        amount=30.0,
+        state="credited",
+        created_at=datetime(2026, 3, 1)
+    )
+    db.add(saga)
+    db.commit()
+    movement = Transaction(from_user_id=sender.id, to_user_id=recipient.id, amount=30.0,
+                           transaction_type="transfer", created_at=saga.created_at)
+    db.add(movement)
+    db.commit()
+    db.add(SagaStep(saga_id=saga.id, step="confirm", transaction_id=movement.id))
+    db.commit()
+
+    saga_runner.advance(db, saga)
+
+    assert saga.state == "completed"
+    assert saga.transaction_id == movement.id
+    assert db.query(Transaction).count() == 1
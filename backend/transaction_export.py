@@ -0,0 +1,52 @@
+import csv
+import io
+from typing import Iterator
+
+from database import session_for_user
+from archive import iter_history_pages
+from counterparties import enrich_transactions
+
+EXPORT_PAGE_SIZE = 500
+
+EXPORT_COLUMNS = [
+    "id", "created_at", "transaction_type", "direction", "amount",
+    "counterparty_name", "counterparty_email", "description"
+]
+
+
+def export_transactions_csv(user_id: int) -> Iterator[str]:
+    """
+    Esporta lo storico dell'utente in CSV, una pagina alla volta
+
+    Le transazioni arrivano da tabella calda e archivio unite per data; ogni
+    pagina costa poche query (una per tabella + controparti mancanti), quindi
+    l'export non carica tutto in memoria e non fa una query per riga.
+    """
+    db = session_for_user(user_id)
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+
+        for page in iter_history_pages(db, user_id, EXPORT_PAGE_SIZE):
+            for transaction in enrich_transactions(db, page, user_id):
+                outgoing = transaction.from_user_id == user_id
+                writer.writerow([
+                    transaction.id,
+                    transaction.created_at.isoformat(),
+                    transaction.transaction_type,
+                    "uscita" if outgoing else "entrata",
+                    f"{-transaction.amount if outgoing else transaction.amount:.2f}",
+                    transaction.counterparty_name or "",
+                    transaction.counterparty_email or "",
+                    transaction.description or ""
+                ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            # Le transazioni già esportate non servono più alla sessione
+            db.expunge_all()
+
+        yield buffer.getvalue()
+    finally:
+        db.close()
@@ -45,9 +45,13 @@ const TransactionHistory = ({ transactions }) => {
     }
     
     if (transaction.from_user_id === user?.id) {
-      return `Trasferimento a utente (ID: ${transaction.to_user_id})`;
+      return transaction.counterparty_name
+        ? `Trasferimento a ${transaction.counterparty_name} (${transaction.counterparty_email})`
+        : `Trasferimento a utente (ID: ${transaction.to_user_id})`;
     } else {
-      return `Ricevuto da utente (ID: ${transaction.from_user_id})`;
+      return transaction.counterparty_name
+        ? `Ricevuto da ${transaction.counterparty_name} (${transaction.counterparty_email})`
+        : `Ricevuto da utente (ID: ${transaction.from_user_id})`;
     }
   };
 
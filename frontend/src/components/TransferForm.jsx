@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
 
 const TransferForm = ({ onTransferSuccess }) => {
@@ -8,8 +8,27 @@ const TransferForm = ({ onTransferSuccess }) => {
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
   const [loading, setLoading] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
   const { user, API_BASE_URL, apiCall } = useAuth();
 
+  // Suggerimenti destinatari (contatti frequenti + ricerca per prefisso)
+  useEffect(() => {
+    const timer = setTimeout(async () => {
+      try {
+        const response = await apiCall(
+          `${API_BASE_URL}/recipients/search?q=${encodeURIComponent(toEmail)}`
+        );
+        if (response.ok) {
+          setSuggestions(await response.json());
+        }
+      } catch (error) {
+        console.error('Errore durante la ricerca dei destinatari:', error);
+      }
+    }, 150);
+
+    return () => clearTimeout(timer);
+  }, [toEmail]);
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setError('');
@@ -125,10 +144,19 @@ const TransferForm = ({ onTransferSuccess }) => {
                   value={toEmail}
                   onChange={(e) => setToEmail(e.target.value)}
                   placeholder="esempio@email.com"
+                  list="recipientSuggestions"
+                  autoComplete="off"
                   required
                 />
+                <datalist id="recipientSuggestions">
+                  {suggestions.map((recipient) => (
+                    <option key={recipient.id} value={recipient.email}>
+                      {recipient.full_name}{recipient.is_frequent ? ' ★' : ''}
+                    </option>
+                  ))}
+                </datalist>
                 <div className="form-text">
-                  Inserisci l'email dell'utente a cui vuoi inviare il denaro
+                  Inserisci l'email, il nome o il cognome dell'utente a cui vuoi inviare il denaro
                 </div>
               </div>
 
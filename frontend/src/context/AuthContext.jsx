@@ -177,6 +177,14 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    // Revoca il token lato server (best effort: il logout locale avviene comunque)
+    if (token) {
+      fetch(`${API_BASE_URL}/logout`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` },
+      }).catch(() => {});
+    }
+
     setUser(null);
     setToken(null);
     setIsAuthenticated(false);